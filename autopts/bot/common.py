@@ -34,6 +34,7 @@ from autopts.client import Client, CliParser, TestCaseRunStats, init_logging
 from autopts.config import AUTOPTS_ROOT_DIR, MAX_SERVER_RESTART_TIME, generate_file_paths
 from autopts.ptsprojects.boards import get_debugger_snr, get_free_device, get_tty, release_device
 from autopts.ptsprojects.testcase_db import DATABASE_FILE
+from autopts.workspace_index import WorkspaceIndex
 
 log = logging.debug
 
@@ -116,6 +117,8 @@ class BotConfigArgs(Namespace):
         self.active_hub_server = args.get('active_hub_server', None)
         self.recovery = args.get('recovery', False)
         self.superguard = float(args.get('superguard', 0))
+        self.adaptive_superguard = args.get('adaptive_superguard', False)
+        self.warm_iut = args.get('warm_iut', False)
         self.cron_optim = args.get('cron_optim', False)
         self.project_repos = args.get('repos', None)
         self.test_case_limit = args.get('test_case_limit', 0)
@@ -285,6 +288,12 @@ class BotClient(Client):
     def apply_config(self, args, config, value):
         pass
 
+    def prepare_config(self, args, config, value):
+        """Called with the next config, before the current one is tested.
+        Extend it to prepare the next config in the background, e.g.
+        to build its firmware.
+        """
+
     def bot_pre_cleanup(self):
         """Perform cleanup before test run
         :return: None
@@ -301,7 +310,9 @@ class BotClient(Client):
     def bot_post_cleanup(self):
         files_to_save = [
             self.file_paths['ALL_STATS_RESULTS_XML_FILE'],
+            f"{self.file_paths['ALL_STATS_RESULTS_XML_FILE']}.journal",
             self.file_paths['TC_STATS_RESULTS_XML_FILE'],
+            f"{self.file_paths['TC_STATS_RESULTS_XML_FILE']}.journal",
             self.file_paths['TEST_CASES_JSON_FILE'],
             self.file_paths['ALL_STATS_JSON_FILE'],
             self.file_paths['TC_STATS_JSON_FILE'],
@@ -323,7 +334,8 @@ class BotClient(Client):
             run_order = self.backup['run_order']
         else:
             _run_order, _args = get_filtered_test_cases(self.iut_config, self.args,
-                                                        self.config_default, self.ptses[0])
+                                                        self.config_default,
+                                                        self.get_workspace_index())
 
             run_order = []
             test_cases = {}
@@ -370,8 +382,9 @@ class BotClient(Client):
     def _merge_stats(self, all_stats, stats):
         all_stats.merge(stats)
 
-        if os.path.exists(stats.xml_results):
-            os.remove(stats.xml_results)
+        for results_file in (stats.xml_results, stats.journal_file):
+            if os.path.exists(results_file):
+                os.remove(results_file)
 
         if os.path.exists(self.file_paths['TC_STATS_JSON_FILE']):
             os.remove(self.file_paths['TC_STATS_JSON_FILE'])
@@ -387,9 +400,10 @@ class BotClient(Client):
             if self.args.use_backup:
                 all_stats.save_to_backup(self.file_paths['ALL_STATS_JSON_FILE'])
 
-        projects = self.ptses[0].get_project_list()
+        projects = self.get_workspace_index().get_project_list()
+        configs = list(self._yield_next_config())
 
-        for config, config_args in self._yield_next_config():
+        for i, (config, config_args) in enumerate(configs):
             try:
                 if not stats:
                     stats = TestCaseRunStats(projects,
@@ -404,6 +418,11 @@ class BotClient(Client):
 
                 self.apply_config(config_args, config, self.iut_config[config])
 
+                if i + 1 < len(configs):
+                    next_config, next_config_args = configs[i + 1]
+                    self.prepare_config(next_config_args, next_config,
+                                        self.iut_config[next_config])
+
                 stats = autoptsclient.run_test_cases(self.ptses,
                                                      self.test_cases,
                                                      config_args,
@@ -441,16 +460,20 @@ class BotClient(Client):
             mapping = {'GMCS': 'MCS',
                        'GTBS': 'TBS'}
             results = all_stats.get_results()
+            workspace_index = self.get_workspace_index()
             descriptions = {}
             for test_case_name in list(results.keys()):
                 try:
                     project_name = test_case_name.split('/')[0]
                     project_name = mapping.get(project_name, project_name)
                     descriptions[test_case_name] = \
-                        self.ptses[0].get_test_case_description(project_name, test_case_name)
+                        workspace_index.get_test_case_description(project_name, test_case_name)
                 except:
                     log(f'Failed to get description of {test_case_name}')
 
+            if isinstance(workspace_index, WorkspaceIndex):
+                workspace_index.save()
+
             all_stats.update_descriptions(descriptions)
             all_stats.pts_ver = str(self.ptses[0].get_version())
             all_stats.platform = str(self.ptses[0].get_system_model())
@@ -834,9 +857,12 @@ def get_filtered_test_cases(iut_config, bot_args, config_default, pts):
         distribution_order.remove(config_default)
         distribution_order.append(config_default)
 
-    # Distribute test cases among .conf files
-    remaining_test_cases = copy.deepcopy(filtered_test_cases)
-    for config in distribution_order:
+    # Distribute test cases among .conf files. A test case goes to the
+    # first config with a matching prefix, and within the config it is
+    # grouped under the first matching prefix.
+    prefixes = autoptsclient.PrefixTrie()
+    buckets = {}
+    for config_index, config in enumerate(distribution_order):
         value = iut_config[config]
 
         # Merge .confs without 'test_cases' into the default one
@@ -848,13 +874,21 @@ def get_filtered_test_cases(iut_config, bot_args, config_default, pts):
 
         _args[config] = copy.deepcopy(_args[config_default])
 
-        for prefix in value['test_cases']:
-            for tc in filtered_test_cases:
-                if tc.startswith(prefix):
-                    _args[config].test_cases.append(tc)
-                    remaining_test_cases.remove(tc)
+        for prefix_index, prefix in enumerate(value['test_cases']):
+            prefixes.add(prefix, (config_index, prefix_index))
+
+    remaining_test_cases = []
+    for tc in filtered_test_cases:
+        match = min(prefixes.values(tc), default=None)
+        if match is None:
+            remaining_test_cases.append(tc)
+        else:
+            buckets.setdefault(match, []).append(tc)
 
-            filtered_test_cases = copy.deepcopy(remaining_test_cases)
+    for (config_index, _), test_cases in sorted(buckets.items()):
+        _args[distribution_order[config_index]].test_cases += test_cases
+
+    filtered_test_cases = remaining_test_cases
 
     # Remaining test cases will be run with the default .conf file
     # if default .conf doesn't have already defined test cases
@@ -869,16 +903,11 @@ def get_filtered_test_cases(iut_config, bot_args, config_default, pts):
 def sort_and_reduce_prefixes(prefixes):
     sorted_prefixes = sorted(prefixes, key=len)
     final_prefixes = []
+    trie = autoptsclient.PrefixTrie()
 
     for s in sorted_prefixes:
-        duplicated = False
-
-        for f in final_prefixes:
-            if s.startswith(f):
-                duplicated = True
-                break
-
-        if not duplicated:
+        if trie.match(s) is None:
+            trie.add(s)
             final_prefixes.append(s)
 
     return final_prefixes
@@ -919,12 +948,13 @@ def get_tc_res_data(tc_results, test_groups):
 # ****************************************************************************
 
 
-def check_call(cmd, env=None, cwd=None, shell=True):
+def check_call(cmd, env=None, cwd=None, shell=True, stdout=None):
     """Run command with arguments.  Wait for command to complete.
     :param cmd: command to run
     :param env: environment variables for the new process
     :param cwd: sets current directory before execution
     :param shell: if true, the command will be executed through the shell
+    :param stdout: file object for the output of the command, stderr included
     :return: returncode
     """
     executable = '/bin/bash'
@@ -936,6 +966,10 @@ def check_call(cmd, env=None, cwd=None, shell=True):
     logging.debug(f'Running cmd: {cmd}')
     sys.stdout.flush()
 
+    if stdout is not None:
+        return subprocess.check_call(cmd, env=env, cwd=cwd, shell=shell, executable=executable,
+                                     stdout=stdout, stderr=subprocess.STDOUT)
+
     return subprocess.check_call(cmd, env=env, cwd=cwd, shell=shell, executable=executable)
 
 
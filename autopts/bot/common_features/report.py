@@ -19,9 +19,10 @@ import os
 import re
 import shutil
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
-from xmlrpc.client import ServerProxy
+from xmlrpc.client import Fault, ServerProxy
 
 import git
 import xlsxwriter
@@ -34,6 +35,10 @@ from autopts.config import AUTOPTS_ROOT_DIR
 
 log = logging.debug
 
+# Size of the chunks in which logs are read from auto-pts servers
+LOG_CHUNK_SIZE = 4 * 1024 * 1024
+PASS_VERDICT = b'Final Verdict:PASS'
+
 
 def get_errata(errata_files):
     errata = {}
@@ -311,6 +316,21 @@ def make_error_txt(msg, error_txt_path):
         f.write(msg)
 
 
+def make_build_times_txt(build_times_txt_path, build_times):
+    """Creates txt file with the firmware build times
+    :param build_times: list of (overlays, kind, seconds) of the builds
+    :return: txt file path
+    """
+    with open(build_times_txt_path, "w") as f:
+        for overlays, kind, seconds in build_times:
+            f.write(f"{kind.ljust(12, ' ')}{f'{seconds:.0f} s'.rjust(8, ' ')}  {overlays}\n")
+
+        f.write(f"{'total'.ljust(12, ' ')}"
+                f"{f'{sum(seconds for _, _, seconds in build_times):.0f} s'.rjust(8, ' ')}\n")
+
+    return build_times_txt_path
+
+
 def github_push_report(report_folder, log_git_conf, commit_msg):
     """Commits and pushes report folder to Github repo
     param: report_folder path to the report folder
@@ -400,8 +420,58 @@ def copy_server_log_file(tmp_dir, pts, ports):
         logging.exception(e)
 
 
+def pull_server_file(pts, file_path, local_path, delete=False, chunked=True):
+    """Copy a file of auto-pts server to local_path. With chunked set,
+    the file is read in chunks of LOG_CHUNK_SIZE and written as they
+    arrive, so that memory use does not grow with the file size.
+    :return: True if the file contains the PASS verdict, None if there
+    is no such file
+    """
+    if not chunked:
+        file_bin = pts.copy_file(file_path)
+        if delete:
+            pts.delete_file(file_path)
+
+        if file_bin is None:
+            return None
+
+        Path(os.path.dirname(local_path)).mkdir(parents=True, exist_ok=True)
+        with open(local_path, 'wb') as handle:
+            handle.write(file_bin.data)
+
+        return PASS_VERDICT in file_bin.data
+
+    file_bin = pts.read_file_chunk(file_path, 0, LOG_CHUNK_SIZE, delete)
+    if file_bin is None:
+        if delete:
+            # Directories are deleted once their files are pulled
+            pts.delete_file(file_path)
+        return None
+
+    offset = 0
+    passed = False
+    tail = b''
+
+    Path(os.path.dirname(local_path)).mkdir(parents=True, exist_ok=True)
+    with open(local_path, 'wb') as handle:
+        while True:
+            data = file_bin.data
+            handle.write(data)
+            offset += len(data)
+
+            # The verdict may be split between chunks
+            passed = passed or PASS_VERDICT in tail + data
+            tail = data[-len(PASS_VERDICT) + 1:]
+
+            if len(data) < LOG_CHUNK_SIZE:
+                return passed
+
+            file_bin = pts.read_file_chunk(file_path, offset, LOG_CHUNK_SIZE, delete)
+
+
 def pull_server_logs(args, tmp_dir, xml_folder):
     """Copy Bluetooth Protocol Viewer logs from auto-pts servers.
+    The servers are pulled in parallel.
     :param args: args
     """
 
@@ -420,6 +490,7 @@ def pull_server_logs(args, tmp_dir, xml_folder):
 
     def _pull_logs(_pts):
         last_xml = ('', '')
+        chunked = True
         file_list = _pts.list_workspace_tree(workspace_dir)
 
         if args.cron_optim:
@@ -432,33 +503,33 @@ def pull_server_logs(args, tmp_dir, xml_folder):
         # Last path will be workspace directory
         workspace_root = file_list.pop()
 
-        while len(file_list) > 0:
-            file_path = file_list.pop(0)
+        for file_path in file_list:
             xml_file_path = file_path
             try:
-                file_bin = _pts.copy_file(file_path)
-
-                if not any(file_path.endswith(ext) for ext in
-                           ['.pts', '.pqw6', '.xlsx', '.gitignore', '.bls', '.bqw', '.btt']):
-                    _pts.delete_file(file_path)
-
-                if file_bin is None:
-                    continue
+                delete = not any(file_path.endswith(ext) for ext in
+                                 ['.pts', '.pqw6', '.xlsx', '.gitignore', '.bls', '.bqw', '.btt'])
 
                 file_path = '/'.join([logs_folder,
                                       file_path[len(workspace_root) + 1:]
                                      .replace('\\', '/')])
-                Path(os.path.dirname(file_path)).mkdir(parents=True,
-                                                       exist_ok=True)
 
-                with open(file_path, 'wb') as handle:
-                    handle.write(file_bin.data)
+                try:
+                    passed = pull_server_file(_pts, xml_file_path, file_path, delete, chunked)
+                except Fault as e:
+                    if 'read_file_chunk' not in e.faultString:
+                        raise
+
+                    # Server without chunked reads
+                    chunked = False
+                    passed = pull_server_file(_pts, xml_file_path, file_path, delete, chunked)
+
+                if passed is None:
+                    continue
 
                 # Include PTS .xml logs of test cases with PASS verdict
                 # into a separate "XMLs" folder. Those will have reference
                 # entries in report.xlsx
-                if file_path.endswith('.xml') and 'tc_log' not in file_path \
-                        and b'Final Verdict:PASS' in file_bin.data:
+                if file_path.endswith('.xml') and 'tc_log' not in file_path and passed:
                     (test_name, timestamp) = split_xml_filename(file_path)
                     if test_name in last_xml[0]:
                         # When single test passes multiple times
@@ -475,12 +546,20 @@ def pull_server_logs(args, tmp_dir, xml_folder):
                     Path(os.path.dirname(xml_file_path)).mkdir(
                         parents=True,
                         exist_ok=True)
-                    with open(xml_file_path, 'wb') as handle:
-                        handle.write(file_bin.data)
+                    shutil.copyfile(file_path, xml_file_path)
                     last_xml = (xml_file_path, timestamp)
             except BaseException as e:
                 logging.exception(e)
 
+    def _pull_server_logs(addr, ports):
+        try:
+            with ServerProxy(f"http://{addr}:{ports[0]}/",
+                             allow_none=True) as proxy:
+                _pull_logs(proxy)
+                copy_server_log_file(tmp_dir, proxy, ports)
+        except BaseException as e:
+            logging.exception(e)
+
     if args.server_args:
         # Logs available locally
         _pull_logs(PtsServer)
@@ -496,11 +575,9 @@ def pull_server_logs(args, tmp_dir, xml_folder):
             else:
                 servers[address] = [port]
 
-        for addr in servers:
-            with ServerProxy(f"http://{addr}:{servers[addr][0]}/",
-                             allow_none=True) as proxy:
-                _pull_logs(proxy)
-                copy_server_log_file(tmp_dir, proxy, servers[addr])
+        with ThreadPoolExecutor(max_workers=len(servers) or 1) as executor:
+            for addr, ports in servers.items():
+                executor.submit(_pull_server_logs, addr, ports)
 
     return logs_folder, xml_folder
 
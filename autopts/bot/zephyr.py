@@ -17,11 +17,19 @@
 # more details.
 #
 
+import collections
+import datetime
+import hashlib
 import importlib
+import json
 import os
+import shutil
+import subprocess
 import sys
 import time
 import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import serial
@@ -29,12 +37,18 @@ import serial
 from autopts import bot
 from autopts import client as autoptsclient
 from autopts.bot.common import BotClient, BotConfigArgs, BuildAndFlashException
-from autopts.ptsprojects.boards import get_board_type, get_build_and_flash, tty_to_com
+from autopts.bot.common_features import report
+from autopts.ptsprojects.boards import get_board_type, get_build, get_build_and_flash, get_flash, tty_to_com
 from autopts.ptsprojects.zephyr import ZEPHYR_PROJECT_URL
 from autopts.ptsprojects.zephyr.iutctl import get_iut, log
+from autopts.pybtp.capabilities import CAPABILITY_CACHE
 
 PROJECT_NAME = Path(__file__).stem
 
+# Number of complete builds kept in the build cache
+BUILD_CACHE_SIZE = int(os.getenv("AUTOPTS_BUILD_CACHE_SIZE", "10"))
+BUILD_STAMP = '.autopts_build_complete'
+
 
 def flush_serial(tty):
     """Clear the serial port buffer
@@ -62,18 +76,159 @@ def apply_overlay(zephyr_wd, cfg_name, overlay):
     :param overlay: defines changes to be applied
     :return: None
     """
+    with open(os.path.join(get_tester_dir(zephyr_wd), cfg_name), 'w') as config:
+        for k, v in list(overlay.items()):
+            config.write(f"{k}={v}\n")
+
+
+def get_tester_dir(zephyr_wd):
     tester_app_dir = os.getenv("AUTOPTS_SOURCE_DIR_APP")
     if tester_app_dir is None:
         tester_app_dir = os.path.join("tests", "bluetooth", "tester")
-    cwd = os.getcwd()
 
-    os.chdir(os.path.join(zephyr_wd, tester_app_dir))
+    return os.path.join(zephyr_wd, tester_app_dir)
 
-    with open(cfg_name, 'w') as config:
-        for k, v in list(overlay.items()):
-            config.write(f"{k}={v}\n")
 
-    os.chdir(cwd)
+def get_repo_head(path):
+    """Return the HEAD commit of a git repository, or None if it cannot
+    be read or the repository has local changes"""
+    try:
+        if subprocess.run(['git', 'diff', '--quiet', 'HEAD'], cwd=path).returncode:
+            return None
+
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=path,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_file_digest(path):
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+Firmware = namedtuple('Firmware', 'key build_dir cacheable')
+BuildTime = namedtuple('BuildTime', 'overlays kind seconds')
+
+
+class FirmwareBuilder:
+    """Builds firmware in the background, one build at a time
+
+    Every overlay set has its own build directory in the build cache,
+    which is built incrementally, so CMake reconfigures only the first
+    time an overlay set is built. Up to cache_size build directories
+    are kept. The stamp file of a build directory holds the key of its
+    firmware, i.e. a digest of the overlay contents and the HEAD commits
+    of the repositories, so that an unchanged firmware is not rebuilt.
+    Builds from repositories with local changes are never reused.
+    """
+
+    def __init__(self, cache_dir, cache_size=BUILD_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.build_times = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='FirmwareBuilder')
+        self._builds = {}
+
+    def get_key(self, args, overlays):
+        """Return (key, build_name, cacheable) of the firmware"""
+        parts = [args.board_name, overlays, args.build_env_cmd]
+        build_name = f'{args.board_name}-{hashlib.sha1(json.dumps(parts).encode()).hexdigest()[:16]}'
+
+        tester_dir = get_tester_dir(args.project_path)
+        parts += [get_file_digest(os.path.join(tester_dir, name))
+                  for name in overlays.split(';')]
+
+        repos = [args.project_path]
+        if isinstance(args.project_repos, dict):
+            repos += [repo['path'] for repo in args.project_repos.values()
+                      if isinstance(repo, dict) and 'path' in repo]
+        elif isinstance(args.project_repos, list):
+            repos += args.project_repos
+
+        heads = [get_repo_head(repo) for repo in repos]
+        parts += heads
+
+        key = hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+        return key, build_name, None not in heads
+
+    def submit(self, args, overlays):
+        """Start building the firmware, unless it is being built already"""
+        key, build_name, cacheable = self.get_key(args, overlays)
+
+        if key not in self._builds:
+            log(f'Queued firmware build {build_name} of {overlays}')
+            self._builds[key] = self._executor.submit(self._build, key, build_name,
+                                                      cacheable, args, overlays)
+
+        return key
+
+    def result(self, key):
+        """Wait for the build and return its Firmware, or raise its error"""
+        return self._builds.pop(key).result()
+
+    def _build(self, key, build_name, cacheable, args, overlays):
+        build_dir = os.path.join(self.cache_dir, build_name)
+        stamp = os.path.join(build_dir, BUILD_STAMP)
+
+        if cacheable and os.path.exists(stamp):
+            with open(stamp) as f:
+                if f.read() == key:
+                    log(f'Using cached firmware build {build_dir}')
+                    os.utime(stamp)
+                    self.build_times.append(BuildTime(overlays, 'cached', 0.0))
+                    return Firmware(key, build_dir, cacheable)
+
+        build = get_build(args.board_name)
+        board_type = get_board_type(args.board_name)
+        kind = 'incremental' if os.path.exists(stamp) else 'pristine'
+
+        os.makedirs(build_dir, exist_ok=True)
+        # Mark the build directory as used, but holding no firmware yet
+        open(stamp, 'w').close()
+
+        start = time.monotonic()
+        with open(f'{build_dir}.log', 'w') as build_log:
+            try:
+                build(args.project_path, board_type, overlays, args.build_env_cmd,
+                      build_dir, stdout=build_log, pristine=kind == 'pristine')
+            except subprocess.CalledProcessError:
+                if kind == 'pristine':
+                    raise
+
+                log(f'Incremental build of {build_name} failed, retrying pristine build')
+                kind = 'pristine'
+                build(args.project_path, board_type, overlays, args.build_env_cmd,
+                      build_dir, stdout=build_log, pristine=True)
+
+        seconds = time.monotonic() - start
+        self.build_times.append(BuildTime(overlays, kind, seconds))
+        log(f'Firmware build {build_name} ({kind}) took {seconds:.0f} s')
+
+        os.makedirs(build_dir, exist_ok=True)
+        with open(stamp, 'w') as f:
+            f.write(key if cacheable else '')
+
+        self._evict()
+
+        return Firmware(key, build_dir, cacheable)
+
+    def _evict(self):
+        stamps = []
+        for name in os.listdir(self.cache_dir):
+            stamp = os.path.join(self.cache_dir, name, BUILD_STAMP)
+            if os.path.exists(stamp):
+                stamps.append((os.path.getmtime(stamp), name))
+
+        for _, name in sorted(stamps, reverse=True)[self.cache_size:]:
+            log(f'Removing build directory {name} from the build cache')
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            if os.path.exists(os.path.join(self.cache_dir, f'{name}.log')):
+                os.remove(os.path.join(self.cache_dir, f'{name}.log'))
 
 
 def zephyr_hash_url(commit):
@@ -102,8 +257,13 @@ class ZephyrBotClient(BotClient):
         super().__init__(get_iut, project, 'zephyr', ZephyrBotConfigArgs,
                          ZephyrBotCliParser)
         self.config_default = "prj.conf"
+        self.builder = None
+        # Firmware flashed to the IUT, if it can be reused
+        self.flashed_key = None
 
-    def apply_config(self, args, config, value):
+    def get_overlays(self, args, config, value):
+        """Write the overlay files of the config and return them in the
+        format of the -DEXTRA_CONF_FILE option"""
         pre_overlay = value.get('pre_overlay', [])
         if isinstance(pre_overlay, str):
             pre_overlay = [pre_overlay]
@@ -125,11 +285,31 @@ class ZephyrBotClient(BotClient):
             configs.append(name)
 
         # The order is used in the -DEXTRA_CONF_FILE="<overlay1>;<...>" option.
-        overlays = ';'.join(configs)
+        return ';'.join(configs)
+
+    def can_build_in_background(self, args):
+        return (not args.no_build and get_build(args.board_name) is not None and
+                get_flash(args.board_name) is not None)
+
+    def get_builder(self):
+        if self.builder is None:
+            self.builder = FirmwareBuilder(self.file_paths['BUILD_CACHE_DIR'])
+
+        return self.builder
+
+    def prepare_config(self, args, config, value):
+        if self.can_build_in_background(args):
+            self.get_builder().submit(args, self.get_overlays(args, config, value))
+
+    def apply_config(self, args, config, value):
+        overlays = self.get_overlays(args, config, value)
 
         log(f"TTY path: {args.tty_file}")
 
-        if not args.no_build:
+        if self.can_build_in_background(args):
+            self.build_and_flash(args, overlays)
+        elif not args.no_build:
+            CAPABILITY_CACHE.set_firmware(None)
             build_and_flash = get_build_and_flash(args.board_name)
             board_type = get_board_type(args.board_name)
 
@@ -145,6 +325,36 @@ class ZephyrBotClient(BotClient):
 
             time.sleep(10)
 
+    def build_and_flash(self, args, overlays):
+        """Flash the firmware built in the background, unless it is
+        flashed already"""
+        builder = self.get_builder()
+
+        try:
+            firmware = builder.result(builder.submit(args, overlays))
+
+            if firmware.cacheable and firmware.key == self.flashed_key:
+                log(f'Firmware {firmware.key} is flashed already')
+                return
+
+            self.flashed_key = None
+            CAPABILITY_CACHE.set_firmware(None)
+            get_flash(args.board_name)(args.project_path, args.debugger_snr,
+                                       args.build_env_cmd, firmware.build_dir)
+            self.flashed_key = firmware.key
+
+            # The capabilities of firmware built from local changes are not cached
+            if firmware.cacheable:
+                CAPABILITY_CACHE.set_firmware(firmware.key)
+
+            flush_serial(args.tty_file)
+        except BaseException as e:
+            traceback.print_exception(e)
+            self.error_txt_content += "Build and flash step failed\n"
+            raise BuildAndFlashException from e
+
+        time.sleep(10)
+
     def start(self, args=None):
         super().start(args)
 
@@ -166,10 +376,22 @@ class ZephyrBotClient(BotClient):
 
         super().upload_logs_to_github(report_data)
 
+    def generate_attachments(self, report_data, attachments):
+        if self.builder and self.builder.build_times:
+            attachments.append(report.make_build_times_txt(
+                self.file_paths['BUILD_TIMES_TXT_FILE'], self.builder.build_times))
+
     def compose_mail(self, mail_ctx):
         if 'subject' not in mail_ctx:
             mail_ctx['subject'] = "[Zephyr] AutoPTS test session results"
 
+        if self.builder and self.builder.build_times:
+            kinds = collections.Counter(build.kind for build in self.builder.build_times)
+            total = sum(build.seconds for build in self.builder.build_times)
+            mail_ctx['additional_info'] = mail_ctx.get('additional_info', '') + (
+                f"<p><b>Firmware builds:</b> {', '.join(f'{n} {kind}' for kind, n in kinds.items())}, "
+                f"{datetime.timedelta(seconds=int(total))} in total</p>")
+
         return super().compose_mail(mail_ctx)
 
 
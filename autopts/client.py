@@ -26,21 +26,26 @@ import logging
 import os
 import queue
 import random
+import shlex
 import shutil
 import signal
 import socket
+import subprocess
 import sys
 import threading
 import time
 import traceback
 import xml.etree.ElementTree as ElementTree
 import xmlrpc.client
+from abc import ABC, abstractmethod
+from itertools import groupby
+from operator import itemgetter
 from os.path import dirname
 from xmlrpc.server import SimpleXMLRPCServer
 
 from termcolor import colored
 
-from autopts.config import FILE_PATHS
+from autopts.config import FILE_PATHS, generate_file_paths
 from autopts.ptsprojects import ptstypes, stack
 from autopts.ptsprojects.boards import get_available_boards, tty_to_com
 from autopts.ptsprojects.ptstypes import E_FATAL_ERROR
@@ -60,6 +65,7 @@ from autopts.utils import (
     set_global_end,
     ykush_replug_usb,
 )
+from autopts.workspace_index import get_workspace_index
 from cliparser import CliParser
 
 log = logging.debug
@@ -81,7 +87,95 @@ def logger_log(self, *args, **kwargs):
         self.original_log(*args, **kwargs)
 
 
-class PtsServerProxy(xmlrpc.client.ServerProxy):
+# Methods that send one PIXIT change, used to find the one that failed
+PIXIT_SINGLE_METHODS = {
+    'set_pixits_bulk': 'set_pixit',
+    'update_pixit_params': 'update_pixit_param',
+}
+
+
+class PixitBatchMixin(ABC):
+    """Sends the PIXIT changes made before a test case in few requests
+
+    set_pixit() and update_pixit_param() calls are queued and sent in
+    order before the test case is run, consecutive calls of the same
+    method as one set_pixits_bulk() or update_pixit_params() request.
+    PTS reverts the updated PIXITs to the values from set_pixit() after
+    every test case, so updates to that value of a PIXIT that has not
+    been changed since the previous test case are not sent at all.
+    If a request fails, its PIXITs are sent one by one to log the
+    change that failed.
+    """
+
+    def _init_pixit_batch(self):
+        self._pixit_queue = []
+        self._pixit_defaults = {}
+        self._pixit_changed = set()
+
+    @abstractmethod
+    def _call(self, method_name, *args):
+        """Call the method of the PTS server"""
+
+    def _send_pixits(self, method_name, pixits):
+        try:
+            self._call(method_name, pixits)
+            return
+        except Exception as e:
+            logging.exception(e)
+
+        single_method = PIXIT_SINGLE_METHODS[method_name]
+        pixit = None
+        try:
+            for pixit in pixits:
+                self._call(single_method, *pixit)
+        except Exception:
+            logging.error("Failed to %s %r", single_method, pixit)
+            raise
+
+    def set_pixit(self, project_name, param_name, param_value):
+        self._pixit_queue.append(('set_pixits_bulk', (project_name, param_name, param_value)))
+
+    def update_pixit_param(self, project_name, param_name, new_param_value):
+        self._pixit_queue.append(('update_pixit_params', (project_name, param_name, new_param_value)))
+
+    def flush_pixits(self):
+        """Send the queued PIXIT changes"""
+        pixit_queue, self._pixit_queue = self._pixit_queue, []
+
+        for method_name, items in groupby(pixit_queue, key=itemgetter(0)):
+            pixits = [pixit for _, pixit in items]
+
+            if method_name == 'set_pixits_bulk':
+                self._send_pixits(method_name, pixits)
+                for project_name, param_name, param_value in pixits:
+                    self._pixit_defaults[(project_name, param_name)] = param_value
+                    self._pixit_changed.discard((project_name, param_name))
+                continue
+
+            # The last update of a PIXIT wins
+            updates = {(project_name, param_name): value
+                       for project_name, param_name, value in pixits}
+            pixits = [(*key, value) for key, value in updates.items()
+                      if key in self._pixit_changed or self._pixit_defaults.get(key) != value]
+
+            if pixits:
+                self._send_pixits(method_name, pixits)
+                self._pixit_changed.update(key for key, value in updates.items()
+                                           if self._pixit_defaults.get(key) != value)
+
+    def cleanup_caches(self):
+        self._init_pixit_batch()
+        return self._call('cleanup_caches')
+
+    def run_test_case(self, project_name, test_case_name):
+        self.flush_pixits()
+        result = self._call('run_test_case', project_name, test_case_name)
+        # PTS reverts the PIXITs changed for this test case
+        self._pixit_changed.clear()
+        return result
+
+
+class PtsServerProxy(PixitBatchMixin, xmlrpc.client.ServerProxy):
     """Client to remote autoptsserver"""
     def __init__(self, server_address, server_port):
         super().__init__(uri=f"http://{server_address}:{server_port}/",
@@ -92,6 +186,10 @@ class PtsServerProxy(xmlrpc.client.ServerProxy):
         self.info = f"{server_address}:{server_port}"
         self.callback_thread = None
         self.callback = None
+        self._init_pixit_batch()
+
+    def _call(self, method_name, *args):
+        return xmlrpc.client.ServerProxy.__getattr__(self, method_name)(*args)
 
     @staticmethod
     def factory_get_instance(_id, server_address, server_port,
@@ -151,7 +249,7 @@ else:
     Server = FakeProxy
 
 
-class PtsServer(Server):
+class PtsServer(PixitBatchMixin, Server):
     """Builtin instance of autoptsserver for one process mode"""
 
     # Counter of closed autoptsservers
@@ -160,6 +258,10 @@ class PtsServer(Server):
     def __init__(self, _args=None):
         super().__init__(PtsServer.finish_count, _args=_args)
         self.info = f'builtin {_args.srv_port}'
+        self._init_pixit_batch()
+
+    def _call(self, method_name, *args):
+        return self._dispatch_to_pts(method_name, *args)
 
     @staticmethod
     def factory_get_instance(args, timeout):
@@ -493,6 +595,8 @@ def init_pts_thread_entry(proxy, args, exceptions, finish_count):
             log("Set bd_addr PIXIT: %s for project: %s", args.bd_addr, project_name)
             proxy.update_pixit_param(project_name, "TSPX_bd_addr_iut", args.bd_addr)
 
+        proxy.flush_pixits()
+
     proxy.enable_maximum_logging(args.enable_max_logs)
 
 
@@ -564,6 +668,18 @@ def get_result_color(status):
 
 
 class TestCaseRunStats:
+    """Results of a test session
+
+    The results are kept in memory, indexed by test case name. Every
+    update is appended to a journal next to the results XML file, and
+    the journal is compacted into the XML file every COMPACT_INTERVAL
+    updates, on merge and on update_descriptions. The XML file plus the
+    journal always hold the complete results, so a session can be
+    resumed from them after a crash.
+    """
+
+    COMPACT_INTERVAL = 100
+
     def __init__(self, projects, test_cases, retry_count, db=None,
                  xml_results_file=None):
         self.pts_ver = ''
@@ -580,10 +696,15 @@ class TestCaseRunStats:
         self.xml_results = xml_results_file
         self.db = db
         self.est_duration = 0
+        self.est_duration_p95 = 0
         self.pending_config = None
         self.pending_test_case = None
         self.test_run_completed = False
         self.session_log_dir = None
+        self._records = None
+        self._index = None
+        self._journal_len = None
+        self._previous_results = {}
 
         if self.xml_results and not os.path.exists(self.xml_results):
             os.makedirs(dirname(self.xml_results), exist_ok=True)
@@ -591,14 +712,103 @@ class TestCaseRunStats:
             tree = ElementTree.ElementTree(root)
             tree.write(self.xml_results)
 
+            # A journal without its results file is a leftover
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+
+        if self.xml_results:
+            self._load()
+
         if self.db:
             self.est_duration = db.estimate_session_duration(test_cases,
                                                              self.run_count_max)
+            self.est_duration_p95 = db.estimate_session_duration(test_cases,
+                                                                 self.run_count_max,
+                                                                 percentile=95)
+            results = db.get_results(test_cases)
+            self._previous_results = {tc: results.get(tc) for tc in test_cases}
+
+    @property
+    def journal_file(self):
+        return f'{self.xml_results}.journal'
+
+    def _load(self):
+        """Load the results from the XML file and replay the journal"""
+        self._records = []
+        self._index = {}
+        self._journal_len = 0
+
+        if not self.xml_results or not os.path.exists(self.xml_results):
+            return
+
+        root = ElementTree.parse(self.xml_results).getroot()
+        for tc_xml in root.findall("./test_case"):
+            self._add_record(dict(tc_xml.attrib))
+
+        if not os.path.exists(self.journal_file):
+            return
+
+        with open(self.journal_file) as f:
+            for line in f:
+                try:
+                    pos, record = json.loads(line)
+                except ValueError:
+                    # The last entry may be cut off by a crash
+                    break
+
+                if pos < len(self._records):
+                    self._records[pos].clear()
+                    self._records[pos].update(record)
+                else:
+                    self._add_record(record)
+
+                self._journal_len += 1
+
+    def _get_records(self):
+        if self._records is None:
+            self._load()
+
+        return self._records
+
+    def _add_record(self, record):
+        self._records.append(record)
+        # Like an XPath lookup, the name refers to its first record
+        self._index.setdefault(record["name"], len(self._records) - 1)
+
+    def _journal(self, pos):
+        if not self.xml_results:
+            return
+
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps([pos, self._records[pos]]) + '\n')
+
+        self._journal_len += 1
+        if self._journal_len >= self.COMPACT_INTERVAL:
+            self.compact()
+
+    def compact(self):
+        """Write the results to the XML file and drop the journal"""
+        records = self._get_records()
+        if not self.xml_results:
+            return
+
+        root = ElementTree.Element("results")
+        for record in records:
+            ElementTree.SubElement(root, 'test_case', record)
+
+        tmp_file = f'{self.xml_results}.tmp'
+        ElementTree.ElementTree(root).write(tmp_file)
+        os.replace(tmp_file, self.xml_results)
+
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+        self._journal_len = 0
 
     def save_to_backup(self, filename):
         data_to_save = {key: value
                         for key, value in self.__dict__.items()
-                        if isinstance(value, (int, str, bool))}
+                        if isinstance(value, (int, str, bool)) and not key.startswith('_')}
 
         with open(filename, 'w') as json_file:
             json.dump(data_to_save, json_file, indent=4)
@@ -617,100 +827,97 @@ class TestCaseRunStats:
         self.max_project_name = max(self.max_project_name, stats2.max_project_name)
         self.max_test_case_name = max(self.max_test_case_name, stats2.max_test_case_name)
         self.est_duration = self.est_duration + stats2.est_duration
+        self.est_duration_p95 = self.est_duration_p95 + stats2.est_duration_p95
         self.pending_config = stats2.pending_config
         self.pending_test_case = stats2.pending_test_case
         self.session_log_dir = stats2.session_log_dir
 
-        stats2_tree = ElementTree.parse(stats2.xml_results)
-        root2 = stats2_tree.getroot()
+        self._get_records()
+        for record in stats2._get_records():
+            self._add_record(dict(record))
 
-        self_tree = ElementTree.parse(self.xml_results)
-        root1 = self_tree.getroot()
-        root1.extend(root2)
-        self_tree.write(self.xml_results)
+        self.compact()
 
     def update(self, test_case_name, duration, status, description='', test_start_time=None, test_end_time=None):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
+        records = self._get_records()
 
-        elem = root.find(f"./test_case[@name='{test_case_name}']")
-        if elem is None:
-            elem = ElementTree.SubElement(root, 'test_case')
-            elem.attrib["new"] = '0'
+        pos = self._index.get(test_case_name)
+        if pos is None:
+            elem = {"new": '0'}
 
             status_previous = None
             if self.db:
-                status_previous = self.db.get_result(test_case_name)
-                if status_previous is None:
-                    elem.attrib["new"] = '1'
-
-            elem.attrib["project"] = test_case_name.split('/')[0]
-            elem.attrib["name"] = test_case_name
-            elem.attrib["duration"] = str(duration)
-            elem.attrib["status"] = ""
-            elem.attrib["status_previous"] = str(status_previous)
-            elem.attrib["description"] = description
-            elem.attrib["test_start_time"] = ""
-            elem.attrib["test_end_time"] = ""
+                if test_case_name in self._previous_results:
+                    status_previous = self._previous_results[test_case_name]
+                else:
+                    status_previous = self.db.get_result(test_case_name)
 
+                if status_previous is None:
+                    elem["new"] = '1'
+
+            elem["project"] = test_case_name.split('/')[0]
+            elem["name"] = test_case_name
+            elem["duration"] = str(duration)
+            elem["status"] = ""
+            elem["status_previous"] = str(status_previous)
+            elem["description"] = description
+            elem["test_start_time"] = ""
+            elem["test_end_time"] = ""
+
+            self._add_record(elem)
+            pos = len(records) - 1
             run_count = 0
         else:
-            run_count = int(elem.attrib["run_count"])
+            elem = records[pos]
+            run_count = int(elem["run_count"])
 
-        elem.attrib["status"] = status
+        elem["status"] = status
 
         if test_start_time is not None:
-            elem.attrib["test_start_time"] = test_start_time.strftime('%Y-%m-%d %H:%M:%S')
+            elem["test_start_time"] = test_start_time.strftime('%Y-%m-%d %H:%M:%S')
         if test_end_time is not None:
-            elem.attrib["test_end_time"] = test_end_time.strftime('%Y-%m-%d %H:%M:%S')
+            elem["test_end_time"] = test_end_time.strftime('%Y-%m-%d %H:%M:%S')
 
-        regression = bool(elem.attrib["status"] != "PASS" and elem.attrib["status_previous"] == "PASS")
-        progress = bool(elem.attrib["status"] == "PASS" and elem.attrib["status_previous"] != "PASS"
-                        and elem.attrib["status_previous"] != "None")
+        regression = bool(elem["status"] != "PASS" and elem["status_previous"] == "PASS")
+        progress = bool(elem["status"] == "PASS" and elem["status_previous"] != "PASS"
+                        and elem["status_previous"] != "None")
 
-        elem.attrib["regression"] = str(regression)
-        elem.attrib["progress"] = str(progress)
-        elem.attrib["run_count"] = str(run_count + 1)
+        elem["regression"] = str(regression)
+        elem["progress"] = str(progress)
+        elem["run_count"] = str(run_count + 1)
 
-        tree.write(self.xml_results)
+        self._journal(pos)
 
         return regression, progress
 
     def update_descriptions(self, descriptions):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
+        records = self._get_records()
 
         for tc in descriptions.keys():
-            elem = root.find(f"./test_case[@name='{tc}']")
-            if elem is None:
+            pos = self._index.get(tc)
+            if pos is None:
                 continue
 
-            elem.attrib["description"] = descriptions[tc]
+            records[pos]["description"] = descriptions[tc]
 
-        tree.write(self.xml_results)
+        self.compact()
 
     def get_descriptions(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
         descriptions = {}
 
-        for tc_xml in root.findall("./test_case"):
-            descriptions[tc_xml.attrib["name"]] = tc_xml.attrib["description"]
+        for tc_xml in self._get_records():
+            descriptions[tc_xml["name"]] = tc_xml["description"]
 
         return descriptions
 
     def get_results(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
         results = {}
-        for tc_xml in root.findall("./test_case"):
-            status = tc_xml.attrib["status"]
-            run_count = tc_xml.attrib["run_count"]
-            start_time = tc_xml.attrib.get("test_start_time")
-            end_time = tc_xml.attrib.get("test_end_time")
-            duration = tc_xml.attrib.get("duration")
+        for tc_xml in self._get_records():
+            status = tc_xml["status"]
+            run_count = tc_xml["run_count"]
+            start_time = tc_xml.get("test_start_time")
+            end_time = tc_xml.get("test_end_time")
+            duration = tc_xml.get("duration")
 
             patterns = ["UNKNOWN VERDICT"]
             parsed_result = status
@@ -722,7 +929,7 @@ class TestCaseRunStats:
                     parsed_result = pattern
                     break
 
-            results[tc_xml.attrib["name"]] = {
+            results[tc_xml["name"]] = {
                 "status": status,
                 "run_count": run_count,
                 "test_start_time": start_time,
@@ -735,54 +942,45 @@ class TestCaseRunStats:
         return results
 
     def get_regressions(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-        tcs_xml = root.findall("./test_case[@regression='True']")
-
-        return [tc_xml.attrib["name"] for tc_xml in tcs_xml]
+        return [tc_xml["name"] for tc_xml in self._get_records()
+                if tc_xml.get("regression") == 'True']
 
     def get_progresses(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-        tcs_xml = root.findall("./test_case[@progress='True']")
-
-        return [tc_xml.attrib["name"] for tc_xml in tcs_xml]
+        return [tc_xml["name"] for tc_xml in self._get_records()
+                if tc_xml.get("progress") == 'True']
 
     def get_new_cases(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-        tcs_xml = root.findall("./test_case[@new='1']")
-
-        return [tc_xml.attrib["name"] for tc_xml in tcs_xml]
+        return [tc_xml["name"] for tc_xml in self._get_records()
+                if tc_xml.get("new") == '1']
 
     def get_status_count(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
         status_dict = {}
 
-        for test_case_xml in root.findall("./test_case"):
-            if test_case_xml.attrib["status"] not in status_dict:
-                status_dict[test_case_xml.attrib["status"]] = 0
+        for test_case_xml in self._get_records():
+            if test_case_xml["status"] not in status_dict:
+                status_dict[test_case_xml["status"]] = 0
 
-            status_dict[test_case_xml.attrib["status"]] += 1
+            status_dict[test_case_xml["status"]] += 1
 
         return status_dict
 
     def print_summary(self, detailed=False):
         """Prints test case list status summary"""
+        regressions = self.get_regressions()
+        progresses = self.get_progresses()
+
         print("\nSummary:\n")
         print(get_formatted_summary(self.get_status_count(),
                                     self.num_test_cases,
-                                    len(self.get_regressions()),
-                                    len(self.get_progresses())))
+                                    len(regressions),
+                                    len(progresses)))
         if not detailed:
             return
 
         print('\nRegressions:')
-        print('\n'.join(self.get_regressions()))
+        print('\n'.join(regressions))
         print('\nProgresses:')
-        print('\n'.join(self.get_progresses()))
+        print('\n'.join(progresses))
         print('\nNew cases:')
         print('\n'.join(self.get_new_cases()))
 
@@ -1218,22 +1416,77 @@ test_case_blacklist = [
 ]
 
 
+class PrefixTrie:
+    """Test case name prefixes, each with a value
+
+    A lookup walks the name once, so its cost does not depend on the
+    number of prefixes. If a prefix is added twice, its first value is
+    kept.
+    """
+
+    _END = ''  # The key of a prefix value, never a name character
+
+    def __init__(self, prefixes=()):
+        self._root = {}
+        self._len = 0
+
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, prefix, value=True):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+
+        if self._END not in node:
+            node[self._END] = value
+            self._len += 1
+
+    def values(self, name):
+        """Yield the values of all prefixes of name, shortest first"""
+        node = self._root
+        if self._END in node:
+            yield node[self._END]
+
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                return
+
+            if self._END in node:
+                yield node[self._END]
+
+    def match(self, name):
+        """Return the value of the shortest prefix of name, or None"""
+        return next(self.values(name), None)
+
+
+def as_prefix_trie(prefixes):
+    if isinstance(prefixes, PrefixTrie):
+        return prefixes
+
+    return PrefixTrie(prefixes or ())
+
+
 def run_or_not(test_case_name, test_cases, excluded):
+    """
+    param: test_cases: prefixes of the test cases to run, as a list or
+                       a PrefixTrie. If empty, all test cases are run.
+    param: excluded: prefixes of the test cases not to run, as a list or
+                     a PrefixTrie
+    """
     for entry in test_case_blacklist:
         if entry in test_case_name:
             return False
 
-    if excluded:
-        for n in excluded:
-            if test_case_name.startswith(n):
-                return False
+    if excluded and as_prefix_trie(excluded).match(test_case_name) is not None:
+        return False
 
     if test_cases:
-        for n in test_cases:
-            if test_case_name.startswith(n):
-                return True
-
-        return False
+        return as_prefix_trie(test_cases).match(test_case_name) is not None
 
     # Empty test_cases means "run them all"
     return True
@@ -1249,6 +1502,8 @@ def get_test_cases(pts, test_cases, excluded):
     """
 
     projects = pts.get_project_list()
+    test_cases = as_prefix_trie(test_cases)
+    excluded = as_prefix_trie(excluded)
 
     _test_cases = []
 
@@ -1259,6 +1514,57 @@ def get_test_cases(pts, test_cases, excluded):
     return _test_cases
 
 
+def shard_test_cases(test_cases, shard_count, durations, pinned=()):
+    """Split test cases into shard_count lists of similar total duration
+
+    param: durations: {name: mean duration} from the test case database.
+                      Test cases not found there are assumed to take
+                      the average duration.
+    param: pinned: test cases to run in the first shard, e.g. the ones
+                   needing more than one PTS instance.
+
+    The test cases are assigned longest first to the least loaded shard.
+    Every shard keeps the original order of its test cases.
+    """
+    known = [durations[tc] for tc in test_cases if durations.get(tc) is not None]
+    default_duration = sum(known) / len(known) if known else 1
+
+    def duration(tc):
+        if durations.get(tc) is None:
+            return default_duration
+        return durations[tc]
+
+    shards = [[] for _ in range(shard_count)]
+    loads = [0] * shard_count
+
+    for tc in test_cases:
+        if tc in pinned:
+            shards[0].append(tc)
+            loads[0] += duration(tc)
+
+    for tc in sorted((tc for tc in test_cases if tc not in pinned), key=duration, reverse=True):
+        i = min(range(shard_count), key=loads.__getitem__)
+        shards[i].append(tc)
+        loads[i] += duration(tc)
+
+    order = {tc: i for i, tc in enumerate(test_cases)}
+    return [sorted(shard, key=order.get) for shard in shards]
+
+
+def strip_shard_args(argv):
+    """Return command line arguments without the --shard options"""
+    stripped = []
+    args = iter(argv)
+
+    for arg in args:
+        if arg == '--shard':
+            next(args, None)
+        elif not arg.startswith('--shard='):
+            stripped.append(arg)
+
+    return stripped
+
+
 def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
     """Runs a list of test cases"""
     session_log_dir = stats.session_log_dir
@@ -1283,9 +1589,15 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
 
     approx = ''
     if stats.est_duration:
-        approx = " in approximately: " + str(datetime.timedelta(seconds=stats.est_duration))
+        approx = " in approximately: " + str(datetime.timedelta(seconds=int(stats.est_duration)))
+        if stats.est_duration_p95 > stats.est_duration:
+            approx += f" (p95: {datetime.timedelta(seconds=int(stats.est_duration_p95))})"
     print(f"Number of test cases to run: {stats.num_test_cases}{approx}")
 
+    superguard_timeouts = {}
+    if getattr(args, 'adaptive_superguard', False) and stats.db:
+        superguard_timeouts = stats.db.get_superguard_timeouts(test_cases, args.superguard)
+
     for test_case in test_cases:
         stats.run_count = 0
         test_retry_count = None
@@ -1300,7 +1612,8 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
 
             status, duration = run_test_case(ptses, test_case_instances,
                                              test_case, stats, session_log_dir,
-                                             exceptions, args.superguard)
+                                             exceptions,
+                                             superguard_timeouts.get(test_case, args.superguard))
 
             raise_on_global_end()
 
@@ -1326,7 +1639,8 @@ def run_test_cases(ptses, test_case_instances, args, stats, **kwargs):
             if (status in ('PASS', 'MISSING WID ERROR') and not args.stress_test) or \
                     stats.run_count == retry_limit:
                 if stats.db:
-                    stats.db.update_statistics(test_case, duration, status)
+                    stats.db.update_statistics(test_case, duration, status,
+                                               stats.pending_config)
 
                 break
 
@@ -1367,6 +1681,7 @@ class Client:
         self.arg_parser = parser_class(cli_support=autoprojects.iutctl.CLI_SUPPORT, board_names=self.boards)
         self.prev_sigint_handler = None
         self.test_case_database = None
+        self.workspace_index = None
 
     def parse_config_and_args(self, args_namespace=None):
         if args_namespace is None:
@@ -1381,6 +1696,12 @@ class Client:
 
         tc_db_table_name = self.store_tag + str(self.args.board_name)
 
+        if self.args.shard_index is not None:
+            # The clients of all shards update the same database
+            self.test_case_database = TestCaseTable(tc_db_table_name,
+                                                    self.args.database_file)
+            return
+
         if os.path.exists(self.args.database_file) and \
                 not os.path.exists(self.file_paths['TEST_CASE_DB_FILE']):
             shutil.copy(self.args.database_file, self.file_paths['TEST_CASE_DB_FILE'])
@@ -1388,6 +1709,15 @@ class Client:
         self.test_case_database = TestCaseTable(tc_db_table_name,
                                                 self.file_paths['TEST_CASE_DB_FILE'])
 
+    def get_workspace_index(self):
+        """Return the index of the workspace, serving the project and test
+        case lists and descriptions without calls to PTS"""
+        if self.workspace_index is None:
+            self.workspace_index = get_workspace_index(self.args.workspace, self.ptses[0],
+                                                       self.file_paths['WORKSPACE_INDEX_DIR'])
+
+        return self.workspace_index
+
     def start(self, args=None):
         """Start main with exception handling."""
 
@@ -1437,6 +1767,15 @@ class Client:
         elif self.args.sudo:
             sys.exit("Please run this program as root.")
 
+        if self.args.shards and self.args.shard_index is None:
+            return self.run_shards()
+
+        if self.args.shard_index is not None:
+            # The shards share the caches, but not the results and the logs
+            shard_dir = f'shard_{self.args.shard_index}'
+            generate_file_paths({'TMP_DIR': os.path.join(self.file_paths['TMP_DIR'], shard_dir),
+                                 'IUT_LOGS_DIR': os.path.join(self.file_paths['IUT_LOGS_DIR'], shard_dir)})
+
         os.makedirs(self.file_paths["TMP_DIR"], exist_ok=True)
 
         self.load_test_case_database()
@@ -1456,7 +1795,11 @@ class Client:
         self.cleanup()
 
         if self.args.store:
-            shutil.move(self.file_paths['TEST_CASE_DB_FILE'], self.args.database_file)
+            # Checkpoint the WAL into the database file before moving it
+            self.test_case_database.close()
+
+            if self.args.shard_index is None:
+                shutil.move(self.file_paths['TEST_CASE_DB_FILE'], self.args.database_file)
 
         print("\nBye!")
         sys.stdout.flush()
@@ -1479,11 +1822,15 @@ class Client:
         build-flash-run routines, so multiple reinitialization could
         be skipped. See BotClient class in bot/common.py.
         """
-        self.args.test_cases = get_test_cases(self.ptses[0],
+        workspace_index = self.get_workspace_index()
+        self.args.test_cases = get_test_cases(workspace_index,
                                               self.args.test_cases,
                                               self.args.excluded)
 
-        projects = self.ptses[0].get_project_list()
+        if self.args.shard_count:
+            self.args.test_cases = self.select_shard_test_cases(self.args.test_cases)
+
+        projects = workspace_index.get_project_list()
 
         if os.path.exists(self.file_paths['TC_STATS_RESULTS_XML_FILE']):
             os.remove(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
@@ -1495,6 +1842,107 @@ class Client:
         return run_test_cases(self.ptses, self.test_cases, self.args, stats,
                               file_paths=copy.deepcopy(self.file_paths))
 
+    def select_shard_test_cases(self, test_cases):
+        """Return the test cases of the shard run by this client"""
+        durations = {}
+        if self.args.shard_durations:
+            with open(self.args.shard_durations) as f:
+                durations = json.load(f)
+
+        # Test cases with lower testers need the PTS instances of one shard
+        multi_lt = {tc.name for tc in self.test_cases if getattr(tc, 'name_lt2', None)}
+        shards = shard_test_cases(test_cases, self.args.shard_count, durations, multi_lt)
+
+        return shards[self.args.shard_index]
+
+    def run_shards(self):
+        """Runs the test cases in a client process per shard.
+
+        Every shard runs with its own PTS servers and IUT, so also with its
+        own BTP stack. The test cases are balanced across the shards with
+        the durations from the test case database and the results of all
+        shards are merged.
+        """
+        shard_count = len(self.args.shards)
+        os.makedirs(self.file_paths['TMP_DIR'], exist_ok=True)
+
+        # Every shard splits the test cases using the same durations,
+        # not affected by the updates made by the other shards.
+        durations = {}
+        if os.path.exists(self.args.database_file):
+            db = TestCaseTable(self.store_tag + str(self.args.board_name),
+                               self.args.database_file)
+            durations = db.get_all_mean_durations()
+            db.close()
+
+        durations_file = os.path.join(self.file_paths['TMP_DIR'], 'shard_durations.json')
+        with open(durations_file, 'w') as f:
+            json.dump(durations, f)
+
+        common_args = strip_shard_args(sys.argv[1:])
+        xml_results_name = os.path.basename(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+        xml_results_files = []
+        processes = []
+        output_threads = []
+
+        def forward_output(i, process):
+            for line in process.stdout:
+                print(f'[shard {i}] {line}', end='')
+                sys.stdout.flush()
+
+        for i, shard_args in enumerate(self.args.shards):
+            xml_results_file = os.path.join(self.file_paths['TMP_DIR'], f'shard_{i}', xml_results_name)
+            if os.path.exists(xml_results_file):
+                os.remove(xml_results_file)
+            xml_results_files.append(xml_results_file)
+
+            cmd = [sys.executable, sys.argv[0], *common_args, *shlex.split(shard_args),
+                   '--shard_index', str(i), '--shard_count', str(shard_count),
+                   '--shard_durations', durations_file]
+            log(f'Starting shard {i}: {cmd}')
+
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, bufsize=1)
+            processes.append(process)
+
+            thread = threading.Thread(target=forward_output, args=(i, process), daemon=True)
+            thread.start()
+            output_threads.append(thread)
+
+        try:
+            for process in processes:
+                process.wait()
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.terminate()
+
+            for thread in output_threads:
+                thread.join(timeout=5)
+
+        for i, process in enumerate(processes):
+            if process.returncode:
+                log(f'Shard {i} exited with {process.returncode}')
+
+        if os.path.exists(self.file_paths['TC_STATS_RESULTS_XML_FILE']):
+            os.remove(self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+
+        stats = TestCaseRunStats([], [], self.args.retry,
+                                 xml_results_file=self.file_paths['TC_STATS_RESULTS_XML_FILE'])
+
+        for xml_results_file in xml_results_files:
+            if os.path.exists(xml_results_file):
+                stats.merge(TestCaseRunStats([], [], self.args.retry,
+                                             xml_results_file=xml_results_file))
+
+        stats.num_test_cases = len(stats.get_results())
+        stats.print_summary()
+
+        print("\nBye!")
+        sys.stdout.flush()
+
+        return stats
+
     def cleanup(self):
         log(f'{self.__class__.__name__}.{self.cleanup.__name__}')
         autoprojects.iutctl.cleanup()
@@ -1647,6 +2095,9 @@ def setup_project_pixits(ptses):
         if mod is not None:
             mod.set_pixits(ptses)
 
+    for pts in ptses:
+        pts.flush_pixits()
+
 
 def setup_test_cases(ptses):
     test_cases = []
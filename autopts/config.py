@@ -48,12 +48,16 @@ def generate_file_paths(file_paths=None, autopts_root_dir=AUTOPTS_ROOT_DIR):
         'REPORT_README_MD_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'README.md'),
         'REPORT_DIR': os.path.join(FILE_PATHS['TMP_DIR'], 'autopts_report'),
         'IUT_LOGS_DIR': os.path.join(autopts_root_dir, 'logs'),
+        'BUILD_CACHE_DIR': os.path.join(autopts_root_dir, 'build_cache'),
+        'WORKSPACE_INDEX_DIR': os.path.join(autopts_root_dir, 'workspace_index'),
+        'CAPABILITY_CACHE_FILE': os.path.join(autopts_root_dir, 'capability_cache.json'),
         'OLD_LOGS_DIR': os.path.join(autopts_root_dir, 'oldlogs'),
         'PTS_XMLS_DIR': os.path.join(FILE_PATHS['TMP_DIR'], 'XMLs'),
         'REPORT_XLSX_FILE': os.path.join(autopts_root_dir, "report.xlsx"),
         'REPORT_TXT_FILE': os.path.join(autopts_root_dir, "report.txt"),
         'REPORT_DIFF_TXT_FILE': os.path.join(FILE_PATHS['TMP_DIR'], "report-diff.txt"),
         'ERROR_TXT_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'error.txt'),
+        'BUILD_TIMES_TXT_FILE': os.path.join(FILE_PATHS['TMP_DIR'], 'build_times.txt'),
         # 'BOT_LOG_FILE': os.path.join(autopts_root_dir, 'autoptsclient_bot.log'),
     })
 
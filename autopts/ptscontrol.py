@@ -353,6 +353,8 @@ class PyPTS:
         # list of tuples of methods and arguments to recover after PTS restart
         self._recov = []
         self._temp_changes = []
+        # PIXITs to revert before the next test case, unless updated again
+        self._pending_reverts = {}
         self._recov_in_progress = False
         self._ready = False
 
@@ -391,8 +393,12 @@ class PyPTS:
 
         self._pts_projects = {}
 
+        # PIXIT values set in PTS, to skip updates that change nothing
+        self._pixit_values = {}
+
     def cleanup_caches(self):
         self._recov.clear()
+        self._pending_reverts.clear()
         self._recov_in_progress = False
 
     def ready(self):
@@ -499,6 +505,9 @@ class PyPTS:
         for item in self._recov:
             self._recover_item(item)
 
+        # The PIXITs have just been set to their default values
+        self._pending_reverts.clear()
+
         self._recov_in_progress = False
         self._last_recovery_time = datetime.now()
 
@@ -718,6 +727,7 @@ class PyPTS:
         else:
             self._pts.OpenWorkspace(workspace_path)
 
+        self._pixit_values.clear()
         self.add_recov(self.open_workspace, workspace_path, copy)
         self._cache_test_cases()
 
@@ -763,15 +773,17 @@ class PyPTS:
         return self._pts.GetTestCaseDescription(project_name, test_case_index)
 
     def _revert_temp_changes(self):
-        """Recovery default state for test case"""
+        """Recovery default state for test case
+
+        The PIXITs are reverted right before the next test case is run,
+        so the ones that test case sets anyway are not changed twice.
+        """
 
         if not self._temp_changes:
             return
 
         log("%s", self._revert_temp_changes.__name__)
 
-        self._recov_in_progress = True
-
         for tch in self._temp_changes:
             func = tch[0]
 
@@ -784,14 +796,30 @@ class PyPTS:
                                                             self.set_pixit) and (x[1][0] ==
                                                                                  tch[1][0]) and (x[1][1] == tch[1][1])))
 
-                    self._recover_item(item)
+                    self._pending_reverts[tch[1][:2]] = item
 
                 except StopIteration:
                     continue
 
-        self._recov_in_progress = False
         self._temp_changes = []
 
+    def _apply_pending_reverts(self):
+        """Revert the PIXITs changed by previous test cases"""
+
+        if not self._pending_reverts:
+            return
+
+        log("%s", self._apply_pending_reverts.__name__)
+
+        self._recov_in_progress = True
+
+        try:
+            for item in self._pending_reverts.values():
+                self._recover_item(item)
+        finally:
+            self._recov_in_progress = False
+            self._pending_reverts.clear()
+
     def run_test_case(self, project_name, test_case_name):
         """Executes the specified Test Case.
 
@@ -805,6 +833,7 @@ class PyPTS:
         err = None
 
         try:
+            self._apply_pending_reverts()
             self._pts_logger.reopen()
             self._pts_logger.set_test_case_name(test_case_name)
             self._pts_sender.reopen()
@@ -928,7 +957,7 @@ class PyPTS:
             param_name, param_value)
 
         try:
-            self._pts.UpdatePixitParam(project_name, param_name, param_value)
+            self._update_pixit(project_name, param_name, param_value)
             self.add_recov(self.set_pixit, project_name, param_name,
                            param_value)
 
@@ -959,8 +988,8 @@ class PyPTS:
             param_name, new_param_value)
 
         try:
-            self._pts.UpdatePixitParam(
-                project_name, param_name, new_param_value)
+            self._pending_reverts.pop((project_name, param_name), None)
+            self._update_pixit(project_name, param_name, new_param_value)
             self._add_temp_change(self.update_pixit_param, project_name,
                                   param_name)
         except Exception as e:
@@ -973,6 +1002,31 @@ class PyPTS:
 
             raise Exception(e) from e
 
+    def _update_pixit(self, project_name, param_name, param_value):
+        """Set PIXIT in PTS, unless it already has that value"""
+        if self._pixit_values.get((project_name, param_name)) == param_value:
+            return
+
+        self._pts.UpdatePixitParam(project_name, param_name, param_value)
+        self._pixit_values[(project_name, param_name)] = param_value
+
+    def set_pixits_bulk(self, pixits):
+        """Set PIXITs given as (project_name, param_name, param_value)
+
+        Same as set_pixit called for each PIXIT, but over one request.
+        """
+        for project_name, param_name, param_value in pixits:
+            self.set_pixit(project_name, param_name, param_value)
+
+    def update_pixit_params(self, pixits):
+        """Update PIXITs given as (project_name, param_name, new_param_value)
+
+        Same as update_pixit_param called for each PIXIT, but over one
+        request.
+        """
+        for project_name, param_name, new_param_value in pixits:
+            self.update_pixit_param(project_name, param_name, new_param_value)
+
     def enable_maximum_logging(self, enable):
         """Enables/disables the maximum logging."""
 
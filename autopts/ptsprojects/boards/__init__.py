@@ -113,6 +113,22 @@ def get_build_and_flash(board_name):
         return None
 
 
+def get_build(board_name):
+    """Return the build function of a board that can build and flash
+    in separate steps, or None"""
+    board_mod = importlib.import_module(__package__ + '.' + board_name)
+
+    return getattr(board_mod, 'build', None)
+
+
+def get_flash(board_name):
+    """Return the flash function of a board that can build and flash
+    in separate steps, or None"""
+    board_mod = importlib.import_module(__package__ + '.' + board_name)
+
+    return getattr(board_mod, 'flash', None)
+
+
 def get_board_type(board_name):
     board_mod = importlib.import_module(__package__ + '.' + board_name)
 
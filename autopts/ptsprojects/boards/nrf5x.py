@@ -31,18 +31,19 @@ def reset_cmd(iutctl):
     return f'nrfjprog -r -s {iutctl.debugger_snr}'
 
 
-def build_and_flash(zephyr_wd, board, debugger_snr, conf_file=None, project_repos=None,
-                    env_cmd=None, *args):
-    """Build and flash Zephyr binary
+def build(zephyr_wd, board, conf_file=None, env_cmd=None, build_dir='build', stdout=None,
+          pristine=True):
+    """Build Zephyr binary
     :param zephyr_wd: Zephyr source path
     :param board: IUT
-    :param debugger_snr serial number
     :param conf_file: configuration file to be used
-    :param project_repos: a list of repo paths
     :param env_cmd: a command to for environment activation, e.g. source /path/to/venv/activate
+    :param build_dir: build directory, relative to the tester application
+    :param stdout: file object for the output of the build
+    :param pristine: if False, an existing build directory is built incrementally
     """
-    logging.debug("%s: %s %s %s", build_and_flash.__name__, zephyr_wd,
-                  board, conf_file)
+    logging.debug("%s: %s %s %s %s", build.__name__, zephyr_wd,
+                  board, conf_file, build_dir)
 
     if env_cmd:
         env_cmd = env_cmd.split() + ['&&']
@@ -51,13 +52,51 @@ def build_and_flash(zephyr_wd, board, debugger_snr, conf_file=None, project_repo
 
     tester_dir = os.path.join(zephyr_wd, "tests", "bluetooth", "tester")
 
-    check_call('rm -rf build/'.split(), cwd=tester_dir)
+    if pristine:
+        check_call(['rm', '-rf', build_dir], cwd=tester_dir)
 
     bttester_overlay = 'overlay-bt_ll_sw_split.conf'
     if conf_file and conf_file != 'default' and conf_file != 'prj.conf':
         bttester_overlay += f';{conf_file}'
 
-    cmd = ['west', 'build', '-p', 'auto', '-b', board, '--', f'-DEXTRA_CONF_FILE=\'{bttester_overlay}\'']
+    cmd = ['west', 'build', '-p', 'auto', '-b', board, '-d', build_dir, '--',
+           f'-DEXTRA_CONF_FILE=\'{bttester_overlay}\'']
+
+    check_call(env_cmd + cmd, cwd=tester_dir, stdout=stdout)
+
+
+def flash(zephyr_wd, debugger_snr, env_cmd=None, build_dir='build'):
+    """Flash Zephyr binary built with build()
+    :param zephyr_wd: Zephyr source path
+    :param debugger_snr serial number
+    :param env_cmd: a command to for environment activation, e.g. source /path/to/venv/activate
+    :param build_dir: build directory, relative to the tester application
+    """
+    logging.debug("%s: %s %s %s", flash.__name__, zephyr_wd, debugger_snr, build_dir)
+
+    if env_cmd:
+        env_cmd = env_cmd.split() + ['&&']
+    else:
+        env_cmd = []
+
+    tester_dir = os.path.join(zephyr_wd, "tests", "bluetooth", "tester")
+
+    check_call(env_cmd + ['west', 'flash', '--skip-rebuild', '--recover', '-d', build_dir,
+                          '-i', debugger_snr], cwd=tester_dir)
+
+
+def build_and_flash(zephyr_wd, board, debugger_snr, conf_file=None, project_repos=None,
+                    env_cmd=None, *args):
+    """Build and flash Zephyr binary
+    :param zephyr_wd: Zephyr source path
+    :param board: IUT
+    :param debugger_snr serial number
+    :param conf_file: configuration file to be used
+    :param project_repos: a list of repo paths
+    :param env_cmd: a command to for environment activation, e.g. source /path/to/venv/activate
+    """
+    logging.debug("%s: %s %s %s", build_and_flash.__name__, zephyr_wd,
+                  board, conf_file)
 
-    check_call(env_cmd + cmd, cwd=tester_dir)
-    check_call(env_cmd + ['west', 'flash', '--skip-rebuild', '--recover', '-i', debugger_snr], cwd=tester_dir)
+    build(zephyr_wd, board, conf_file, env_cmd)
+    flash(zephyr_wd, debugger_snr, env_cmd)
@@ -13,11 +13,18 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from threading import Event, Lock, Timer
-from time import sleep
+import itertools
+import logging
+from bisect import bisect_left
+from collections import deque
+from threading import Condition, Lock
+from time import monotonic
 
+from autopts.pybtp import defs
 from autopts.utils import raise_on_global_end
 
+log = logging.debug
+
 
 class Property:
     def __init__(self, data):
@@ -38,58 +45,311 @@ class WildCard:
         return True
 
 
-def timeout_cb(flag):
-    flag.clear()
+class EventStats:
+    """Per BTP service counters and handler latency histograms of the
+    events handled by the stack"""
 
+    # Upper bounds of the latency histogram buckets, in seconds
+    BUCKETS = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1)
+
+    def __init__(self):
+        self.counts = {}
+        self.histograms = {}
+        self.total_time = {}
+        self.max_time = {}
+
+    def reset(self):
+        self.__init__()
+
+    def record(self, svc_id, duration):
+        if svc_id not in self.counts:
+            self.counts[svc_id] = 0
+            self.histograms[svc_id] = [0] * (len(self.BUCKETS) + 1)
+            self.total_time[svc_id] = 0.0
+            self.max_time[svc_id] = 0.0
+
+        self.counts[svc_id] += 1
+        self.histograms[svc_id][bisect_left(self.BUCKETS, duration)] += 1
+        self.total_time[svc_id] += duration
+        self.max_time[svc_id] = max(self.max_time[svc_id], duration)
+
+    def summary(self):
+        """Return one line per service, the slowest handlers first"""
+        svc_names = {value: name.replace('BTP_SERVICE_ID_', '')
+                     for name, value in vars(defs).items()
+                     if name.startswith('BTP_SERVICE_ID_')}
+        bucket_names = [f'<{bound * 1e6:.0f}us' for bound in self.BUCKETS] + \
+                       [f'>={self.BUCKETS[-1] * 1e6:.0f}us']
+
+        lines = []
+        for svc_id in sorted(self.counts, key=self.total_time.get, reverse=True):
+            histogram = ' '.join(f'{bucket}:{count}' for bucket, count in
+                                 zip(bucket_names, self.histograms[svc_id]) if count)
+            lines.append(
+                f'{svc_names.get(svc_id, svc_id)}: {self.counts[svc_id]} events, '
+                f'mean {self.total_time[svc_id] / self.counts[svc_id] * 1e6:.0f}us, '
+                f'max {self.max_time[svc_id] * 1e6:.0f}us, {histogram}')
+
+        return '\n'.join(lines)
+
+
+# Longest time a waiter sleeps before re-checking for the end of the run.
+# It also bounds the reaction time to state changed outside of the BTP
+# event path, which does not notify the waiters.
+WAIT_SLICE = 0.1
+
+_event_cond = Condition()
+# Never notified, clock_sleep() only waits on it for the time to pass
+_sleep_cond = Condition()
+
+
+class Clock:
+    """Time source of all the waits of the stack and WID handlers"""
+
+    def monotonic(self):
+        return monotonic()
+
+    def wait(self, cond, timeout):
+        """Wait on the condition, acquired by the caller"""
+        cond.wait(timeout)
+
+
+class VirtualClock(Clock):
+    """Clock of the unit tests, where time passes only by waiting and
+    instantly, so that WID handlers run in milliseconds offline"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+    def wait(self, cond, timeout):
+        self.now += timeout
+
+
+_clock = Clock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Replace the clock, e.g. with a VirtualClock, and return the old one"""
+    global _clock
+
+    old_clock = _clock
+    _clock = clock
+
+    return old_clock
+
+
+def notify_event_waiters():
+    """Wake up wait_for_event() callers, so they re-check their predicate.
+    Called for every BTP event handled by the stack."""
+    with _event_cond:
+        _event_cond.notify_all()
+
+
+class EventQueue(list):
+    """List of received events of one type. Appending an event wakes up
+    only the waiters of this event type."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.cond = Condition()
+        # Number of events ever appended, lets waiters test only the new ones
+        self.received = len(self)
+
+    def append(self, ev):
+        with self.cond:
+            super().append(ev)
+            self.received += 1
+            self.cond.notify_all()
+
+    def extend(self, evs):
+        with self.cond:
+            size = len(self)
+            super().extend(evs)
+            self.received += len(self) - size
+            self.cond.notify_all()
+
+    def since(self, received):
+        """Return the events appended after the received count was taken"""
+        new = self.received - received
+        # New events are always at the tail of the queue
+        return self[-new:] if new else []
 
-def wait_for_queue_event(event_queue, test, timeout, remove):
-    flag = Event()
-    flag.set()
 
-    t = Timer(timeout, timeout_cb, [flag])
-    t.name = f'QEventTimer{t.name}'
-    t.start()
+class IndexedEventQueue:
+    """Event queue for high rate events, e.g. received stream data.
 
-    while flag.is_set():
-        raise_on_global_end()
+    Events are indexed by the match key returned by key(ev), so that
+    waiting for and removing the oldest event of a key is O(1). At most
+    maxlen of the latest events are retained per key, older ones are
+    dropped and counted in dropped.
+    """
 
-        for ev in event_queue:
-            if isinstance(ev, tuple):
-                result = test(*ev)
+    def __init__(self, key, maxlen=None):
+        self.key = key
+        self.maxlen = maxlen
+        self.cond = Condition()
+        self.received = 0
+        self.dropped = 0
+        self._index = {}
+
+    def append(self, ev):
+        with self.cond:
+            events = self._index.get(self.key(ev))
+            if events is None:
+                events = self._index[self.key(ev)] = deque(maxlen=self.maxlen)
+
+            if len(events) == self.maxlen:
+                self.dropped += 1
+
+            events.append(ev)
+            self.received += 1
+            self.cond.notify_all()
+
+    def since(self, received):
+        # Arrival order is not kept across keys, so any new event
+        # means all retained ones have to be tested again.
+        return list(self) if self.received != received else []
+
+    def find(self, key, remove=False):
+        """Return the oldest retained event of the key, or None"""
+        events = self._index.get(key)
+        if not events:
+            return None
+
+        return events.popleft() if remove else events[0]
+
+    def remove(self, ev):
+        self._index[self.key(ev)].remove(ev)
+
+    def clear(self):
+        with self.cond:
+            self._index.clear()
+
+    def __len__(self):
+        return sum(len(events) for events in self._index.values())
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(list(self._index.values()))
+
+
+def _test_event(test, ev):
+    if isinstance(ev, tuple):
+        return test(*ev)
+
+    return test(ev)
+
+
+def wait_for_queue_event(event_queue, test, timeout, remove):
+    # Plain lists are not able to notify, so fall back to rescanning
+    # them whenever any event is handled.
+    notifying = isinstance(event_queue, (EventQueue, IndexedEventQueue))
+    cond = event_queue.cond if notifying else _event_cond
+    deadline = _clock.monotonic() + timeout
+    tested = 0
+
+    with cond:
+        while True:
+            raise_on_global_end()
+
+            if notifying:
+                candidates = event_queue.since(tested)
+                tested = event_queue.received
             else:
-                result = test(ev)
+                candidates = list(event_queue)
 
-            if result:
-                t.cancel()
-                if ev and remove:
-                    event_queue.remove(ev)
+            for ev in candidates:
+                if _test_event(test, ev):
+                    if ev and remove:
+                        event_queue.remove(ev)
+
+                    return ev
+
+            remaining = deadline - _clock.monotonic()
+            if remaining <= 0:
+                return None
+
+            _clock.wait(cond, min(remaining, WAIT_SLICE))
+
+            # The test may also depend on state outside of the queue, so
+            # when no event arrived during the slice test all of them again
+            if notifying and event_queue.received == tested:
+                tested = 0
 
+
+def wait_for_indexed_event(event_queue, key, timeout, remove):
+    """Wait for an event with the match key in an IndexedEventQueue"""
+    deadline = _clock.monotonic() + timeout
+
+    with event_queue.cond:
+        while True:
+            raise_on_global_end()
+
+            ev = event_queue.find(key, remove)
+            if ev is not None:
                 return ev
 
-            # TODO: Use wait() and notify() from threading.Condition
-            #  instead of sleep()
-            sleep(0.5)
+            remaining = deadline - _clock.monotonic()
+            if remaining <= 0:
+                return None
 
-    return None
+            _clock.wait(event_queue.cond, min(remaining, WAIT_SLICE))
 
 
 def wait_for_event(timeout, test, *args, **kwargs):
     if test(*args, **kwargs):
         return True
 
-    flag = Event()
-    flag.set()
+    deadline = _clock.monotonic() + timeout
+
+    with _event_cond:
+        while True:
+            raise_on_global_end()
+
+            result = test(*args, **kwargs)
+            if result:
+                return result
+
+            remaining = deadline - _clock.monotonic()
+            if remaining <= 0:
+                return False
+
+            _clock.wait(_event_cond, min(remaining, WAIT_SLICE))
+
+
+def wait_until(timeout, test, reason, *args, **kwargs):
+    """wait_for_event() that logs how long the wait took, in place of
+    a fixed sleep before checking for what the sleep was waiting for"""
+    start = _clock.monotonic()
+    result = wait_for_event(timeout, test, *args, **kwargs)
+    elapsed = _clock.monotonic() - start
+
+    if result:
+        log(f'{reason}: done after {elapsed:.2f} s of {timeout} s')
+    else:
+        log(f'{reason}: not done in {timeout} s')
+
+    return result
+
 
-    t = Timer(timeout, timeout_cb, [flag])
-    t.name = f'EventTimer{t.name}'
-    t.start()
+def clock_sleep(seconds, reason):
+    """Sleep on the clock, ending early only at the end of the run. For
+    delays that have no event to wait for."""
+    log(f'{reason}: sleeping {seconds} s')
+    deadline = _clock.monotonic() + seconds
 
-    while flag.is_set():
-        raise_on_global_end()
+    with _sleep_cond:
+        while True:
+            raise_on_global_end()
 
-        result = test(*args, **kwargs)
-        if result:
-            t.cancel()
-            return result
+            remaining = deadline - _clock.monotonic()
+            if remaining <= 0:
+                return
 
-    return False
+            _clock.wait(_sleep_cond, min(remaining, WAIT_SLICE))
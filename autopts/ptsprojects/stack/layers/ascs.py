@@ -13,16 +13,16 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
 class ASCS:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_ASCS_EV_OPERATION_COMPLETED: [],
-            defs.BTP_ASCS_EV_CHARACTERISTIC_SUBSCRIBED: [],
-            defs.BTP_ASCS_EV_ASE_STATE_CHANGED: [],
+            defs.BTP_ASCS_EV_OPERATION_COMPLETED: EventQueue(),
+            defs.BTP_ASCS_EV_CHARACTERISTIC_SUBSCRIBED: EventQueue(),
+            defs.BTP_ASCS_EV_ASE_STATE_CHANGED: EventQueue(),
         }
 
     def event_received(self, event_type, event_data_tuple):
@@ -13,8 +13,183 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+import logging
+import os
+from threading import Condition, Lock, Thread, current_thread
+
+from autopts.ptsprojects.stack.common import (
+    EventQueue,
+    IndexedEventQueue,
+    get_clock,
+    wait_for_indexed_event,
+    wait_for_queue_event,
+)
 from autopts.pybtp import defs
+from autopts.pybtp.types import BTPError
+
+# Received ISO data events retained per stream. Streaming tests only
+# check that data flows, so there is no need to keep every SDU.
+STREAM_EVENTS_MAXLEN = 100
+# SDUs the IUT may have buffered before the stream skips a slot
+ISO_STREAM_MAX_BUFFERED = int(os.getenv("AUTOPTS_ISO_STREAM_MAX_BUFFERED", "2"))
+# Consecutive rejected SDUs after which the stream stops
+ISO_STREAM_MAX_ERRORS = int(os.getenv("AUTOPTS_ISO_STREAM_MAX_ERRORS", "100"))
+
+log = logging.debug
+
+
+class IsoStreamStats:
+    def __init__(self, clock=None):
+        self.clock = clock or get_clock()
+        self.sent = 0
+        self.sent_bytes = 0
+        # SDUs rejected by the IUT, e.g. with its buffers full
+        self.dropped = 0
+        # Slots skipped, since the IUT had enough data buffered
+        self.throttled = 0
+        # Slots missed, since a send took longer than the SDU interval
+        self.missed = 0
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.start_time = None
+        self.end_time = None
+
+    def record_sent(self, sdu_len, jitter):
+        self.sent += 1
+        self.sent_bytes += sdu_len
+        self.jitter_sum += jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+
+        end_time = self.clock.monotonic() if self.end_time is None else self.end_time
+        return end_time - self.start_time
+
+    @property
+    def throughput(self):
+        """Achieved throughput in bits per second"""
+        elapsed = self.elapsed
+        return self.sent_bytes * 8 / elapsed if elapsed else 0.0
+
+    @property
+    def jitter_mean(self):
+        return self.jitter_sum / self.sent if self.sent else 0.0
+
+    def __str__(self):
+        return (f'sent {self.sent} SDUs ({self.sent_bytes} B) in {self.elapsed:.2f} s, '
+                f'{self.throughput / 1000:.1f} kbps, dropped {self.dropped}, '
+                f'throttled {self.throttled}, missed {self.missed}, '
+                f'jitter mean {self.jitter_mean * 1000:.2f} ms '
+                f'max {self.jitter_max * 1000:.2f} ms')
+
+
+class IsoStream:
+    """Sends an SDU every SDU interval from a background thread
+
+    send(sdu) returns the length of the data the IUT has buffered. While
+    more than max_buffered SDUs are buffered the stream skips slots, so
+    it follows the rate of the IUT instead of filling its buffers.
+    Jitter is the delay of each send after its slot. The slots are timed
+    by the clock, the stack clock by default.
+    """
+
+    def __init__(self, name, send, sdu, sdu_interval_us,
+                 max_buffered=ISO_STREAM_MAX_BUFFERED, max_errors=ISO_STREAM_MAX_ERRORS,
+                 clock=None):
+        self.name = name
+        self.send = send
+        self.sdu = sdu
+        self.sdu_interval = sdu_interval_us / 1000000
+        self.max_buffered = max_buffered
+        self.max_errors = max_errors
+        self.clock = clock or get_clock()
+        self.stats = IsoStreamStats(self.clock)
+        self._buffered = 0
+        self._cond = Condition()
+        self._stopped = False
+        self._thread = Thread(target=self._run, name=f'IsoStream-{name}', daemon=True)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, wait=True, timeout=5):
+        """Stop the stream, without waiting for the send in progress
+        if wait is False, e.g. from the BTP event handler"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+        if wait and self._thread.is_alive() and self._thread is not current_thread():
+            self._thread.join(timeout)
+
+        return self.stats
+
+    def _wait_slot(self, slot):
+        """Wait for the slot time, return False if stopped meanwhile"""
+        with self._cond:
+            while not self._stopped:
+                remaining = slot - self.clock.monotonic()
+                if remaining <= 0:
+                    return True
+
+                self.clock.wait(self._cond, remaining)
+
+        return False
+
+    def _next_slot(self, slot):
+        """Return the delay of the current slot and the next slot time"""
+        late = self.clock.monotonic() - slot
+        if late >= self.sdu_interval:
+            # Slots passed while sending are not made up for
+            missed = int(late // self.sdu_interval)
+            self.stats.missed += missed
+            slot += missed * self.sdu_interval
+            late -= missed * self.sdu_interval
+
+        return late, slot + self.sdu_interval
+
+    def _run(self):
+        stats = self.stats
+        stats.start_time = self.clock.monotonic()
+        slot = stats.start_time
+        errors = 0
+        sdu_len = len(self.sdu)
+
+        try:
+            while self._wait_slot(slot):
+                late, slot = self._next_slot(slot)
+
+                if self._buffered > self.max_buffered * sdu_len:
+                    stats.throttled += 1
+                    # The IUT sends an SDU per interval meanwhile
+                    self._buffered -= sdu_len
+                    continue
+
+                try:
+                    self._buffered = self.send(self.sdu)
+                except BTPError:
+                    stats.dropped += 1
+                    errors += 1
+                    if errors >= self.max_errors:
+                        log(f'{self.name}: {errors} SDUs rejected in a row, stopping')
+                        break
+                    continue
+
+                errors = 0
+                stats.record_sent(sdu_len, late)
+        except (OSError, KeyboardInterrupt) as e:
+            # IUT socket closed or the run ended
+            log(f'{self.name}: stopped, {e!r}')
+
+        stats.end_time = self.clock.monotonic()
+        log(f'{self.name}: {stats}')
 
 
 class BAP:
@@ -29,18 +204,23 @@ class BAP:
         self.broadcast_id_2 = None
         self.broadcast_code = ''
         self.hdl_wid_114_cnt = 0
+        # IsoStream per (addr_type, addr, ASE ID), ASE ID 0 for a broadcast source
+        self.streams = {}
+        self.streams_lock = Lock()
         self.event_queues = {
-            defs.BTP_BAP_EV_DISCOVERY_COMPLETED: [],
-            defs.BTP_BAP_EV_CODEC_CAP_FOUND: [],
-            defs.BTP_BAP_EV_ASE_FOUND: [],
-            defs.BTP_BAP_EV_STREAM_RECEIVED: [],
-            defs.BTP_BAP_EV_BAA_FOUND: [],
-            defs.BTP_BAP_EV_BIS_FOUND: [],
-            defs.BTP_BAP_EV_BIS_SYNCED: [],
-            defs.BTP_BAP_EV_BIS_STREAM_RECEIVED: [],
-            defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND: [],
-            defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE: [],
-            defs.BTP_BAP_EV_PA_SYNC_REQ: [],
+            defs.BTP_BAP_EV_DISCOVERY_COMPLETED: EventQueue(),
+            defs.BTP_BAP_EV_CODEC_CAP_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_ASE_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_STREAM_RECEIVED: IndexedEventQueue(
+                lambda ev: ev[:3], STREAM_EVENTS_MAXLEN),
+            defs.BTP_BAP_EV_BAA_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_BIS_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_BIS_SYNCED: EventQueue(),
+            defs.BTP_BAP_EV_BIS_STREAM_RECEIVED: IndexedEventQueue(
+                lambda ev: (ev['broadcast_id'], ev['bis_id']), STREAM_EVENTS_MAXLEN),
+            defs.BTP_BAP_EV_SCAN_DELEGATOR_FOUND: EventQueue(),
+            defs.BTP_BAP_EV_BROADCAST_RECEIVE_STATE: EventQueue(),
+            defs.BTP_BAP_EV_PA_SYNC_REQ: EventQueue(),
         }
         self.event_handlers = {
             defs.BTP_BAP_EV_DISCOVERY_COMPLETED: self._ev_discovery_completed,
@@ -63,6 +243,38 @@ class BAP:
     def set_broadcast_id_2(self, broadcast_id):
         self.broadcast_id_2 = broadcast_id
 
+    def start_stream(self, stream_id, send, sdu, sdu_interval_us):
+        """Start streaming the SDU, replacing the stream already running"""
+        stream = IsoStream(f'ISO stream {stream_id}', send, sdu, sdu_interval_us)
+
+        with self.streams_lock:
+            old_stream = self.streams.pop(stream_id, None)
+            self.streams[stream_id] = stream
+
+        if old_stream:
+            old_stream.stop()
+
+        stream.start()
+
+        return stream
+
+    def stop_stream(self, stream_id, wait=True):
+        """Stop the stream and return its stats, or None if not streaming"""
+        with self.streams_lock:
+            stream = self.streams.pop(stream_id, None)
+
+        if not stream:
+            return None
+
+        return stream.stop(wait)
+
+    def stop_streams(self):
+        with self.streams_lock:
+            stream_ids = list(self.streams)
+
+        for stream_id in stream_ids:
+            self.stop_stream(stream_id)
+
     def event_received(self, event_type, event_data_tuple):
         if event_type in self.event_handlers:
             self.event_handlers[event_type](*event_data_tuple)
@@ -91,11 +303,9 @@ class BAP:
             timeout, remove)
 
     def wait_stream_received_ev(self, addr_type, addr, ase_id, timeout, remove=True):
-        return wait_for_queue_event(
+        return wait_for_indexed_event(
             self.event_queues[defs.BTP_BAP_EV_STREAM_RECEIVED],
-            lambda _addr_type, _addr, _ase_id, *_:
-                (addr_type, addr, ase_id) == (_addr_type, _addr, _ase_id),
-            timeout, remove)
+            (addr_type, addr, ase_id), timeout, remove)
 
     def wait_baa_found_ev(self, addr_type, addr, timeout, remove=True):
         return wait_for_queue_event(
@@ -116,10 +326,9 @@ class BAP:
             timeout, remove)
 
     def wait_bis_stream_received_ev(self, broadcast_id, bis_id, timeout, remove=True):
-        return wait_for_queue_event(
+        return wait_for_indexed_event(
             self.event_queues[defs.BTP_BAP_EV_BIS_STREAM_RECEIVED],
-            lambda ev: (broadcast_id, bis_id) == (ev['broadcast_id'], ev['bis_id']),
-            timeout, remove)
+            (broadcast_id, bis_id), timeout, remove)
 
     def wait_scan_delegator_found_ev(self, addr_type, addr, timeout, remove=False):
         return wait_for_queue_event(
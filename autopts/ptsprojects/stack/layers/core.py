@@ -13,15 +13,18 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
 class CORE:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_CORE_EV_IUT_READY: [],
+            defs.BTP_CORE_EV_IUT_READY: EventQueue(),
         }
+        # Keys of the services registered since the IUT start, kept
+        # between test cases like the IUT ready event
+        self.registered_svcs = []
 
     def event_received(self, event_type, event_data_tuple):
         self.event_queues[event_type].append(event_data_tuple)
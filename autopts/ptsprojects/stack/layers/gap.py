@@ -14,10 +14,108 @@
 # more details.
 #
 import logging
+import os
+from collections import OrderedDict
+from threading import Lock
 
 from autopts.ptsprojects.stack.common import Property, wait_for_event
 from autopts.pybtp.types import Addr, AdType, IOCap
 
+# Distinct advertising data kept per address during discovery, 0 - no limit
+SCAN_HISTORY_MAX = int(os.getenv("AUTOPTS_SCAN_HISTORY_MAX", "0"))
+
+
+def parse_ad(eir):
+    """Return {AD type: data} of advertising data
+
+    Parsing stops at the first zero length or truncated AD structure.
+    """
+    data = {}
+
+    eir_len = len(eir)
+    i = 0
+    while i + 1 < eir_len and eir[i]:
+        data_len = eir[i]
+        data[eir[i + 1]] = eir[i + 2:i + data_len + 1]
+        i += 1 + data_len
+
+    return data
+
+
+class ScanEntry:
+    """Advertising data received from an address, with the data of the
+    last report that carried it"""
+
+    __slots__ = ('eir', 'ad', 'rssi', 'flags', 'count', '_hex')
+
+    def __init__(self, eir):
+        self.eir = eir
+        self.ad = parse_ad(eir)
+        self.rssi = None
+        self.flags = None
+        self.count = 0
+        self._hex = None
+
+    @property
+    def hex(self):
+        """Upper case hex string of the advertising data"""
+        if self._hex is None:
+            self._hex = self.eir.hex().upper()
+
+        return self._hex
+
+
+class ScanResults:
+    """Advertising reports received during discovery
+
+    The reports are indexed by (addr_type, addr). Reports repeating the
+    advertising data of an address are counted in a single ScanEntry.
+    At most max_history distinct entries are kept per address, the
+    oldest are dropped first.
+    """
+
+    def __init__(self, max_history=SCAN_HISTORY_MAX):
+        self.max_history = max_history
+        self._lock = Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.report_count = 0
+            # (addr_type, addr): OrderedDict(eir: ScanEntry), latest last
+            self._devices = {}
+
+    def __len__(self):
+        return self.report_count
+
+    def add(self, addr_type, addr, rssi, flags, eir):
+        key = (addr_type, addr)
+
+        with self._lock:
+            self.report_count += 1
+
+            entries = self._devices.setdefault(key, OrderedDict())
+            entry = entries.pop(eir, None)
+            if entry is None:
+                entry = ScanEntry(eir)
+                if self.max_history and len(entries) >= self.max_history:
+                    entries.popitem(last=False)
+
+            entry.rssi = rssi
+            entry.flags = flags
+            entry.count += 1
+            entries[eir] = entry
+
+    def entries(self, addr_type, addr):
+        """ScanEntry list of an address, the latest last"""
+        with self._lock:
+            return list(self._devices.get((addr_type, addr), {}).values())
+
+    def all_entries(self):
+        with self._lock:
+            return [entry for entries in self._devices.values()
+                    for entry in entries.values()]
+
 
 class ConnParams:
     def __init__(self, conn_itvl_min, conn_itvl_max, conn_latency, supervision_timeout):
@@ -90,7 +188,7 @@ class Gap:
             "type": None,
         })
         self.discoverying = Property(False)
-        self.found_devices = Property([])  # List of found devices
+        self.found_devices = ScanResults()
 
         self.passkey = Property(None)
         self.conn_params = Property(None)
@@ -104,6 +202,8 @@ class Gap:
 
         # if IUT doesn't support it, it should be disabled in preconditions
         self.pair_user_interaction = True
+        # True once a link got encrypted, so the IUT may have a new bond
+        self.paired = False
         self.periodic_report_rxed = False
         self.periodic_sync_established_rxed = False
         self.periodic_transfer_received = False
@@ -209,7 +309,7 @@ class Gap:
 
     def reset_discovery(self):
         self.discoverying.data = True
-        self.found_devices.data = []
+        self.found_devices.clear()
 
     def set_passkey(self, passkey):
         self.passkey.data = passkey
@@ -265,6 +365,8 @@ class Gap:
 
     def set_connection_sec_level(self, addr, level):
         self.connections[addr].sec_level = level
+        if level > 1:
+            self.paired = True
 
     def gap_wait_for_sec_lvl_change(self, level, timeout=5, addr=None):
         if not self.is_connected(addr=addr):
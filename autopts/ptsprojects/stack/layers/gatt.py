@@ -14,7 +14,19 @@
 # more details.
 #
 import logging
+import os
+from bisect import bisect_left, bisect_right
+from collections import deque
 from threading import Event
+from time import monotonic
+
+from autopts.ptsprojects.stack.common import IndexedEventQueue, wait_for_queue_event
+from autopts.pybtp import defs
+
+# Latest notifications and indications kept in Gatt.notification_events
+NOTIFICATION_HISTORY_MAX = int(os.getenv("AUTOPTS_GATT_NOTIFICATION_HISTORY_MAX", "1000"))
+# Notifications and indications queued per (addr_type, addr, handle)
+NOTIFICATION_QUEUE_MAX = int(os.getenv("AUTOPTS_GATT_NOTIFICATION_QUEUE_MAX", "1000"))
 
 
 class GattAttribute:
@@ -64,23 +76,165 @@ class GattCharacteristicDescriptor(GattAttribute):
 class GattDB:
     def __init__(self):
         self.db = dict()
+        # Sorted handles, rebuilt on the first range lookup after a change
+        self._handles = None
 
     def attr_add(self, handle, attr):
         self.db[handle] = attr
+        self._handles = None
 
     def attr_lookup_handle(self, handle):
         if handle in self.db:
             return self.db[handle]
         return None
 
+    def attrs_in_range(self, start_handle=0x0001, end_handle=0xffff):
+        """Return the attributes with handles in the range, in handle order"""
+        if self._handles is None:
+            self._handles = sorted(self.db)
+
+        lo = bisect_left(self._handles, start_handle)
+        hi = bisect_right(self._handles, end_handle)
+
+        return [self.db[handle] for handle in self._handles[lo:hi]]
+
+    def clear(self):
+        self.db.clear()
+        self._handles = None
+
+
+# Attribute types of the declarations, whose values only change with the DB
+GATT_DECLARATIONS = ('2800', '2801', '2802', '2803')
+# Services whose commands and events do not change the GATT server DB,
+# except for the GATT DB modification commands
+GATT_DB_NEUTRAL_SERVICES = (defs.BTP_SERVICE_ID_GAP, defs.BTP_SERVICE_ID_GATT)
+GATT_DB_COMMANDS = (defs.BTP_GATT_CMD_ADD_SERVICE,
+                    defs.BTP_GATT_CMD_ADD_CHARACTERISTIC,
+                    defs.BTP_GATT_CMD_ADD_DESCRIPTOR,
+                    defs.BTP_GATT_CMD_ADD_INCLUDED_SERVICE,
+                    defs.BTP_GATT_CMD_START_SERVER)
+
+
+class GattServerMirror:
+    """Local copy of the IUT GATT server attributes
+
+    Holds the attributes as returned by gatts_get_attrs, with the type
+    UUID as GattAttribute.uuid, and the values of the declarations read
+    with gatts_get_attr_val. The copy is valid until a command or an
+    event that may change the DB: the GATT DB modification commands,
+    and any command or event of other services than GAP and GATT, e.g.
+    service registration or mesh provisioning.
+    """
+
+    def __init__(self):
+        self.db = GattDB()
+        self.values = {}
+        self._socket = None
+        self._stamp = None
+
+    @staticmethod
+    def _get_stamp(btp_socket):
+        """Return the numbers of commands and events that may have
+        changed the DB"""
+        tx_counts = getattr(btp_socket, 'tx_counts', None)
+        ev_counts = getattr(btp_socket, 'ev_counts', None)
+        if tx_counts is None or ev_counts is None:
+            return None
+
+        # Copied, since the BTP receiver adds the counts of new services
+        tx = sum(count for (svc_id, op), count in list(tx_counts.items())
+                 if svc_id not in GATT_DB_NEUTRAL_SERVICES or
+                 (svc_id == defs.BTP_SERVICE_ID_GATT and op in GATT_DB_COMMANDS))
+        ev = sum(count for svc_id, count in list(ev_counts.items())
+                 if svc_id not in GATT_DB_NEUTRAL_SERVICES)
+
+        return tx, ev
+
+    def is_synced(self, btp_socket):
+        return btp_socket is self._socket and self._stamp is not None and \
+            self._get_stamp(btp_socket) == self._stamp
+
+    def sync(self, btp_socket, attrs):
+        """Replace the attributes with the (handle, perm, type_uuid) list
+        of the whole DB"""
+        self.db.clear()
+        self.values.clear()
+
+        for handle, perm, type_uuid in attrs:
+            self.db.attr_add(handle, GattAttribute(handle, perm, type_uuid, None))
+
+        self._socket = btp_socket
+        self._stamp = self._get_stamp(btp_socket)
+
+    def attrs(self, start_handle=0x0001, end_handle=0xffff, type_uuid=None, perm=None):
+        """Return (handle, perm, type_uuid) of the attributes in the
+        handle range, of type_uuid and with any of the perm bits if set
+        """
+        if type_uuid:
+            type_uuid = type_uuid.replace('-', '').upper()
+
+        return [(attr.handle, attr.perm, attr.uuid)
+                for attr in self.db.attrs_in_range(start_handle, end_handle)
+                if (not type_uuid or attr.uuid == type_uuid) and
+                (perm is None or attr.perm & perm)]
+
+    def is_declaration(self, handle):
+        attr = self.db.attr_lookup_handle(handle)
+        return attr is not None and attr.uuid in GATT_DECLARATIONS
+
+    def value_get(self, addr_type, addr, handle):
+        return self.values.get((addr_type, addr, handle))
+
+    def value_set(self, addr_type, addr, handle, value):
+        self.values[(addr_type, addr, handle)] = value
+
+    def value_invalidate(self, handle):
+        for key in [key for key in self.values if key[2] == handle]:
+            del self.values[key]
+
+
+class NotificationCounter:
+    """Count and rate of the notifications of a handle"""
+
+    def __init__(self):
+        self.count = 0
+        self.first = None
+        self.last = None
+
+    def update(self, timestamp):
+        if self.first is None:
+            self.first = timestamp
+
+        self.last = timestamp
+        self.count += 1
+
+    @property
+    def rate(self):
+        """Notifications per second between the first and the last one"""
+        if self.count < 2 or self.last == self.first:
+            return 0.0
+
+        return (self.count - 1) / (self.last - self.first)
+
+
+def _notification_key(ev):
+    addr_type, addr, _, handle, _ = ev
+    return addr_type, addr, handle
+
 
 class Gatt:
     def __init__(self):
         self.server_db = GattDB()
+        self.iut_db = GattServerMirror()
         self.last_unique_uuid = 0
         self.verify_values = []
-        self.notification_events = []
-        self.notification_ev_received = Event()
+        # Latest notifications and indications, in arrival order
+        self.notification_events = deque(maxlen=NOTIFICATION_HISTORY_MAX)
+        # The same events queued for waiters, the latest ones per
+        # (addr_type, addr, handle)
+        self.notification_queue = IndexedEventQueue(_notification_key,
+                                                    NOTIFICATION_QUEUE_MAX)
+        self.notification_counters = {}
         self.signed_write_handle = 0
         self.value_len = 0
 
@@ -139,9 +293,35 @@ class Gatt:
         return None
 
     def notification_ev_recv(self, addr_type, addr, notif_type, handle, data):
-        self.notification_events.append((addr_type, addr, notif_type, handle, data))
-        self.notification_ev_received.set()
-
-    def wait_notification_ev(self, timeout=None):
-        self.notification_ev_received.wait(timeout)
-        self.notification_ev_received.clear()
+        ev = (addr_type, addr, notif_type, handle, data)
+
+        counter = self.notification_counters.get((addr_type, addr, handle))
+        if counter is None:
+            counter = self.notification_counters[(addr_type, addr, handle)] = NotificationCounter()
+        counter.update(monotonic())
+
+        self.notification_events.append(ev)
+        self.notification_queue.append(ev)
+
+    def wait_notification_ev(self, timeout, addr_type=None, addr=None,
+                             notif_type=None, remove=True):
+        """Wait for a notification or indication of any handle
+
+        Optionally only of the peer and of the notif_type. Returns the
+        queued (addr_type, addr, notif_type, handle, data) event, or None
+        on timeout.
+        """
+        def test(ev_addr_type, ev_addr, ev_notif_type, handle, data):
+            return addr_type in (None, ev_addr_type) and addr in (None, ev_addr) and \
+                notif_type in (None, ev_notif_type)
+
+        return wait_for_queue_event(self.notification_queue, test, timeout, remove)
+
+    def notification_summary(self):
+        """Text table of the notification count and rate per handle"""
+        lines = []
+        for (addr_type, addr, handle), counter in sorted(self.notification_counters.items()):
+            lines.append(f"{addr}/{addr_type} 0x{handle:04x}: {counter.count} "
+                         f"notifications, {counter.rate:.1f}/s")
+
+        return "\n".join(lines)
@@ -13,7 +13,7 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
@@ -29,9 +29,9 @@ class HAP:
     def __init__(self):
         self.peers = {}
         self.event_queues = {
-            defs.BTP_HAP_EV_IAC_DISCOVERY_COMPLETE: [],
-            defs.BTP_HAP_EV_HAUC_DISCOVERY_COMPLETE: [],
-            defs.BTP_HAP_EV_PRESET_CHANGED: [],
+            defs.BTP_HAP_EV_IAC_DISCOVERY_COMPLETE: EventQueue(),
+            defs.BTP_HAP_EV_HAUC_DISCOVERY_COMPLETE: EventQueue(),
+            defs.BTP_HAP_EV_PRESET_CHANGED: EventQueue(),
         }
         self.event_handlers = {
             defs.BTP_HAP_EV_HAUC_DISCOVERY_COMPLETE: self._ev_hauc_discovery_complete,
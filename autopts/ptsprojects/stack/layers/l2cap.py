@@ -14,9 +14,14 @@
 # more details.
 #
 import logging
+import os
+from collections import deque
 
 from autopts.ptsprojects.stack.common import wait_for_event
 
+# Data packets kept per channel and direction, next to the byte counters
+L2CAP_DATA_HISTORY_MAX = int(os.getenv("AUTOPTS_L2CAP_DATA_HISTORY_MAX", "100"))
+
 
 class L2capChan:
     def __init__(self, chan_id, psm, peer_mtu, peer_mps, our_mtu, our_mps,
@@ -30,8 +35,12 @@ class L2capChan:
         self.peer_bd_addr_type = bd_addr_type
         self.peer_bd_addr = bd_addr
         self.disconn_reason = None
-        self.data_tx = []
-        self.data_rx = []
+        self.data_tx = deque(maxlen=L2CAP_DATA_HISTORY_MAX)
+        self.data_rx = deque(maxlen=L2CAP_DATA_HISTORY_MAX)
+        self.tx_bytes = 0
+        self.tx_packets = 0
+        self.rx_bytes = 0
+        self.rx_packets = 0
         self.state = "init"  # "connected" / "disconnected"
 
     def _get_state(self, timeout):
@@ -70,9 +79,13 @@ class L2capChan:
 
     def rx(self, data):
         self.data_rx.append(data)
+        self.rx_bytes += len(data)
+        self.rx_packets += 1
 
     def tx(self, data):
         self.data_tx.append(data)
+        self.tx_bytes += len(data)
+        self.tx_packets += 1
 
     def rx_data_get(self, timeout):
         if len(self.data_rx) != 0:
@@ -116,8 +129,8 @@ class L2cap:
 
     def clear_data(self):
         for chan in self.channels:
-            chan.data_tx = []
-            chan.data_rx = []
+            chan.data_tx.clear()
+            chan.data_rx.clear()
 
     def reconfigured(self, chan_id, peer_mtu, peer_mps, our_mtu, our_mps):
         channel = self.chan_lookup_id(chan_id)
@@ -13,33 +13,33 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
 class MCP:
     def __init__(self):
         self.event_queues = {
-            defs.BTP_MCP_EV_DISCOVERED: [],
-            defs.BTP_MCP_EV_TRACK_DURATION: [],
-            defs.BTP_MCP_EV_TRACK_POSITION: [],
-            defs.BTP_MCP_EV_PLAYBACK_SPEED: [],
-            defs.BTP_MCP_EV_SEEKING_SPEED: [],
-            defs.BTP_MCP_EV_ICON_OBJ_ID: [],
-            defs.BTP_MCP_EV_NEXT_TRACK_OBJ_ID: [],
-            defs.BTP_MCP_EV_PARENT_GROUP_OBJ_ID: [],
-            defs.BTP_MCP_EV_CURRENT_GROUP_OBJ_ID: [],
-            defs.BTP_MCP_EV_PLAYING_ORDER: [],
-            defs.BTP_MCP_EV_PLAYING_ORDERS_SUPPORTED: [],
-            defs.BTP_MCP_EV_MEDIA_STATE: [],
-            defs.BTP_MCP_EV_OPCODES_SUPPORTED: [],
-            defs.BTP_MCP_EV_CONTENT_CONTROL_ID: [],
-            defs.BTP_MCP_EV_SEGMENTS_OBJ_ID: [],
-            defs.BTP_MCP_EV_CURRENT_TRACK_OBJ_ID: [],
-            defs.BTP_MCP_EV_COMMAND: [],
-            defs.BTP_MCP_EV_SEARCH: [],
-            defs.BTP_MCP_EV_CMD_NTF: [],
-            defs.BTP_MCP_EV_SEARCH_NTF: []
+            defs.BTP_MCP_EV_DISCOVERED: EventQueue(),
+            defs.BTP_MCP_EV_TRACK_DURATION: EventQueue(),
+            defs.BTP_MCP_EV_TRACK_POSITION: EventQueue(),
+            defs.BTP_MCP_EV_PLAYBACK_SPEED: EventQueue(),
+            defs.BTP_MCP_EV_SEEKING_SPEED: EventQueue(),
+            defs.BTP_MCP_EV_ICON_OBJ_ID: EventQueue(),
+            defs.BTP_MCP_EV_NEXT_TRACK_OBJ_ID: EventQueue(),
+            defs.BTP_MCP_EV_PARENT_GROUP_OBJ_ID: EventQueue(),
+            defs.BTP_MCP_EV_CURRENT_GROUP_OBJ_ID: EventQueue(),
+            defs.BTP_MCP_EV_PLAYING_ORDER: EventQueue(),
+            defs.BTP_MCP_EV_PLAYING_ORDERS_SUPPORTED: EventQueue(),
+            defs.BTP_MCP_EV_MEDIA_STATE: EventQueue(),
+            defs.BTP_MCP_EV_OPCODES_SUPPORTED: EventQueue(),
+            defs.BTP_MCP_EV_CONTENT_CONTROL_ID: EventQueue(),
+            defs.BTP_MCP_EV_SEGMENTS_OBJ_ID: EventQueue(),
+            defs.BTP_MCP_EV_CURRENT_TRACK_OBJ_ID: EventQueue(),
+            defs.BTP_MCP_EV_COMMAND: EventQueue(),
+            defs.BTP_MCP_EV_SEARCH: EventQueue(),
+            defs.BTP_MCP_EV_CMD_NTF: EventQueue(),
+            defs.BTP_MCP_EV_SEARCH_NTF: EventQueue()
         }
         self.error_opcodes = []
         self.object_id = None
@@ -80,6 +80,8 @@ class Mesh:
         self.incomp_timer_exp = Property(False)
         self.friendship = Property(False)
         self.lpn = Property(False)
+        # Number of Friend Polls sent by the IUT as LPN
+        self.lpn_polls = Property(0)
 
         # Lower tester composition data
         self.tester_comp_data = Property({})
@@ -13,7 +13,7 @@
 # more details.
 #
 
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
@@ -22,7 +22,7 @@ class PBP:
         self.program_info = None
         self.broadcast_name = None
         self.event_queues = {
-            defs.BTP_PBP_EV_PUBLIC_BROADCAST_ANNOUNCEMENT_FOUND: [],
+            defs.BTP_PBP_EV_PUBLIC_BROADCAST_ANNOUNCEMENT_FOUND: EventQueue(),
         }
 
     def event_received(self, event_type, event_data):
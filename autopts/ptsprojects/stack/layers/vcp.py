@@ -13,7 +13,7 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
-from autopts.ptsprojects.stack.common import wait_for_queue_event
+from autopts.ptsprojects.stack.common import EventQueue, wait_for_queue_event
 from autopts.pybtp import defs
 
 
@@ -21,10 +21,10 @@ class VCP:
     def __init__(self):
         self.wid_counter = 0
         self.event_queues = {
-            defs.BTP_VCP_EV_DISCOVERED: [],
-            defs.BTP_VCP_EV_STATE: [],
-            defs.BTP_VCP_EV_FLAGS: [],
-            defs.BTP_VCP_EV_PROCEDURE: [],
+            defs.BTP_VCP_EV_DISCOVERED: EventQueue(),
+            defs.BTP_VCP_EV_STATE: EventQueue(),
+            defs.BTP_VCP_EV_FLAGS: EventQueue(),
+            defs.BTP_VCP_EV_PROCEDURE: EventQueue(),
         }
 
     def event_received(self, event_type, event_data_tuple):
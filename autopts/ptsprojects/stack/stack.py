@@ -15,6 +15,7 @@
 #
 import logging
 
+from autopts.ptsprojects.stack.common import EventStats
 from autopts.ptsprojects.stack.layers.aics import AICS
 from autopts.ptsprojects.stack.layers.ascs import ASCS
 from autopts.ptsprojects.stack.layers.bap import BAP
@@ -55,6 +56,7 @@ class Stack:
         self.supported_svcs = 0
         self.supported_cmds = 0
         self.synch = None
+        self.event_stats = EventStats()
 
         self.gap = None
         self.mesh = None
@@ -194,6 +196,10 @@ class Stack:
     # GENERATOR append 3
 
     def cleanup(self):
+        if self.event_stats.counts:
+            log("BTP event handler stats:\n%s", self.event_stats.summary())
+            self.event_stats.reset()
+
         if self.gap:
             self.gap = Gap(self.gap.name, self.gap.manufacturer_data, None, None, None, None, None)
 
@@ -219,6 +225,7 @@ class Stack:
             self.ascs_init()
 
         if self.bap:
+            self.bap.stop_streams()
             self.bap_init()
 
         if self.micp:
@@ -234,6 +241,9 @@ class Stack:
             self.gmcs_init()
 
         if self.gatt:
+            if self.gatt.notification_counters:
+                log("GATT notifications received:\n%s", self.gatt.notification_summary())
+
             self.gatt_init()
 
         if self.gatt_cl:
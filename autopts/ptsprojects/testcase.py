@@ -34,6 +34,9 @@ from .utils import exec_iut_cmd
 
 log = logging.debug
 
+# Seconds to wait after a test case before the next one may start
+SETTLE_TIME = 3
+
 
 class ResponseWithPostWID:
     def __init__(self, response, next_steps):
@@ -747,6 +750,14 @@ class TestCase(PTSCallback):
                not is_cleanup_func(cmd):
                 cmd.start()
 
+    def settle(self):
+        """Allow devices to settle down after the test case"""
+        # in accordance with PTSControlClient.cpp:
+        # // Allow device to settle down
+        # Sleep(3000);
+        # otherwise 4th test case just blocks eternally
+        time.sleep(SETTLE_TIME)
+
     def post_run(self, error_code):
         """Method called after test case is run in PTS
 
@@ -765,12 +776,8 @@ class TestCase(PTSCallback):
             if is_cleanup_func(cmd):
                 cmd.start()
 
-        # in accordance with PTSControlClient.cpp:
-        # // Allow device to settle down
-        # Sleep(3000);
-        # otherwise 4th test case just blocks eternally
         if not get_global_end():
-            time.sleep(3)
+            self.settle()
 
         for cmd in self.cmds:
             cmd.stop()
@@ -1,103 +1,229 @@
+import math
 import sqlite3
+import threading
+import time
+from collections import namedtuple
 
 DATABASE_FILE = 'TestCase.db'
 
+# Keep batch queries below the SQLite limit of host parameters
+QUERY_CHUNK_SIZE = 500
+
+# Every run of a test case is kept in the {table}_history table, the
+# duration percentiles are computed from the last HISTORY_WINDOW runs
+HISTORY_SUFFIX = '_history'
+HISTORY_WINDOW = 50
+
+# Per test case superguard derived from the run history:
+# max(p95 * SUPERGUARD_FACTOR, max) + SUPERGUARD_MARGIN seconds,
+# once a test case has run at least SUPERGUARD_MIN_RUNS times.
+SUPERGUARD_FACTOR = 1.5
+SUPERGUARD_MARGIN = 60
+SUPERGUARD_MIN_RUNS = 5
+
+DurationStats = namedtuple('DurationStats', 'runs p50 p95 max')
+
+
+def _percentile(sorted_values, p):
+    """Nearest-rank percentile of non-empty sorted values"""
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
 
 class TestCaseTable:
     def __init__(self, name, database_file=DATABASE_FILE):
         self.database_file = database_file
-        self._open()
         self.name = name
+        self.history = name + HISTORY_SUFFIX
+        self.conn = None
+        self.cursor = None
+        self._lock = threading.RLock()
+        self._open()
 
         self.cursor.execute(
             f"CREATE TABLE IF NOT EXISTS {self.name} (name TEXT, duration REAL, "
             "count INTEGER, result TEXT);")
+        self.cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.name}_name_idx ON {self.name} (name);")
+        self.cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.history} (name TEXT, timestamp REAL, "
+            "duration REAL, result TEXT, config TEXT);")
+        self.cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.history}_name_idx ON {self.history} (name, timestamp);")
         self.conn.commit()
 
-        self._close()
-
     def _open(self):
-        self.conn = sqlite3.connect(self.database_file)
+        # The connection is kept open for the whole session and may be
+        # used from more than one thread, serialized with self._lock.
+        self.conn = sqlite3.connect(self.database_file, check_same_thread=False)
         self.cursor = self.conn.cursor()
+        self.cursor.execute("PRAGMA journal_mode=WAL;")
 
     def _close(self):
         self.cursor.close()
         self.conn.close()
+        self.cursor = None
+        self.conn = None
 
-    def update_statistics(self, test_case_name, duration, result):
-        self._open()
-
-        self.cursor.execute(
-            f"SELECT duration, count FROM {self.name} "
-            "WHERE name=:name;", {"name": test_case_name})
-        row = self.cursor.fetchall()
-        if len(row) == 0:
-            self.cursor.execute(
-                f"INSERT INTO {self.name} VALUES(?, ?, ?, ?);",
-                (test_case_name, duration, 1, result))
-            self.conn.commit()
-            self._close()
-            return
-
-        (mean, count) = row[0]
-        if not count:
-            count = 0
-            mean = 0
+    def close(self):
+        """Close the connection, e.g. before the database file is moved
 
-        count += 1
-        mean += (duration - mean) // count
+        The connection is opened again on the next query.
+        """
+        with self._lock:
+            if self.conn:
+                self._close()
 
-        self.cursor.execute(
-            f"UPDATE {self.name} SET duration=:duration, count=:count, result=:result "
-            "WHERE name=:name", {"duration": mean,
-                                                   "count": count,
-                                                   "name": test_case_name,
-                                                   "result": result})
-        self.conn.commit()
-        self._close()
+    def _ensure_open(self):
+        if not self.conn:
+            self._open()
 
-    def get_mean_duration(self, test_case_name):
-        self._open()
-
-        self.cursor.execute(
-            f"SELECT duration FROM {self.name} "
-            "WHERE name=:name;", {"name": test_case_name})
-        row = self.cursor.fetchone()
-        self._close()
+    def update_statistics(self, test_case_name, duration, result, config=None):
+        with self._lock:
+            self._ensure_open()
+            self.cursor.execute(
+                f"INSERT INTO {self.history} VALUES(?, ?, ?, ?, ?);",
+                (test_case_name, time.time(), duration, result, config))
+            self.cursor.execute(
+                f"SELECT duration, count FROM {self.name} "
+                "WHERE name=:name;", {"name": test_case_name})
+            row = self.cursor.fetchall()
+            if len(row) == 0:
+                self.cursor.execute(
+                    f"INSERT INTO {self.name} VALUES(?, ?, ?, ?);",
+                    (test_case_name, duration, 1, result))
+                self.conn.commit()
+                return
+
+            (mean, count) = row[0]
+            if not count:
+                count = 0
+                mean = 0
+
+            count += 1
+            mean += (duration - mean) / count
 
-        if row is not None:
-            return row[0]
+            self.cursor.execute(
+                f"UPDATE {self.name} SET duration=:duration, count=:count, result=:result "
+                "WHERE name=:name", {"duration": mean,
+                                     "count": count,
+                                     "name": test_case_name,
+                                     "result": result})
+            self.conn.commit()
 
-        return None
+    def _select(self, column, test_case_names):
+        """Return {name: column value} for the test cases found in the table"""
+        values = {}
+        names = list(test_case_names)
 
-    def get_result(self, test_case_name):
-        self._open()
+        with self._lock:
+            self._ensure_open()
+            for i in range(0, len(names), QUERY_CHUNK_SIZE):
+                chunk = names[i:i + QUERY_CHUNK_SIZE]
+                self.cursor.execute(
+                    f"SELECT name, {column} FROM {self.name} "
+                    f"WHERE name IN ({', '.join('?' * len(chunk))}) ORDER BY rowid;", chunk)
 
-        self.cursor.execute(
-            f"SELECT result FROM {self.name} "
-            "WHERE name=:name", {"name": test_case_name})
-        row = self.cursor.fetchone()
-        self._close()
+                for name, value in self.cursor.fetchall():
+                    # Like fetchone() on a single test case, the first row wins
+                    values.setdefault(name, value)
 
-        if row is not None:
-            return row[0]
+        return values
 
-        return None
+    def get_mean_duration(self, test_case_name):
+        return self._select('duration', [test_case_name]).get(test_case_name)
 
-    def estimate_session_duration(self, test_cases_names, run_count_max):
+    def get_result(self, test_case_name):
+        return self._select('result', [test_case_name]).get(test_case_name)
+
+    def get_mean_durations(self, test_case_names):
+        """Return {name: mean duration} of known test cases in one query"""
+        return self._select('duration', test_case_names)
+
+    def get_results(self, test_case_names):
+        """Return {name: last result} of known test cases in one query"""
+        return self._select('result', test_case_names)
+
+    def get_all_mean_durations(self):
+        """Return {name: mean duration} of all test cases in the table"""
+        durations = {}
+
+        with self._lock:
+            self._ensure_open()
+            self.cursor.execute(f"SELECT name, duration FROM {self.name} ORDER BY rowid;")
+            for name, duration in self.cursor.fetchall():
+                durations.setdefault(name, duration)
+
+        return durations
+
+    def get_duration_stats(self, test_case_names):
+        """Return {name: DurationStats} over the recent runs of test cases"""
+        durations = {}
+        names = list(test_case_names)
+
+        with self._lock:
+            self._ensure_open()
+            for i in range(0, len(names), QUERY_CHUNK_SIZE):
+                chunk = names[i:i + QUERY_CHUNK_SIZE]
+                self.cursor.execute(
+                    f"SELECT name, duration FROM {self.history} "
+                    f"WHERE name IN ({', '.join('?' * len(chunk))}) "
+                    "ORDER BY name, timestamp DESC;", chunk)
+
+                for name, duration in self.cursor.fetchall():
+                    runs = durations.setdefault(name, [])
+                    if len(runs) < HISTORY_WINDOW:
+                        runs.append(duration)
+
+        stats = {}
+        for name, runs in durations.items():
+            runs.sort()
+            stats[name] = DurationStats(len(runs), _percentile(runs, 50),
+                                        _percentile(runs, 95), runs[-1])
+
+        return stats
+
+    def get_superguard_timeouts(self, test_case_names, default=0):
+        """Return {name: superguard timeout in seconds} of test cases
+
+        Test cases with too short a run history get the default timeout.
+        """
+        timeouts = dict.fromkeys(test_case_names, default)
+
+        for name, stats in self.get_duration_stats(timeouts).items():
+            if stats.runs >= SUPERGUARD_MIN_RUNS:
+                timeouts[name] = max(stats.p95 * SUPERGUARD_FACTOR,
+                                     stats.max) + SUPERGUARD_MARGIN
+
+        return timeouts
+
+    def estimate_session_duration(self, test_cases_names, run_count_max,
+                                  percentile=None):
+        """Estimate the session duration in seconds
+
+        By default the mean durations are used. With percentile=50 or 95
+        the duration percentiles of the run history are used instead,
+        falling back to the mean for test cases without a history.
+        """
         duration = 0
         count_unknown = 0
         num_test_cases = len(test_cases_names)
+        results = self.get_results(test_cases_names)
+        mean_durations = self.get_mean_durations(test_cases_names)
+
+        if percentile:
+            for name, stats in self.get_duration_stats(test_cases_names).items():
+                mean_durations[name] = getattr(stats, f"p{percentile}")
 
         for test_case_name in test_cases_names:
             expected_run_count = 1
 
             # Assume worst case scenario
-            last_result = self.get_result(test_case_name)
+            last_result = results.get(test_case_name)
             if last_result and last_result != 'PASS':
                 expected_run_count = run_count_max
 
-            mean_time = self.get_mean_duration(test_case_name)
+            mean_time = mean_durations.get(test_case_name)
             if mean_time is None:
                 count_unknown += 1
             else:
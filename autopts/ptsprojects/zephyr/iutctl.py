@@ -17,17 +17,14 @@
 import logging
 import os
 import shlex
-import socket
 import subprocess
 import sys
 import time
 
-import serial
-
 from autopts.ptsprojects.boards import Board, get_debugger_snr, tty_to_com
 from autopts.ptsprojects.stack import get_stack
-from autopts.pybtp import defs
-from autopts.pybtp.iutctl_common import BTP_ADDRESS, BTPSocketSrv, BTPWorker, LoggerWorker
+from autopts.pybtp import btp, defs
+from autopts.pybtp.iutctl_common import BTP_ADDRESS, BTPSerialTransport, BTPSocketSrv, BTPWorker, LoggerWorker
 from autopts.rtt import BTMON, RTTLogger
 from autopts.utils import get_global_end
 
@@ -38,6 +35,10 @@ ZEPHYR = None
 QEMU_BIN = "qemu-system-arm"
 
 SERIAL_BAUDRATE = int(os.getenv("AUTOPTS_SERIAL_BAUDRATE", "115200"))
+# Services whose IUT state survives unregistering them, i.e. the GATT
+# server DB entries and the mesh provisioning and configuration. An IUT
+# that had any of them registered is not reused by the next test case.
+WARM_UNSAFE_SVCS = ('gatt_reg', 'mesh_reg', 'mmdl_reg')
 CLI_SUPPORT = ['tty', 'hci', 'qemu']
 
 
@@ -75,7 +76,12 @@ class ZephyrCtl:
         self.hci = args.hci
         self.native = None
         self.gdb = args.gdb
+        self.warm_iut = args.warm_iut
         self.is_running = False
+        # Pre-conditions of the last test case, if it left the IUT running
+        self.warm_key = None
+        # Test case count and IUT overhead in seconds, of cold and warm starts
+        self.overhead_stats = {'cold': [0, 0.0], 'warm': [0, 0.0]}
 
         if self.tty_file and args.board_name:  # DUT is a hardware board, not QEMU
             if self.debugger_snr is None:
@@ -86,7 +92,7 @@ class ZephyrCtl:
 
         self.qemu_process = None
         self.native_process = None
-        self.socat_process = None
+        self.serial_port = None
         self.socket_srv = None
         self.btp_socket = None
         self.test_case = None
@@ -110,38 +116,23 @@ class ZephyrCtl:
         self.is_running = True
         self.test_case = test_case
 
-        # We will reset HW after BTP socket is open. If the board was
-        # reset before this happened, it is possible to receive none,
-        # partial or whole IUT ready event. Flush serial to ignore it.
-        self.flush_serial()
+        if self.tty_file:
+            # The serial port stays open between test cases. We will reset
+            # HW after the transport is open. If the board was reset before
+            # this happened, it is possible to receive none, partial or
+            # whole IUT ready event, so the transport drops stale input.
+            self.socket_srv = BTPSerialTransport(test_case.log_dir, self.serial_port,
+                                                 keep_open=True)
+            self.socket_srv.open(self.serial_port_name(), SERIAL_BAUDRATE)
+            self.serial_port = self.socket_srv.conn
+        else:
+            self.socket_srv = BTPSocketSrv(test_case.log_dir)
+            self.socket_srv.open(self.btp_address)
 
-        self.socket_srv = BTPSocketSrv(test_case.log_dir)
-        self.socket_srv.open(self.btp_address)
         self.btp_socket = BTPWorker(self.socket_srv)
 
         if self.tty_file:
-            if sys.platform == "win32":
-                # On windows socat.exe does not support setting serial baud rate.
-                # Set it with 'mode' from cmd.exe
-                com = tty_to_com(self.tty_file)
-                mode_cmd = (">nul 2>nul cmd.exe /c \"mode " + com + f"BAUD={SERIAL_BAUDRATE} PARITY=n DATA=8 STOP=1\"")
-                os.system(mode_cmd)
-
-                socat_cmd = (
-                    f"socat.exe -x -v tcp:{socket.gethostbyname(socket.gethostname())}:"
-                    f"{self.socket_srv.sock.getsockname()[1]},retry=100,interval=1 "
-                    f"{self.tty_file},raw,b{SERIAL_BAUDRATE}"
-                )
-            else:
-                socat_cmd = f"socat -x -v {self.tty_file},rawer,b{SERIAL_BAUDRATE} UNIX-CONNECT:{self.btp_address}"
-
-            log("Starting socat process: %s", socat_cmd)
-
-            # socat dies after socket is closed, so no need to kill it
-            self.socat_process = subprocess.Popen(shlex.split(socat_cmd),
-                                                  shell=False,
-                                                  stdout=subprocess.DEVNULL,
-                                                  stderr=subprocess.DEVNULL)
+            log("Using serial port: %s", self.tty_file)
         elif self.hci is not None:
             self.iut_log_file = open(test_case.log_dir / "autopts-iutctl-zephyr.log", "a")
             socat_cmd = f"socat -x -v %%s,rawer,b{SERIAL_BAUDRATE} UNIX-CONNECT:{self.btp_address} &"
@@ -177,25 +168,90 @@ class ZephyrCtl:
                                             self.test_case.log_dir)
             self.uart_logger.start()
 
-    def flush_serial(self):
-        log("%s.%s", self.__class__, self.flush_serial.__name__)
-        # Try to read data or timeout
-        try:
-            if sys.platform == 'win32':
-                tty = tty_to_com(self.tty_file)
-            else:
-                tty = self.tty_file
-
-            # The main reason why we do not use serial.Serial for
-            # boards is to have only one, generic implementation of
-            # BTPWorker/BTPSocket. Although we can still use it for
-            # flushing serial if the data does not matter.
-            ser = serial.Serial(port=tty,
-                                baudrate=SERIAL_BAUDRATE, timeout=1)
-            ser.read(99999)
-            ser.close()
-        except serial.SerialException:
-            pass
+    def is_warm(self, key):
+        """True if the IUT was left running by a test case with the same
+        pre-conditions and has not been reset since"""
+        stack = get_stack()
+
+        return (self.is_running and self.warm_key is not None and
+                self.warm_key == key and
+                len(stack.core.event_queues[defs.BTP_CORE_EV_IUT_READY]) == 0)
+
+    def keep_warm(self, key):
+        """Leave the IUT running for the next test case with pre-conditions key"""
+        self.warm_key = key
+
+    def warm_blocker(self):
+        """Return why the IUT state left by the test case must not be
+        reused by the next one, or None"""
+        stack = get_stack()
+
+        unsafe_svcs = [svc for svc in stack.core.registered_svcs if svc in WARM_UNSAFE_SVCS]
+        if unsafe_svcs:
+            return f'{", ".join(unsafe_svcs)} registered'
+
+        if stack.gap and stack.gap.paired:
+            return 'paired, the IUT may have stored bonds'
+
+        return None
+
+    def soft_reset(self, test_case):
+        """Reuse the running IUT for the next test case
+
+        Instead of a restart, the GAP state is reset and the services
+        are unregistered over BTP, so that the test case can register
+        them again. Any other state survives, e.g. the GATT server DB,
+        bonds and the mesh provisioning, so an IUT is not kept warm
+        after a test case that may have changed it, see warm_blocker().
+        """
+        log("%s.%s", self.__class__, self.soft_reset.__name__)
+
+        self.warm_key = None
+        self.rtt_logger_stop()
+        self.btmon_stop()
+        if self.net_tty_file:
+            self.uart_logger.close()
+
+        self.test_case = test_case
+        self.socket_srv.set_log_dir(test_case.log_dir)
+        self.btp_socket.reset_rx_queue()
+
+        if self.net_tty_file:
+            self.uart_logger = LoggerWorker(self.net_tty_file, SERIAL_BAUDRATE,
+                                            self.test_case.log_dir)
+            self.uart_logger.start()
+
+        self.rtt_logger_start()
+        self.btmon_start()
+
+        if 'gap_reg' in get_stack().core.registered_svcs:
+            btp.gap_reset()
+
+        btp.core_unreg_all_svcs()
+
+    def add_overhead(self, warm, overhead):
+        stats = self.overhead_stats['warm' if warm else 'cold']
+        stats[0] += 1
+        stats[1] += overhead
+
+    def log_overhead_summary(self):
+        for start, (count, overhead) in self.overhead_stats.items():
+            if count:
+                logging.info("IUT overhead of %d test cases with %s start: "
+                             "%.2f s in total, %.2f s on average",
+                             count, start, overhead, overhead / count)
+
+    def serial_port_name(self):
+        if sys.platform == 'win32':
+            return tty_to_com(self.tty_file)
+
+        return self.tty_file
+
+    def close_serial_port(self):
+        """Close the serial port kept open between test cases"""
+        if self.serial_port:
+            self.serial_port.close()
+            self.serial_port = None
 
     def btmon_start(self):
         if self.btmon:
@@ -265,8 +321,12 @@ class ZephyrCtl:
 
         self.rtt_logger_stop()
         self.btmon_stop()
+        self.warm_key = None
 
         stack = get_stack()
+        if stack.core:
+            stack.core.registered_svcs.clear()
+
         if not self.gdb and self.board and \
                 stack.core and not get_global_end():
 
@@ -302,11 +362,6 @@ class ZephyrCtl:
             self.iut_log_file.close()
             self.iut_log_file = None
 
-        if self.socat_process:
-            self.socat_process.terminate()
-            self.socat_process.wait()
-            self.socat_process = None
-
         self.is_running = False
 
 
@@ -350,4 +405,6 @@ def cleanup():
     global ZEPHYR
     if ZEPHYR:
         ZEPHYR.stop()
+        ZEPHYR.close_serial_port()
+        ZEPHYR.log_overhead_summary()
         ZEPHYR = None
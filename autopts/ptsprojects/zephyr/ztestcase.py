@@ -15,8 +15,19 @@
 
 """Test case that manages Zephyr IUT"""
 
+import logging
+import time
+
 from autopts.ptsprojects.stack import get_stack
-from autopts.ptsprojects.testcase import TestCaseLT1, TestCaseLT2, TestCaseLT3, TestFunc, TestFuncCleanUp
+from autopts.ptsprojects.testcase import (
+    SETTLE_TIME,
+    TestCaseLT1,
+    TestCaseLT2,
+    TestCaseLT3,
+    TestFunc,
+    TestFuncCleanUp,
+    is_cleanup_func,
+)
 from autopts.ptsprojects.zephyr.iutctl import get_iut
 
 
@@ -31,28 +42,112 @@ class ZTestCase(TestCaseLT1):
         self.stack = get_stack()
         self.zephyrctl = get_iut()
 
-        self.cmds.insert(0, TestFunc(self.stack.core_init))
-
-        # For HW, the IUT ready event is triggered at its reset and
-        # can be only received after socket is successfully running.
-        # This hw_reset will be active only at the first test case.
-        self.cmds.insert(1, TestFunc(self.zephyrctl.hw_reset))
-
-        # This will open BTP socket and start QEMU process.
-        # For QEMU, the IUT ready event is sent at startup of the process.
-        self.cmds.insert(2, TestFunc(self.zephyrctl.start, self))
-
-        # Now socket should be open for IUT ready event from HW.
-        # This hw_reset will be active only at the first test case.
-        self.cmds.insert(3, TestFunc(self.zephyrctl.hw_reset))
-        self.cmds.insert(4, TestFunc(self.zephyrctl.wait_iut_ready_event, False))
-
-        self.cmds.append(TestFuncCleanUp(self.stack.cleanup))
-
-        # Last command is to stop QEMU or HW.
-        # For HW, this will trigger the HW reset and the IUT ready event.
-        # The event will be used in the next test case, to skip double reset.
-        self.cmds.append(TestFuncCleanUp(self.zephyrctl.stop))
+        # True if the IUT left running by the previous test case is reused
+        self.warm = False
+        # True if the IUT reported all its links down at the teardown
+        self.settled = False
+        # Seconds spent on the IUT setup, teardown and settle
+        self.overhead = {}
+
+        self.setup_cmd = TestFunc(self.iut_setup)
+        self.cmds.insert(0, self.setup_cmd)
+
+        # Last command is to stop QEMU or HW, unless it is kept running
+        # for the next test case.
+        self.cmds.append(TestFuncCleanUp(self.iut_teardown))
+
+    def warm_key(self):
+        """Pre-conditions of the test case, i.e. the commands started
+        before the first WID"""
+        return tuple(cmd for cmd in self.cmds
+                     if cmd is not self.setup_cmd and cmd.start_wid is None and
+                     cmd.post_wid is None and not is_cleanup_func(cmd))
+
+    def iut_setup(self):
+        """Start the IUT or reuse the one left running by the previous
+        test case, if that one had the same pre-conditions"""
+        start = time.monotonic()
+        self.overhead = {}
+        self.settled = False
+
+        self.stack.core_init()
+
+        self.warm = self.zephyrctl.is_warm(self.warm_key())
+        if self.warm:
+            try:
+                self.zephyrctl.soft_reset(self)
+            except Exception as e:
+                logging.warning("Soft reset of IUT failed, restarting it: %r", e)
+                self.warm = False
+                self.zephyrctl.stop()
+        elif self.zephyrctl.is_running:
+            # Kept running for test cases with other pre-conditions
+            self.zephyrctl.stop()
+
+        if not self.warm:
+            # For HW, the IUT ready event is triggered at its reset and
+            # can be only received after socket is successfully running.
+            # This hw_reset will be active only at the first test case.
+            self.zephyrctl.hw_reset()
+
+            # This will open BTP socket and start QEMU process.
+            # For QEMU, the IUT ready event is sent at startup of the process.
+            self.zephyrctl.start(self)
+
+            # Now socket should be open for IUT ready event from HW.
+            # This hw_reset will be active only at the first test case.
+            self.zephyrctl.hw_reset()
+            self.zephyrctl.wait_iut_ready_event(False)
+
+        self.overhead['setup'] = time.monotonic() - start
+
+    def iut_teardown(self):
+        start = time.monotonic()
+
+        keep_warm = (self.zephyrctl.warm_iut and self.status == 'PASS' and
+                     not self.name_lt2 and not self.name_lt3)
+
+        # Instead of a fixed settle delay, wait until the IUT reports
+        # its links down. Otherwise it gets restarted.
+        if keep_warm and self.stack.gap:
+            keep_warm = self.stack.gap.wait_for_disconnection(SETTLE_TIME)
+
+        # State left on the IUT would leak into the next test case
+        if keep_warm:
+            reason = self.zephyrctl.warm_blocker()
+            if reason:
+                logging.debug("Not reusing the IUT of %s: %s", self.name, reason)
+                keep_warm = False
+
+        self.stack.cleanup()
+
+        if keep_warm:
+            self.zephyrctl.keep_warm(self.warm_key())
+        else:
+            # For HW, this will trigger the HW reset and the IUT ready event.
+            # The event will be used in the next test case, to skip double reset.
+            self.zephyrctl.stop()
+
+        self.settled = keep_warm
+        self.overhead['teardown'] = time.monotonic() - start
+
+    def settle(self):
+        start = time.monotonic()
+
+        if not self.settled:
+            super().settle()
+
+        self.overhead['settle'] = time.monotonic() - start
+
+    def post_run(self, error_code):
+        super().post_run(error_code)
+
+        total = sum(self.overhead.values())
+        self.zephyrctl.add_overhead(self.warm, total)
+        logging.info("IUT overhead of %s (%s start): %s, %.2f s in total", self.name,
+                     'warm' if self.warm else 'cold',
+                     ', '.join(f'{name} {t:.2f} s' for name, t in self.overhead.items()),
+                     total)
 
 
 class ZTestCaseSlave(TestCaseLT2):
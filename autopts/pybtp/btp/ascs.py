@@ -18,10 +18,11 @@ import binascii
 import logging
 import struct
 
+from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import CONTROLLER_INDEX, btp_hdr_check, pts_addr_get, pts_addr_type_get
 from autopts.pybtp.btp.btp import get_iut_method as get_iut
-from autopts.pybtp.types import BTPError, addr2btp_ba
+from autopts.pybtp.types import ASCSState, BTPError, addr2btp_ba
 
 ASCS = {
     'read_supported_cmds': (defs.BTP_SERVICE_ID_ASCS,
@@ -265,6 +266,11 @@ def ascs_ev_ase_state_changed_(ascs, data, data_len):
 
     logging.debug(f'ASE state: ase_id {ase_id}, state {state}')
 
+    stack = get_stack()
+    if stack.bap and state != ASCSState.STREAMING:
+        # Called from the BTP receiver, so do not wait for the stream
+        stack.bap.stop_stream((addr_type, addr, ase_id), wait=False)
+
     ascs.event_received(defs.BTP_ASCS_EV_ASE_STATE_CHANGED,
                         (addr_type, addr, ase_id, state))
 
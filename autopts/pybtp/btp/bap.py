@@ -18,6 +18,7 @@ import binascii
 import logging
 import struct
 
+from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import CONTROLLER_INDEX, btp_hdr_check, pts_addr_get, pts_addr_type_get
 from autopts.pybtp.btp.btp import get_iut_method as get_iut
@@ -121,9 +122,8 @@ def bap_send(ase_id, data_ba, bd_addr_type=None, bd_addr=None):
     data += data_ba
 
     iutctl = get_iut()
-    iutctl.btp_socket.send(*BAP['send'], data=data)
-
-    tuple_data = bap_command_rsp_succ()
+    # Atomic, since SDUs are sent from the stream threads too
+    tuple_data = iutctl.btp_socket.send_wait_rsp(*BAP['send'], data=data)
     buffered_data_len = int.from_bytes(tuple_data[0], byteorder='little')
 
     return buffered_data_len
@@ -211,6 +211,10 @@ def bap_broadcast_source_setup_v2(
 def bap_broadcast_source_release(broadcast_id):
     logging.debug(f"{bap_broadcast_source_release.__name__}")
 
+    stack = get_stack()
+    if stack.bap:
+        stack.bap.stop_streams()
+
     iutctl = get_iut()
     data = bytearray()
     data += int.to_bytes(broadcast_id, 3, 'little')
@@ -256,6 +260,10 @@ def bap_broadcast_source_start(broadcast_id):
 def bap_broadcast_source_stop(broadcast_id):
     logging.debug(f"{bap_broadcast_source_stop.__name__}")
 
+    stack = get_stack()
+    if stack.bap:
+        stack.bap.stop_streams()
+
     iutctl = get_iut()
     data = bytearray()
     data += int.to_bytes(broadcast_id, 3, 'little')
@@ -19,12 +19,14 @@ import logging
 import math
 import re
 import struct
+import time
 from collections import namedtuple
 from uuid import UUID
 
-from autopts.ptsprojects.stack import get_stack
+from autopts.ptsprojects.stack import get_stack, notify_event_waiters
 from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import defs
+from autopts.pybtp.capabilities import CAPABILITY_CACHE, SERVICES
 from autopts.pybtp.common import CONTROLLER_INDEX, CONTROLLER_INDEX_NONE, reg_unreg_service, supported_svcs_cmds
 from autopts.pybtp.iutctl_common import set_event_handler
 from autopts.pybtp.types import BTPError, att_rsp_str
@@ -41,9 +43,6 @@ PTS_BD_ADDR = LeAddress(addr_type=0, addr='000000000000')
 LT2_BD_ADDR = LeAddress(addr_type=0, addr='000000000000')
 LT3_BD_ADDR = LeAddress(addr_type=0, addr='000000000000')
 
-# Devices found
-LeAdv = namedtuple('LeAdv', 'addr_type addr rssi flags eir')
-
 CONTROLLER_INDEX = CONTROLLER_INDEX
 CONTROLLER_INDEX_NONE = CONTROLLER_INDEX_NONE
 
@@ -53,6 +52,11 @@ def read_supp_svcs():
     iutctl = get_iut()
     stack = get_stack()
 
+    supported_svcs = CAPABILITY_CACHE.get(SERVICES)
+    if supported_svcs is not None:
+        stack.supported_svcs = supported_svcs
+        return
+
     iutctl.btp_socket.send(*CORE['read_supp_svcs'])
 
     # Expected result
@@ -64,6 +68,7 @@ def read_supp_svcs():
                   tuple_hdr, tuple_data)
 
     stack.supported_svcs = int.from_bytes(tuple_data[0], 'little')
+    CAPABILITY_CACHE.set(SERVICES, stack.supported_svcs)
 
 
 def read_supported_commands(service):
@@ -91,6 +96,14 @@ def read_supported_commands(service):
         logging.error("Invalid mask for %s: %s", svc_key, err)
         return
 
+    if not isinstance(stack.supported_cmds, dict):
+        stack.supported_cmds = {}
+
+    supported_cmds_value = CAPABILITY_CACHE.get(svc_key)
+    if supported_cmds_value is not None:
+        stack.supported_cmds[svc_key] = supported_cmds_value
+        return
+
     opcode_supp_cmd = entry["supported_commands"]
 
     cmd_tuple = (service_id, opcode_supp_cmd, defs.BTP_INDEX_NONE, "")
@@ -102,9 +115,8 @@ def read_supported_commands(service):
     data_bytes = tuple_data[0] if isinstance(tuple_data, tuple) and tuple_data else tuple_data
     supported_cmds_value = int.from_bytes(data_bytes, 'little')
 
-    if not isinstance(stack.supported_cmds, dict):
-        stack.supported_cmds = {}
     stack.supported_cmds[svc_key] = supported_cmds_value
+    CAPABILITY_CACHE.set(svc_key, supported_cmds_value)
 
 
 def core_reg_svc_univ(service_key: str, service_name: str):
@@ -126,6 +138,26 @@ def core_reg_svc_univ(service_key: str, service_name: str):
 
     core_reg_svc_rsp_succ(service_name)
 
+    stack = get_stack()
+    if stack.core:
+        stack.core.registered_svcs.append(service_key)
+
+
+def core_unreg_all_svcs():
+    """Unregister the services registered since the IUT start
+
+    Used to reuse a running IUT for the next test case, which registers
+    its services again.
+    """
+    logging.debug("%s", core_unreg_all_svcs.__name__)
+    iutctl = get_iut()
+    stack = get_stack()
+
+    while stack.core.registered_svcs:
+        svc_id, _, ctrl_index, data = CORE[stack.core.registered_svcs.pop()]
+        iutctl.btp_socket.send_wait_rsp(svc_id, defs.BTP_CORE_CMD_UNREGISTER_SERVICE,
+                                        ctrl_index, data)
+
 
 def clear_verify_values():
     stack = get_stack()
@@ -684,8 +716,18 @@ def init(get_iut_method):
     set_event_handler(event_handler)
 
 
-def event_handler(hdr, data):
-    logging.debug("%s %r %r", event_handler.__name__, hdr, data)
+# BTP service ID -> (event handlers, Stack attribute of the service layer)
+EVENT_DISPATCH = None
+
+
+def get_event_dispatch():
+    """Build the event dispatch table once. Layers are looked up by name
+    at dispatch, so the table stays valid when Stack services change."""
+    global EVENT_DISPATCH
+
+    if EVENT_DISPATCH is not None:
+        return EVENT_DISPATCH
+
     from .event_map import (
         AICS_EV,
         ASCS_EV,
@@ -715,47 +757,59 @@ def event_handler(hdr, data):
         VCS_EV,
         VOCS_EV,
     )
+
+    EVENT_DISPATCH = {
+        defs.BTP_SERVICE_ID_MESH: (MESH_EV, 'mesh'),
+        defs.BTP_SERVICE_ID_L2CAP: (L2CAP_EV, 'l2cap'),
+        defs.BTP_SERVICE_ID_GAP: (GAP_EV, 'gap'),
+        defs.BTP_SERVICE_ID_GATT: (GATT_EV, 'gatt'),
+        defs.BTP_SERVICE_ID_GATTC: (GATTC_EV, 'gatt_cl'),
+        defs.BTP_SERVICE_ID_IAS: (IAS_EV, 'ias'),
+        defs.BTP_SERVICE_ID_VCS: (VCS_EV, 'vcs'),
+        defs.BTP_SERVICE_ID_AICS: (AICS_EV, 'aics'),
+        defs.BTP_SERVICE_ID_VOCS: (VOCS_EV, 'vocs'),
+        defs.BTP_SERVICE_ID_PACS: (PACS_EV, 'pacs'),
+        defs.BTP_SERVICE_ID_ASCS: (ASCS_EV, 'ascs'),
+        defs.BTP_SERVICE_ID_BAP: (BAP_EV, 'bap'),
+        defs.BTP_SERVICE_ID_CORE: (CORE_EV, 'core'),
+        defs.BTP_SERVICE_ID_MICP: (MICP_EV, 'micp'),
+        defs.BTP_SERVICE_ID_MICS: (MICS_EV, 'mics'),
+        defs.BTP_SERVICE_ID_CCP: (CCP_EV, 'ccp'),
+        defs.BTP_SERVICE_ID_VCP: (VCP_EV, 'vcp'),
+        defs.BTP_SERVICE_ID_MCP: (MCP_EV, 'mcp'),
+        defs.BTP_SERVICE_ID_GMCS: (GMCS_EV, 'gmcs'),
+        defs.BTP_SERVICE_ID_HAP: (HAP_EV, 'hap'),
+        defs.BTP_SERVICE_ID_CAP: (CAP_EV, 'cap'),
+        defs.BTP_SERVICE_ID_CSIP: (CSIP_EV, 'csip'),
+        defs.BTP_SERVICE_ID_TBS: (TBS_EV, 'tbs'),
+        defs.BTP_SERVICE_ID_TMAP: (TMAP_EV, 'tmap'),
+        defs.BTP_SERVICE_ID_OTS: (OTS_EV, 'ots'),
+        defs.BTP_SERVICE_ID_PBP: (PBP_EV, 'pbp'),
+        defs.BTP_SERVICE_ID_SDP: (SDP_EV, 'sdp'),
+        # GENERATOR append 3
+    }
+
+    return EVENT_DISPATCH
+
+
+def event_handler(hdr, data):
+    logging.debug("%s %r %r", event_handler.__name__, hdr, data)
+
     stack = get_stack()
     if not stack:
         logging.info("Stack not initialized")
         return False
 
-    service_map = {
-        defs.BTP_SERVICE_ID_MESH: (MESH_EV, stack.mesh),
-        defs.BTP_SERVICE_ID_L2CAP: (L2CAP_EV, stack.l2cap),
-        defs.BTP_SERVICE_ID_GAP: (GAP_EV, stack.gap),
-        defs.BTP_SERVICE_ID_GATT: (GATT_EV, stack.gatt),
-        defs.BTP_SERVICE_ID_GATTC: (GATTC_EV, stack.gatt_cl),
-        defs.BTP_SERVICE_ID_IAS: (IAS_EV, stack.ias),
-        defs.BTP_SERVICE_ID_VCS: (VCS_EV, stack.vcs),
-        defs.BTP_SERVICE_ID_AICS: (AICS_EV, stack.aics),
-        defs.BTP_SERVICE_ID_VOCS: (VOCS_EV, stack.vocs),
-        defs.BTP_SERVICE_ID_PACS: (PACS_EV, stack.pacs),
-        defs.BTP_SERVICE_ID_ASCS: (ASCS_EV, stack.ascs),
-        defs.BTP_SERVICE_ID_BAP: (BAP_EV, stack.bap),
-        defs.BTP_SERVICE_ID_CORE: (CORE_EV, stack.core),
-        defs.BTP_SERVICE_ID_MICP: (MICP_EV, stack.micp),
-        defs.BTP_SERVICE_ID_MICS: (MICS_EV, stack.mics),
-        defs.BTP_SERVICE_ID_CCP: (CCP_EV, stack.ccp),
-        defs.BTP_SERVICE_ID_VCP: (VCP_EV, stack.vcp),
-        defs.BTP_SERVICE_ID_MCP: (MCP_EV, stack.mcp),
-        defs.BTP_SERVICE_ID_GMCS: (GMCS_EV, stack.gmcs),
-        defs.BTP_SERVICE_ID_HAP: (HAP_EV, stack.hap),
-        defs.BTP_SERVICE_ID_CAP: (CAP_EV, stack.cap),
-        defs.BTP_SERVICE_ID_CSIP: (CSIP_EV, stack.csip),
-        defs.BTP_SERVICE_ID_TBS: (TBS_EV, stack.tbs),
-        defs.BTP_SERVICE_ID_TMAP: (TMAP_EV, stack.tmap),
-        defs.BTP_SERVICE_ID_OTS: (OTS_EV, stack.ots),
-        defs.BTP_SERVICE_ID_PBP: (PBP_EV, stack.pbp),
-        defs.BTP_SERVICE_ID_SDP: (SDP_EV, stack.sdp),
-        # GENERATOR append 3
-    }
-
-    if hdr.svc_id in service_map:
-        event_dict, stack_obj = service_map[hdr.svc_id]
+    service = get_event_dispatch().get(hdr.svc_id)
+    if service:
+        event_dict, stack_attr = service
+        stack_obj = getattr(stack, stack_attr)
         if hdr.op in event_dict and stack_obj:
             cb = event_dict[hdr.op]
+            start = time.perf_counter()
             cb(stack_obj, data[0], hdr.data_len)
+            stack.event_stats.record(hdr.svc_id, time.perf_counter() - start)
+            notify_event_waiters()
             return True
 
     # TODO: Raise BTP error instead of logging
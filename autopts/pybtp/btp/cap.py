@@ -294,6 +294,10 @@ def cap_broadcast_source_setup(source_id, broadcast_id, sdu_interval, framing, m
 def cap_broadcast_source_release(source_id):
     logging.debug(f"{cap_broadcast_source_release.__name__}")
 
+    stack = get_stack()
+    if stack.bap:
+        stack.bap.stop_streams()
+
     iutctl = get_iut()
     data = bytearray()
     data += struct.pack('B', source_id)
@@ -339,6 +343,10 @@ def cap_broadcast_source_start(source_id):
 def cap_broadcast_source_stop(source_id):
     logging.debug(f"{cap_broadcast_source_stop.__name__}")
 
+    stack = get_stack()
+    if stack.bap:
+        stack.bap.stop_streams()
+
     iutctl = get_iut()
     data = bytearray()
     data += struct.pack('B', source_id)
@@ -22,10 +22,10 @@ import struct
 from random import randint
 
 from autopts.ptsprojects.stack import ConnParams, get_stack
+from autopts.ptsprojects.stack.layers.gap import parse_ad
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import (
     CONTROLLER_INDEX,
-    LeAdv,
     btp_hdr_check,
     lt2_addr_get,
     lt2_addr_type_get,
@@ -176,8 +176,7 @@ def gap_device_found_ev_(gap, data, data_len):
     logging.debug("found %r type %r eir %r", addr, addr_type, eir)
 
     stack = get_stack()
-    stack.gap.found_devices.data.append(LeAdv(addr_type, addr, rssi, flags,
-                                              eir))
+    stack.gap.found_devices.add(addr_type, addr, rssi, flags, eir)
 
 
 def gap_connected_ev_(gap, data, data_len):
@@ -1286,17 +1285,7 @@ def gap_set_extended_advertising_off():
 
 
 def parse_eir_data(eir):
-    data = {}
-
-    eir_len = len(eir)
-    i = 0
-    while i < eir_len:
-        data_len = eir[i]
-        data_type = eir[i + 1]
-        data[data_type] = eir[i + 2:i + data_len + 1]
-        i += 1 + data_len
-
-    return data
+    return parse_ad(eir)
 
 
 def check_discov_results(addr_type=None, addr=None, discovered=True, eir=None, uuids=None, svc_data=None):
@@ -1309,19 +1298,15 @@ def check_discov_results(addr_type=None, addr=None, discovered=True, eir=None, u
     found = False
 
     stack = get_stack()
-    devices = stack.gap.found_devices.data
+    devices = stack.gap.found_devices.entries(addr_type, addr)
 
     for device in devices:
-        logging.debug("matching %r", device)
-        if addr_type != device.addr_type:
-            continue
-        if addr != device.addr:
-            continue
+        logging.debug("matching %r", device.eir)
         if eir and eir != device.eir:
             continue
 
         if device.eir:
-            data = parse_eir_data(device.eir)
+            data = device.ad
             if uuids and ((AdType.uuid16_some in data) or
                           (AdType.uuid16_all in data)):
                 uuid_list_type = AdType.uuid16_some if \
@@ -1351,7 +1336,7 @@ def check_discov_results(addr_type=None, addr=None, discovered=True, eir=None, u
 
 def check_scan_rep_and_rsp(report, response):
     stack = get_stack()
-    devices = stack.gap.found_devices.data
+    devices = stack.gap.found_devices.all_entries()
 
     # remove trailing zeros
     report = report.rstrip('0').upper()
@@ -1362,8 +1347,7 @@ def check_scan_rep_and_rsp(report, response):
         response += '0'
 
     for device in devices:
-        eir = str(binascii.hexlify(device.eir)).lstrip('b\'').rstrip('\'').upper()
-        if report in eir and response in eir:
+        if report in device.hex and response in device.hex:
             return True
     return False
 
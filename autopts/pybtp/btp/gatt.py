@@ -19,7 +19,7 @@ import binascii
 import logging
 import struct
 
-from autopts.ptsprojects.stack import GattCharacteristic, GattCharacteristicDescriptor, GattService
+from autopts.ptsprojects.stack import GattCharacteristic, GattCharacteristicDescriptor, GattService, get_stack
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import (
     CONTROLLER_INDEX,
@@ -112,6 +112,7 @@ def gatt_attr_value_changed_ev_(gatt, data, data_len):
 
     gatt.attr_value_set(handle, binascii.hexlify(value[0]))
     gatt.attr_value_set_changed(handle)
+    gatt.iut_db.value_invalidate(handle)
 
 
 def gatt_notification_ev_(gatt, data, data_len):
@@ -375,54 +376,38 @@ def gatts_attr_value_changed_ev():
 def dec_gatts_get_attrs_rp(data, data_len):
     logging.debug("%s %r %r", dec_gatts_get_attrs_rp.__name__, data, data_len)
 
-    hdr = '<B'
-    hdr_len = struct.calcsize(hdr)
-    data_len = data_len - hdr_len
+    data = memoryview(data)[:data_len]
+    (attr_count,) = struct.unpack_from('<B', data)
+    offset = struct.calcsize('<B')
 
-    (attr_count, attrs) = struct.unpack(hdr + f"{data_len}s", data)
+    hdr = '<HBB'
+    hdr_len = struct.calcsize(hdr)
 
     attributes = []
 
-    while (attr_count - 1) >= 0:
-        hdr = '<HBB'
-        hdr_len = struct.calcsize(hdr)
-        data_len = data_len - hdr_len
-
-        (handle, permission, type_uuid_len, frag) = struct.unpack(hdr + f"{data_len}s", attrs)
-
-        data_len = data_len - type_uuid_len
-
-        (type_uuid, attrs) = struct.unpack(f"{type_uuid_len}s{data_len}s", frag)
+    for _ in range(attr_count):
+        (handle, permission, type_uuid_len) = struct.unpack_from(hdr, data, offset)
+        offset += hdr_len
 
-        type_uuid = btp2uuid(type_uuid_len, type_uuid)
+        type_uuid = btp2uuid(type_uuid_len, bytes(data[offset:offset + type_uuid_len]))
+        offset += type_uuid_len
 
         attributes.append((handle, permission, type_uuid))
 
-        attr_count = attr_count - 1
-
         logging.debug("handle %r perm %r type_uuid %r", handle, permission,
                       type_uuid)
 
     return attributes
 
 
-def gatts_get_attrs(start_handle=0x0001, end_handle=0xffff, type_uuid=None):
-    logging.debug("%s %r %r %r", gatts_get_attrs.__name__, start_handle,
-                  end_handle, type_uuid)
-
+def _gatts_get_attrs(start_handle, end_handle, type_uuid=None):
     iutctl = get_iut()
 
     data_ba = bytearray()
 
-    if isinstance(start_handle, str):
-        start_handle = int(start_handle, 16)
-
     start_hdl_ba = struct.pack('H', start_handle)
     data_ba.extend(start_hdl_ba)
 
-    if isinstance(end_handle, str):
-        end_handle = int(end_handle, 16)
-
     end_hdl_ba = struct.pack('H', end_handle)
     data_ba.extend(end_hdl_ba)
 
@@ -446,16 +431,96 @@ def gatts_get_attrs(start_handle=0x0001, end_handle=0xffff, type_uuid=None):
     return dec_gatts_get_attrs_rp(tuple_data[0], tuple_hdr.data_len)
 
 
+def _gatts_iut_db(sync=True):
+    """Return the IUT DB mirror, synced if needed and sync is set, or None
+    if the IUT has to be queried directly"""
+    stack = get_stack()
+    btp_socket = get_iut().btp_socket
+
+    if not stack.gatt or not hasattr(btp_socket, 'tx_counts'):
+        return None
+
+    iut_db = stack.gatt.iut_db
+    if iut_db.is_synced(btp_socket):
+        return iut_db
+
+    if not sync:
+        return None
+
+    # The response size is limited, so read the DB in pages
+    attrs = []
+    start_handle = 0x0001
+    while start_handle <= 0xffff:
+        try:
+            page = _gatts_get_attrs(start_handle, 0xffff)
+        except BTPError:
+            # Never serve an incomplete DB
+            logging.debug("Failed to sync IUT GATT DB from handle %r", start_handle)
+            return None
+
+        if not page:
+            break
+
+        attrs.extend(page)
+        start_handle = page[-1][0] + 1
+
+    logging.debug("Synced %d attributes of IUT GATT DB", len(attrs))
+    iut_db.sync(btp_socket, attrs)
+
+    return iut_db
+
+
+def gatts_get_attrs(start_handle=0x0001, end_handle=0xffff, type_uuid=None, perm=None):
+    """Return (handle, perm, type_uuid) of the IUT attributes in the
+    handle range, of type_uuid and with any of the perm bits if set.
+
+    Served from the mirror of the IUT DB while no command or event that
+    may change the DB has been sent or received since it was synced.
+    The mirror is synced only for queries of the whole DB, since a
+    sync takes several requests.
+    """
+    logging.debug("%s %r %r %r %r", gatts_get_attrs.__name__, start_handle,
+                  end_handle, type_uuid, perm)
+
+    if isinstance(start_handle, str):
+        start_handle = int(start_handle, 16)
+
+    if isinstance(end_handle, str):
+        end_handle = int(end_handle, 16)
+
+    iut_db = _gatts_iut_db(sync=(start_handle, end_handle) == (0x0001, 0xffff))
+    if iut_db:
+        return iut_db.attrs(start_handle, end_handle, type_uuid, perm)
+
+    attrs = _gatts_get_attrs(start_handle, end_handle, type_uuid)
+    if perm is not None:
+        attrs = [attr for attr in attrs if attr[1] & perm]
+
+    return attrs
+
+
 def gatts_get_attr_val(bd_addr_type, bd_addr, handle):
     logging.debug("%s %r", gatts_get_attr_val.__name__, handle)
 
     iutctl = get_iut()
 
+    if isinstance(handle, str):
+        handle = int(handle, 16)
+
+    # Only the declaration values are cached, the others may be changed
+    # by the IUT at any time. Syncing the mirror would take more requests
+    # than reading the value.
+    iut_db = _gatts_iut_db(sync=False)
+    if iut_db and iut_db.is_declaration(handle):
+        value = iut_db.value_get(bd_addr_type, bd_addr, handle)
+        if value is not None:
+            return value
+    else:
+        iut_db = None
+
     data_ba = bytearray()
 
     bd_addr_ba = addr2btp_ba(bd_addr)
-    if isinstance(handle, str):
-        handle = int(handle, 16)
 
     hdl_ba = struct.pack('H', handle)
 
@@ -475,7 +540,12 @@ def gatts_get_attr_val(bd_addr_type, bd_addr, handle):
     hdr_len = struct.calcsize(hdr)
     data_len = tuple_hdr.data_len - hdr_len
 
-    return struct.unpack(hdr + f"{data_len}s", tuple_data[0])
+    value = struct.unpack(hdr + f"{data_len}s", tuple_data[0])
+
+    if iut_db:
+        iut_db.value_set(bd_addr_type, bd_addr, handle, value)
+
+    return value
 
 
 def gattc_exchange_mtu(bd_addr_type, bd_addr):
@@ -17,14 +17,20 @@
 
 import binascii
 import logging
+import os
 import struct
+from collections import deque
 
 from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import defs
 from autopts.pybtp.btp.btp import CONTROLLER_INDEX, btp_hdr_check, pts_addr_get, pts_addr_type_get
 from autopts.pybtp.btp.btp import get_iut_method as get_iut
 from autopts.pybtp.btp.gap import gap_wait_for_connection
-from autopts.pybtp.types import L2CAPConnectionResponse, addr2btp_ba
+from autopts.pybtp.types import BTPError, L2CAPConnectionResponse, addr2btp_ba
+
+# send_data commands in flight. BTP does not report the credits of the
+# peer, so this is limited by the command buffers of the IUT instead.
+L2CAP_TX_WINDOW = int(os.getenv("AUTOPTS_L2CAP_TX_WINDOW", "2"))
 
 L2CAP = {
     "read_supp_cmds": (defs.BTP_SERVICE_ID_L2CAP,
@@ -192,22 +198,67 @@ def l2cap_send_data(chan_id, val, val_mtp=None):
     logging.debug("%s %r %r %r", l2cap_send_data.__name__, chan_id, val,
                   val_mtp)
 
-    iutctl = get_iut()
-
     if val_mtp:
         val *= int(val_mtp)
 
     val_ba = bytes.fromhex(val)
-    val_len_ba = struct.pack('H', len(val_ba))
 
-    data_ba = bytearray(chr(chan_id).encode('utf-8'))
-    data_ba.extend(val_len_ba)
-    data_ba.extend(val_ba)
+    if not l2cap_send_sdus(chan_id, [val_ba]):
+        raise BTPError("Error opcode in response!")
+
 
-    iutctl.btp_socket.send_wait_rsp(*L2CAP['send_data'], data=data_ba)
+def l2cap_send_sdus(chan_id, sdus, window=L2CAP_TX_WINDOW):
+    """Send each bytes-like SDU from the sdus iterable, with up to window
+    send commands in flight. Stops at the first SDU the IUT rejects,
+    e.g. with no credits or buffers left.
 
+    Returns the number of SDUs sent in order, i.e. the index of the
+    first rejected SDU. SDUs already in flight behind it are not
+    counted, since the peer got them after a hole in the data.
+    """
+    iutctl = get_iut()
     stack = get_stack()
-    stack.l2cap.tx(chan_id, val)
+    in_flight = deque()
+    hdr = struct.Struct('<BH')
+    rejected = []
+
+    def frames():
+        for sdu in sdus:
+            in_flight.append(sdu)
+            yield hdr.pack(chan_id, len(sdu)) + sdu
+
+    def on_rsp(ok):
+        sdu = in_flight.popleft()
+        if not ok:
+            rejected.append(sdu)
+        elif rejected:
+            logging.warning("L2CAP SDU sent on channel %r after a rejected one", chan_id)
+        else:
+            stack.l2cap.tx(chan_id, bytes(sdu))
+
+    return iutctl.btp_socket.send_wait_rsp_pipelined(*L2CAP['send_data'], frames(),
+                                                     window, on_rsp)
+
+
+def l2cap_send(chan_id, payload, sdu_len=None, window=L2CAP_TX_WINDOW):
+    """Send the bytes-like payload in SDUs of sdu_len, by default the
+    peer MTU of the channel. The IUT segments the SDUs to the peer MPS.
+
+    Returns the number of bytes sent.
+    """
+    logging.debug("%s %r %r %r", l2cap_send.__name__, chan_id, len(payload), sdu_len)
+
+    payload = memoryview(payload).cast('B')
+
+    if sdu_len is None:
+        chan = get_stack().l2cap.chan_lookup_id(chan_id)
+        sdu_len = chan.peer_mtu if chan and chan.peer_mtu else len(payload)
+
+    sdus = [payload[offset:offset + sdu_len]
+            for offset in range(0, len(payload), sdu_len)]
+    sent = l2cap_send_sdus(chan_id, sdus, window)
+
+    return sum(len(sdu) for sdu in sdus[:sent])
 
 
 def l2cap_listen(psm, transport, mtu=0, response=L2CAPConnectionResponse.success):
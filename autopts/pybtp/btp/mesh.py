@@ -1760,6 +1760,9 @@ def mesh_lpn_polled_ev(mesh, data, data_len):
 
     (net_idx, frnd_addr, retry) = struct.unpack_from(hdr_fmt, data, 0)
 
+    stack = get_stack()
+    stack.mesh.lpn_polls.data += 1
+
 
 def mesh_prov_node_added_ev(mesh, data, data_len):
     logging.debug("%s", mesh_prov_node_added_ev.__name__)
@@ -0,0 +1,129 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2025, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Cache of the services and commands supported by the IUT firmware
+
+The supported services and commands only change with the firmware, so
+they are stored under a firmware key, e.g. the key of the bot build
+flashed to the IUT or AUTOPTS_FIRMWARE_KEY, and persist across test
+cases and bot runs. Without a firmware key nothing is cached.
+
+With AUTOPTS_CAPABILITY_VERIFY_EVERY set to N, every N-th lookup of a
+value queries the IUT anyway, to detect firmware that changed under the
+same key.
+"""
+
+import json
+import logging
+import os
+
+from autopts.config import FILE_PATHS
+from autopts.utils import write_json_file
+
+CAPABILITY_VERIFY_EVERY = int(os.getenv("AUTOPTS_CAPABILITY_VERIFY_EVERY", "0"))
+# Number of firmware keys kept in the cache file
+CAPABILITY_CACHE_SIZE = 50
+
+# The key of supported services, next to the service keys of supported commands
+SERVICES = 'CORE_SERVICES'
+
+log = logging.debug
+
+
+class CapabilityCache:
+    def __init__(self, cache_file=None, verify_every=CAPABILITY_VERIFY_EVERY):
+        self.cache_file = cache_file
+        self.verify_every = verify_every
+        self.firmware_key = os.getenv("AUTOPTS_FIRMWARE_KEY")
+        self._entries = None
+        self._lookups = 0
+
+    def _read(self):
+        cache_file = self.cache_file or FILE_PATHS['CAPABILITY_CACHE_FILE']
+        if not os.path.exists(cache_file):
+            return {}
+
+        try:
+            with open(cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            log(f'Failed to load capability cache {cache_file}, {e}')
+            return {}
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = self._read()
+
+    def _save(self):
+        # Keep the firmware entries stored meanwhile by other processes
+        entries = {key: entry for key, entry in self._read().items()
+                   if key not in self._entries}
+        entries.update(self._entries)
+        self._entries = entries
+
+        for old_key in list(self._entries)[:-CAPABILITY_CACHE_SIZE]:
+            del self._entries[old_key]
+
+        try:
+            write_json_file(self.cache_file or FILE_PATHS['CAPABILITY_CACHE_FILE'],
+                            self._entries, indent=1)
+        except OSError as e:
+            # The IUT is queried again next time
+            logging.warning(f'Failed to save capability cache, {e}')
+
+    def set_firmware(self, firmware_key):
+        """Set the key of the firmware running on the IUT, None if unknown"""
+        self.firmware_key = firmware_key
+
+    def get(self, key):
+        """Return the cached value, or None if the IUT has to be queried"""
+        if self.firmware_key is None:
+            return None
+
+        self._load()
+        value = self._entries.get(self.firmware_key, {}).get(key)
+        if value is None:
+            return None
+
+        self._lookups += 1
+        if self.verify_every and self._lookups % self.verify_every == 0:
+            log(f'Verifying cached {key} capabilities of firmware {self.firmware_key}')
+            return None
+
+        return value
+
+    def set(self, key, value):
+        """Store the value read from the IUT"""
+        if self.firmware_key is None:
+            return
+
+        self._load()
+        entry = self._entries.pop(self.firmware_key, {})
+        # Most recently used entries go last
+        self._entries[self.firmware_key] = entry
+
+        if entry.get(key) == value:
+            return
+
+        if key in entry:
+            logging.warning(f'{key} capabilities of firmware {self.firmware_key} changed '
+                            f'from {entry[key]:#x} to {value:#x}')
+
+        entry[key] = value
+
+        self._save()
+
+
+CAPABILITY_CACHE = CapabilityCache()
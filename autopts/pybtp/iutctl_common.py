@@ -13,21 +13,22 @@
 # more details.
 #
 
-import binascii
+import collections
 import logging
 import os
-import queue
 import re
 import socket
 import sys
 import threading
+import time
 from abc import abstractmethod
 from datetime import datetime
 
 import serial
 
 from autopts.pybtp import defs
-from autopts.pybtp.parser import HDR_LEN, dec_data, dec_hdr, enc_frame, repr_hdr
+from autopts.pybtp.log_sink import BTP_TRACE, BTPTraceSink, LogSink
+from autopts.pybtp.parser import HDR_LEN, dec_data, dec_hdr, enc_frame
 from autopts.pybtp.types import BTPError
 from autopts.utils import get_global_end, raise_on_global_end
 
@@ -46,14 +47,107 @@ def set_event_handler(event_handler):
     EVENT_HANDLER = event_handler
 
 
+def _get_btp_names():
+    """Map (svc_id, opcode) of BTP commands and events to their names
+    defined in defs.py, so that logging a frame is a dict lookup."""
+    svc_names = {}
+    for name, value in vars(defs).items():
+        if name.startswith('BTP_SERVICE_ID_') and isinstance(value, int):
+            svc_names.setdefault(value, name.replace('BTP_SERVICE_ID_', ''))
+
+    btp_names = {}
+    for svc_id, svc_name in svc_names.items():
+        prefixes = (f'BTP_{svc_name}_CMD_', f'BTP_{svc_name}_EV_')
+        for name, value in vars(defs).items():
+            if name.startswith(prefixes) and isinstance(value, int):
+                btp_names.setdefault((svc_id, value), name)
+
+    return btp_names
+
+
+BTP_NAMES = _get_btp_names()
+
+BTP_ERR_STATUS = {
+    1: 'Fail',
+    2: 'Unknown Command',
+    3: 'Not Ready',
+    4: 'Invalid Index'
+}
+
+
+def describe_btp_hdr(svc_id, opc, ctrl_idx, data_len):
+    """Return name and decoded header of BTP frame for the log"""
+    if opc == 0:
+        btp_command = 'BTP_ERROR'
+    else:
+        btp_command = BTP_NAMES.get((svc_id, opc), 'BTP Undecoded')
+
+    indent = "\n" + (" " * 17)
+
+    return (
+        f'{btp_command} (0x{svc_id:02x}|0x{opc:02x}|0x{ctrl_idx:02x}){indent} '
+        f'raw data ({data_len}):'
+    )
+
+
+def format_btp_frame(timestamp, req, hdr, frame):
+    """Format BTP frame as a line of autopts-iutctl.log
+
+    timestamp - time.time() of sending or receiving the frame
+    req - True for command, False for response or event
+    hdr - (svc_id, opcode, ctrl_index, data_len) tuple
+    frame - raw frame with header"""
+    current_time = datetime.fromtimestamp(timestamp).strftime('%H:%M:%S:%f')[:-3]
+    hex_data = frame.hex(' ')
+    desc = describe_btp_hdr(*hdr)
+
+    if not req and hdr[1] == defs.BTP_STATUS:
+        data = frame[HDR_LEN:]
+        err_status = BTP_ERR_STATUS.get(data[0] if data else None, 'Unknown')
+        return f'{current_time}\t<- Response:  {desc} {hex_data} {err_status}\n'
+
+    hex_data = hex_data[:14] + "|" + hex_data[14 + 1:]
+
+    if len(hex_data) > 47:
+        # This ensures clean text indentation for longer raw data, with 16 bytes per line
+        indent = ' ' * 18
+        hex_data = '\n' + indent + re.sub(r'(.{48})', r'\1\n' + indent, hex_data)
+
+    return f'{current_time}\t{">" if req else "<"} {desc} {hex_data}\n'
+
+
 class BTPSocket:
 
     def __init__(self, log_dir=None):
         self.conn = None
         self.addr = None
-        self.btp_service_id_dict = None
-        self.log_file = open(os.path.join(log_dir, "autopts-iutctl.log"), "a")
-        self.btp_service_id_dict = self.get_svc_id()
+        self.log_sink = None
+        self.trace_sink = None
+        self._open_log_sinks(log_dir)
+
+    def _open_log_sinks(self, log_dir):
+        self.log_sink = LogSink(os.path.join(log_dir, "autopts-iutctl.log"),
+                                lambda record: format_btp_frame(*record))
+        self.trace_sink = None
+        if BTP_TRACE:
+            self.trace_sink = BTPTraceSink(os.path.join(log_dir, "autopts-iutctl.btptrace"))
+
+    def _close_log_sinks(self):
+        for sink in (self.log_sink, self.trace_sink):
+            if sink:
+                sink.close()
+
+        self.log_sink = None
+        self.trace_sink = None
+
+    def set_log_dir(self, log_dir):
+        """Log the next frames to log_dir, e.g. of the next test case"""
+        old_sinks = (self.log_sink, self.trace_sink)
+        self._open_log_sinks(log_dir)
+
+        for sink in old_sinks:
+            if sink:
+                sink.close()
 
     @abstractmethod
     def open(self, address):
@@ -63,47 +157,12 @@ class BTPSocket:
     def accept(self, timeout=10.0):
         pass
 
-    @staticmethod
-    def get_svc_id():
-        """Looks for BTP_SVC_ID variables from the defs.py"""
-        btp_service_ids = {}
-
-        for name, value in vars(defs).items():
-            if name.startswith('BTP_SERVICE_ID_') and isinstance(value, int):
-                trimmed_name = name.replace('BTP_SERVICE_ID_', '')
-                btp_service_ids[trimmed_name] = value
-
-        return btp_service_ids
-
-    def write_to_log(self, req, data, hex_data):
-        """Log decoded header and raw data"""
-        current_time = datetime.now().strftime('%H:%M:%S:%f')
-        f = self.log_file
-        indent = ' ' * 18
-
-        hex_data = hex_data[:14] + "|" + hex_data[14 + 1:]
-
-        if len(hex_data) > 47:
-            # This ensures clean text indentation for longer raw data, with 16 bytes per line
-            hex_data = '\n' + indent + re.sub(r'(.{48})', r'\1\n' + indent, hex_data)
-
-        if req:
-            f.write(f'{current_time[:-3]}\t> {self.parse_data(data)} {hex_data}\n')
-        else:
-            f.write(f'{current_time[:-3]}\t< {self.parse_data(data)} {hex_data}\n')
-
-    def write_err_status(self, data, hex_data, status):
-        """Log command status value for error response"""
-        current_time = datetime.now().strftime('%H:%M:%S:%f')
-        f = self.log_file
-        status_values = {
-            1: 'Fail',
-            2: 'Unknown Command',
-            3: 'Not Ready',
-            4: 'Invalid Index'
-        }
-        err_status = status_values[int(status)]
-        f.write(f'{current_time[:-3]}\t<- Response:  {self.parse_data(data)} {hex_data} {err_status}\n')
+    def log_frame(self, req, hdr, frame):
+        """Queue BTP frame for the log sinks, they do the formatting"""
+        timestamp = time.time()
+        self.log_sink.put((timestamp, req, hdr, frame))
+        if self.trace_sink:
+            self.trace_sink.put((timestamp, req, frame))
 
     def read(self, timeout=20.0):
         """Read BTP data from socket
@@ -124,11 +183,10 @@ class BTPSocket:
             hdr_memview = hdr_memview[nbytes:]
             toread_hdr_len -= nbytes
 
-        hex_hdr = ' '.join(hdr.hex()[i:i + 2] for i in range(0, len(hdr.hex()), 2))
         tuple_hdr = dec_hdr(hdr)
         toread_data_len = tuple_hdr.data_len
 
-        logging.debug("Received: hdr: %s %r", repr_hdr(tuple_hdr), hdr)
+        logging.debug("Received: hdr: %r %r", tuple_hdr, hdr)
 
         data = bytearray(toread_data_len)
         data_memview = memoryview(data)
@@ -142,16 +200,8 @@ class BTPSocket:
             data_memview = data_memview[nbytes:]
             toread_data_len -= nbytes
 
-        data_string = binascii.hexlify(data).decode('utf-8')
-        data_string = ' '.join(f'{data_string[i:i + 2]}' for i in range(0, len(data_string), 2))
-        raw_data = hex_hdr if data_string == '' else hex_hdr + ' ' + data_string
-
-        if tuple_hdr.op == 0:
-            self.write_err_status(tuple_hdr, raw_data, data_string)
-        else:
-            # 0 for logging response, 1 for command
-            self.write_to_log(0, tuple_hdr, raw_data)
-        log(f"Received data: { {data_string} }, {data}")
+        self.log_frame(False, tuple_hdr, bytes(hdr + data))
+        log("Received data: %r", data)
 
         self.conn.settimeout(None)
         return tuple_hdr, dec_data(data)
@@ -159,59 +209,21 @@ class BTPSocket:
     def send(self, svc_id, op, ctrl_index, data):
         """Send BTP formated data over socket"""
         logging.debug("%s, %r %r %r %r",
-                      self.send.__name__, svc_id, op, ctrl_index, str(data))
+                      self.send.__name__, svc_id, op, ctrl_index, data)
 
         frame = enc_frame(svc_id, op, ctrl_index, data)
 
-        logging.debug("sending frame %r", frame.hex())
-
-        hex_data = ' '.join(frame.hex()[i:i + 2] for i in range(0, len(frame.hex()), 2))
-        tuple_data = (svc_id, op, ctrl_index, len(data) if isinstance(data, (str, bytearray)) else data)
-        # 0 for logging response, 1 for command
-        self.write_to_log(1, tuple_data, hex_data)
-        self.conn.send(frame)
-
-    def parse_data(self, data):
-        def get_btp_cmd_name(prefix, op_code):
-            """Looks for BTP Command variables from the defs.py"""
-            if op_code in ('0x0', '0x00'):
-                return 'BTP_ERROR'
-            for key, value in vars(defs).items():
-                if (key.startswith(f'BTP_{prefix}_CMD_') and value == int(op_code, 16)) or\
-                        (key.startswith(f'BTP_{prefix}_EV_') and value == int(op_code, 16)):
-                    return key
-
-            return 'BTP Undecoded'  # Return if no matching variable is found
-
-        parsed_data = ''
-        svc_name = ''
-        if isinstance(data, str):
-            svc_id = data[:2]
-            opc = data[2:4]
-        else:
-            svc_id, opc, ctrl_idx, data_len = data[0], data[1], data[2], data[3]
-        for name, btp_id in self.btp_service_id_dict.items():
-            if btp_id == int(svc_id):
-                svc_name += name
-                break
-
-        indent = "\n" + (" " * 17)
+        logging.debug("sending frame %r", frame)
 
-        def to_hex(x):
-            return f"0x{int(x):02x}"
-        btp_command = get_btp_cmd_name(svc_name, to_hex(opc))
-        parsed_data += (
-            f'{btp_command} ({to_hex(svc_id)}|{to_hex(opc)}|{to_hex(ctrl_idx)}){indent} '
-            f'raw data ({data_len}):'
-        )
+        self.log_frame(True, (svc_id, op, ctrl_index, len(frame) - HDR_LEN), frame)
+        self._write(frame)
 
-        return parsed_data
+    def _write(self, frame):
+        self.conn.send(frame)
 
     @abstractmethod
     def close(self):
-        self.log_file.close()
-        self.log_file = None
-        pass
+        self._close_log_sinks()
 
 
 class BTPSocketSrv(BTPSocket):
@@ -268,6 +280,7 @@ class BTPSocketCli(BTPSocket):
         self.conn.connect(self.addr)
 
     def close(self):
+        super().close()
         try:
             if self.conn:
                 self.conn.shutdown(socket.SHUT_RDWR)
@@ -279,12 +292,111 @@ class BTPSocketCli(BTPSocket):
             self.addr = None
 
 
+class BTPSerialTransport(BTPSocket):
+    """BTPSocket reading and writing BTP frames directly on a serial port
+
+    The serial port may be passed on to the transport of the next test
+    case instead of being closed, which then only drops stale input.
+    """
+
+    # Longest time a single read of the serial port blocks
+    READ_SLICE = 0.1
+
+    def __init__(self, log_dir=None, port=None, keep_open=False):
+        """port - serial.Serial kept open by a previous transport
+        keep_open - leave the serial port open at close"""
+        super().__init__(log_dir)
+        self.conn = port
+        self.keep_open = keep_open
+        self._rx_buf = bytearray()
+
+    def open(self, address, baudrate=115200):
+        """Open the serial port, unless it is open already
+
+        address - serial port device, e.g. /dev/ttyACM0 or COM3"""
+        self.addr = address
+
+        if self.conn is None or not self.conn.is_open:
+            self.conn = serial.Serial(port=address, baudrate=baudrate,
+                                      timeout=self.READ_SLICE)
+
+        self.reset()
+
+    def reset(self):
+        """Drop data received so far, e.g. a partial IUT ready event"""
+        self.conn.reset_input_buffer()
+        self._rx_buf.clear()
+
+    def accept(self, timeout=10.0):
+        pass
+
+    def _frame_len(self):
+        if len(self._rx_buf) < HDR_LEN:
+            return None
+
+        return HDR_LEN + dec_hdr(self._rx_buf[:HDR_LEN]).data_len
+
+    def read(self, timeout=20.0):
+        """Read BTP frame from serial port
+
+        timeout - read timeout in seconds"""
+        deadline = time.monotonic() + timeout
+
+        if not self.conn or not self.conn.is_open:
+            # Do not let the reader spin until it is stopped
+            time.sleep(min(timeout, self.READ_SLICE))
+            raise OSError('Serial port is closed')
+
+        try:
+            while True:
+                frame_len = self._frame_len()
+                if frame_len is not None and len(self._rx_buf) >= frame_len:
+                    break
+
+                if time.monotonic() >= deadline:
+                    raise socket.timeout
+
+                # Take all buffered bytes at once, or wait for the next one
+                self._rx_buf += self.conn.read(self.conn.in_waiting or 1)
+        except serial.SerialException as e:
+            # The device is gone, e.g. re-enumerated at reset. Close the
+            # port, so that the next transport opens it again.
+            self.conn.close()
+            raise OSError(e) from e
+
+        frame = bytes(self._rx_buf[:frame_len])
+        del self._rx_buf[:frame_len]
+
+        tuple_hdr = dec_hdr(frame[:HDR_LEN])
+        logging.debug("Received: hdr: %r", tuple_hdr)
+
+        self.log_frame(False, tuple_hdr, frame)
+        log("Received data: %r", frame[HDR_LEN:])
+
+        return tuple_hdr, dec_data(frame[HDR_LEN:])
+
+    def _write(self, frame):
+        self.conn.write(frame)
+
+    def close(self):
+        super().close()
+
+        if self.conn and not self.keep_open:
+            self.conn.close()
+            self.conn = None
+
+
 class BTPWorker:
+    # Granularity of blocking waits, so that a global end of the run
+    # is noticed without polling the RX queue.
+    _WAIT_SLICE = 0.5
+
     def __init__(self, sock):
         super().__init__()
 
         self._socket = sock
-        self._rx_queue = queue.Queue()
+        self._rx_queue = collections.deque()
+        self._rx_cond = threading.Condition()
         self._running = threading.Event()
         self._lock = threading.Lock()
 
@@ -292,6 +404,11 @@ class BTPWorker:
         self._rx_worker.name = f'BTPWorker{self._rx_worker.name}'
 
         self.event_handler_cb = None
+        # Commands sent per (service ID, opcode) and events received per
+        # service ID, to tell if the IUT state may have changed
+        self.tx_count = 0
+        self.tx_counts = collections.Counter()
+        self.ev_counts = collections.Counter()
 
     def _rx_task(self):
         log(f'{threading.current_thread().name} started')
@@ -302,12 +419,15 @@ class BTPWorker:
 
                 hdr = data[0]
                 if hdr.op >= 0x80:
+                    self.ev_counts[hdr.svc_id] += 1
                     # Do not put handled events on RX queue
                     ret = EVENT_HANDLER(*data)
                     if ret is True:
                         continue
 
-                self._rx_queue.put(data)
+                with self._rx_cond:
+                    self._rx_queue.append(data)
+                    self._rx_cond.notify_all()
                 socket_ok = True
             except socket.timeout:
                 # this one is expected so ignore
@@ -321,72 +441,119 @@ class BTPWorker:
 
         log(f'{threading.current_thread().name} finishing...')
 
-    @staticmethod
-    def _read_timeout(flag):
-        flag.clear()
+    def _wait_rx(self, match, timeout):
+        """Block until a received frame satisfies match and take it
+        out of the RX queue. Frames that do not match are left queued,
+        in order, for later readers.
 
-    def read(self, timeout=20.0):
-        logging.debug("%s", self.read.__name__)
+        match - callable taking the frame header, or None for any frame
+        timeout - wait timeout in seconds"""
+        deadline = time.monotonic() + timeout
 
-        flag = threading.Event()
-        flag.set()
+        with self._rx_cond:
+            while True:
+                raise_on_global_end()
 
-        t = threading.Timer(timeout, self._read_timeout, [flag])
-        t.start()
+                for data in self._rx_queue:
+                    if match is None or match(data[0]):
+                        self._rx_queue.remove(data)
+                        return data
 
-        while flag.is_set():
-            raise_on_global_end()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout
 
-            if self._rx_queue.empty():
-                continue
+                self._rx_cond.wait(min(remaining, self._WAIT_SLICE))
 
-            t.cancel()
+    def read(self, timeout=20.0):
+        logging.debug("%s", self.read.__name__)
+
+        return self._wait_rx(None, timeout)
 
-            data = self._rx_queue.get()
-            self._rx_queue.task_done()
+    def read_rsp(self, svc_id, op, timeout=20.0):
+        """Read the response to a (svc_id, op) command. A BTP_STATUS
+        frame of the same service is treated as the response too."""
+        logging.debug("%s", self.read_rsp.__name__)
 
-            return data
+        def match(hdr):
+            return hdr.svc_id == svc_id and hdr.op in (op, defs.BTP_STATUS)
 
-        raise socket.timeout
+        return self._wait_rx(match, timeout)
 
     def send(self, svc_id, op, ctrl_index, data):
         self._lock.acquire()
         try:
+            self.tx_count += 1
+            self.tx_counts[svc_id, op] += 1
             self._socket.send(svc_id, op, ctrl_index, data)
         finally:
             self._lock.release()
 
-    def send_wait_rsp(self, svc_id, op, ctrl_index, data):
+    def send_wait_rsp(self, svc_id, op, ctrl_index, data, timeout=20.0):
         self._lock.acquire()
         try:
+            self.tx_count += 1
+            self.tx_counts[svc_id, op] += 1
             self._socket.send(svc_id, op, ctrl_index, data)
-            tuple_hdr, tuple_data = self.read()
-
-            if tuple_hdr.svc_id != svc_id:
-                raise BTPError(
-                    f"Incorrect service ID {tuple_hdr.svc_id} in the response, expected {svc_id}!"
-                )
+            tuple_hdr, tuple_data = self.read_rsp(svc_id, op, timeout)
 
             if tuple_hdr.op == defs.BTP_STATUS:
                 raise BTPError("Error opcode in response!")
 
-            if op != tuple_hdr.op:
-                raise BTPError(
-                    f"Invalid opcode 0x{tuple_hdr.op:02x} in the response, expected 0x{op:02x}!"
-                )
-
             return tuple_data
         finally:
             self._lock.release()
 
-    def _reset_rx_queue(self):
-        while not self._rx_queue.empty():
-            try:
-                self._rx_queue.get_nowait()
-            except queue.Empty:
-                continue
-
-            self._rx_queue.task_done()
+    def send_wait_rsp_pipelined(self, svc_id, op, ctrl_index, data_iter,
+                                window=1, on_rsp=None, timeout=20.0):
+        """Send a command with each data from data_iter, with up to window
+        commands waiting for the response. Stops sending after the first
+        error response. on_rsp is called with True or False on each
+        response, in order.
+
+        Returns the index of the first failed command, i.e. the number
+        of commands that succeeded in order. Commands already in flight
+        behind a failed one are not counted, even if they succeeded."""
+        succeeded = 0
+        in_flight = 0
+        failed = False
+
+        def read_status():
+            tuple_hdr, _ = self.read_rsp(svc_id, op, timeout)
+            ok = tuple_hdr.op != defs.BTP_STATUS
+            if on_rsp:
+                on_rsp(ok)
+            return ok
+
+        with self._lock:
+            for data in data_iter:
+                self.tx_count += 1
+                self.tx_counts[svc_id, op] += 1
+                self._socket.send(svc_id, op, ctrl_index, data)
+                in_flight += 1
+
+                if in_flight < window:
+                    continue
+
+                in_flight -= 1
+                if not read_status():
+                    failed = True
+                    break
+
+                succeeded += 1
+
+            # Responses of the commands already sent
+            for _ in range(in_flight):
+                if not read_status():
+                    failed = True
+                elif not failed:
+                    succeeded += 1
+
+        return succeeded
+
+    def reset_rx_queue(self):
+        with self._rx_cond:
+            self._rx_queue.clear()
 
     def accept(self, timeout=10.0):
         logging.debug("%s", self.accept.__name__)
@@ -406,7 +573,7 @@ class BTPWorker:
                 log('Waiting for _rx_worker to finish ...')
                 self._rx_worker.join(timeout=1)
 
-        self._reset_rx_queue()
+        self.reset_rx_queue()
 
         self._socket.close()
 
@@ -420,7 +587,8 @@ class LoggerWorker:
         self._running = threading.Event()
         self._rx_worker = threading.Thread(target=self._rx_task)
         self._rx_worker.name = f'LoggerWorker{self._rx_worker.name}'
-        self._log_file = open(os.path.join(log_dir, "autopts-iutctl_net.log"), "a")
+        self._log_sink = LogSink(os.path.join(log_dir, "autopts-iutctl_net.log"),
+                                 lambda data: data.decode('utf-8', errors='replace'))
         self._ser = serial.Serial(port=com, baudrate=baud, timeout=1)
 
     def _rx_task(self):
@@ -429,9 +597,10 @@ class LoggerWorker:
             try:
                 data = self._ser.read(99999)
             except serial.SerialException:
-                pass
-            text = data.decode('utf-8', errors='replace')
-            self._log_file.write(text)
+                continue
+
+            if data:
+                self._log_sink.put(data)
 
         log(f'{threading.current_thread().name} finishing...')
 
@@ -450,3 +619,4 @@ class LoggerWorker:
                 self._rx_worker.join(timeout=1)
 
         self._ser.close()
+        self._log_sink.close()
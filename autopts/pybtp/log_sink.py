@@ -0,0 +1,185 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2025, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Log sinks that take file I/O of the iutctl logs off the BTP threads
+
+Producers only put records on a queue. A writer thread per sink formats
+them, writes them in batches and flushes at most every flush_interval
+seconds, rotating the file once it grows beyond max_size bytes.
+
+BTPTraceSink writes BTP frames in a compact binary format modelled on
+btsnoop, which tools/btp_trace.py decodes back to the text log.
+
+BTP trace file format (all integers big-endian):
+    header:  b'btptrace' identification, version (4 octets)
+    records: frame length (4 octets), flags (4 octets),
+             timestamp in microseconds since the epoch (8 octets),
+             BTP frame with header
+    flags:   bit 0 set for frames sent to the IUT
+"""
+
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+
+LOG_MAX_SIZE = int(os.getenv("AUTOPTS_IUTCTL_LOG_MAX_SIZE", "0"))
+LOG_BACKUP_COUNT = int(os.getenv("AUTOPTS_IUTCTL_LOG_BACKUP_COUNT", "5"))
+BTP_TRACE = os.getenv("AUTOPTS_BTP_TRACE", "0") == "1"
+
+BTP_TRACE_MAGIC = b'btptrace'
+BTP_TRACE_VERSION = 1
+BTP_TRACE_FLAG_SENT = 0x01
+
+_trace_hdr = struct.Struct('>8sI')
+_trace_rec = struct.Struct('>IIQ')
+
+
+class LogSink(threading.Thread):
+    """Queue-fed log file writer
+
+    path - log file, opened in append mode
+    formatter - callable making a str (or bytes in binary mode) of a record
+    max_size - rotate the file when it exceeds that size, 0 disables rotation
+    backup_count - number of rotated files kept as path.1 ... path.N
+    flush_interval - longest time in seconds written data stays buffered
+    """
+
+    binary = False
+    # Records written at most with a single write() call
+    batch_size = 256
+
+    def __init__(self, path, formatter=None, max_size=LOG_MAX_SIZE,
+                 backup_count=LOG_BACKUP_COUNT, flush_interval=1.0):
+        super().__init__(daemon=True)
+        self.name = f'LogSink{self.name}'
+        self.path = path
+        self.formatter = formatter
+        self.max_size = max_size
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._file = self._open()
+        self.start()
+
+    def _open(self):
+        return open(self.path, 'ab' if self.binary else 'a')
+
+    def put(self, record):
+        self._queue.put(record)
+
+    def _rotate(self):
+        self._file.close()
+
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f'{self.path}.{i}'
+            if os.path.exists(src):
+                os.replace(src, f'{self.path}.{i + 1}')
+
+        if self.backup_count:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+        self._file = self._open()
+
+    def _write(self, records):
+        if self.formatter:
+            records = [self.formatter(record) for record in records]
+
+        self._file.write((b'' if self.binary else '').join(records))
+
+        if self.max_size and self._file.tell() > self.max_size:
+            self._rotate()
+
+    def run(self):
+        running = True
+        last_flush = time.monotonic()
+
+        while running:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                records = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                records = []
+
+            # This is the only consumer, so the queue cannot drain meanwhile
+            while len(records) < self.batch_size and not self._queue.empty():
+                records.append(self._queue.get_nowait())
+
+            if None in records:
+                running = False
+                records = records[:records.index(None)]
+
+            try:
+                if records:
+                    self._write(records)
+
+                if not running or time.monotonic() - last_flush >= self.flush_interval:
+                    self._file.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                logging.error("%r", e)
+
+        self._file.close()
+
+    def close(self):
+        self._queue.put(None)
+        self.join()
+
+
+class BTPTraceSink(LogSink):
+    """LogSink writing BTP frames in the binary BTP trace format"""
+
+    binary = True
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, self._format_record, **kwargs)
+
+    def _open(self):
+        f = super()._open()
+        if f.tell() == 0:
+            f.write(_trace_hdr.pack(BTP_TRACE_MAGIC, BTP_TRACE_VERSION))
+
+        return f
+
+    @staticmethod
+    def _format_record(record):
+        timestamp, sent, frame = record
+        flags = BTP_TRACE_FLAG_SENT if sent else 0
+
+        return _trace_rec.pack(len(frame), flags, int(timestamp * 1e6)) + frame
+
+
+def read_btp_trace(path):
+    """Yield (timestamp, sent, frame) for every frame of a BTP trace file"""
+    with open(path, 'rb') as f:
+        magic, version = _trace_hdr.unpack(f.read(_trace_hdr.size))
+        if magic != BTP_TRACE_MAGIC or version != BTP_TRACE_VERSION:
+            raise ValueError(f'{path} is not a BTP trace file')
+
+        while True:
+            rec = f.read(_trace_rec.size)
+            if len(rec) < _trace_rec.size:
+                return
+
+            length, flags, timestamp = _trace_rec.unpack(rec)
+            frame = f.read(length)
+            if len(frame) < length:
+                return
+
+            yield timestamp / 1e6, bool(flags & BTP_TRACE_FLAG_SENT), frame
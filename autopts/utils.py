@@ -16,9 +16,11 @@
 
 """Utilities"""
 import ctypes
+import json
 import logging
 import os
 import sys
+import tempfile
 import threading
 import traceback
 import xmlrpc.client
@@ -52,6 +54,24 @@ def get_global_end():
     return GLOBAL_END
 
 
+def write_json_file(path, data, **kwargs):
+    """Replace the file with the JSON of data at once, also while other
+    processes, e.g. test shards, write the same file"""
+    dir_name = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dir_name, exist_ok=True)
+
+    # Every writer needs its own temporary file
+    with tempfile.NamedTemporaryFile('w', dir=dir_name, prefix=f'{os.path.basename(path)}.',
+                                     suffix='.tmp', delete=False) as f:
+        json.dump(data, f, **kwargs)
+
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+
+
 def log_running_threads():
     active_threads = threading.enumerate()
     logging.debug("Active threads:")
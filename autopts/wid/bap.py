@@ -16,9 +16,8 @@ import logging
 import re
 import struct
 from argparse import Namespace
-from time import sleep
 
-from autopts.ptsprojects.stack import WildCard, get_stack
+from autopts.ptsprojects.stack import WildCard, get_stack, wait_until
 from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp, defs
 from autopts.pybtp.btp import ascs_add_ase_to_cis, lt2_addr_get, lt2_addr_type_get, pts_addr_get, pts_addr_type_get
@@ -32,13 +31,12 @@ from autopts.pybtp.types import (
     AdType,
     ASCSState,
     AudioDir,
-    BTPError,
     PaSyncState,
     WIDParams,
     create_lc3_ltvs_bytes,
     gap_settings_btp2txt,
 )
-from autopts.wid.common import _safe_bap_send
+from autopts.wid.common import _start_bap_stream
 
 log = logging.debug
 
@@ -349,8 +347,7 @@ def hdl_wid_114(params: WIDParams):
 
     data = bytearray([j for j in range(0, 41)])
 
-    for _ in range(1, 100):
-        _safe_bap_send(0, data)
+    _start_bap_stream(0, data, sdu_interval=qos_config[0])
 
     stack.bap.hdl_wid_114_cnt += 1
 
@@ -471,7 +468,9 @@ def hdl_wid_300(_: WIDParams):
     """
 
     btp.gap_start_discov(discov_type='passive', mode='observe')
-    sleep(5)
+    wait_until(5, lambda: btp.check_discov_results(uuids=[UUID.ASCS]) and
+               btp.check_discov_results(uuids=[UUID.AVAILABLE_AUDIO_CTXS]),
+               'Receiving ASCS advertising data')
     btp.gap_stop_discov()
 
     found = btp.check_discov_results(uuids=[UUID.ASCS])
@@ -1430,14 +1429,10 @@ def hdl_wid_311(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for _i in range(1, 10):
-        for config in stack.bap.ase_configs:
-            if config.audio_dir == AudioDir.SINK:
-                try:
-                    btp.bap_send(config.ase_id, stream_data[config.ase_id])
-                except BTPError:
-                    # Buffer full
-                    pass
+    for config in stack.bap.ase_configs:
+        if config.audio_dir == AudioDir.SINK:
+            _start_bap_stream(config.ase_id, stream_data[config.ase_id],
+                              addr_type=config.addr_type, addr=config.addr)
 
     return True
 
@@ -1970,16 +1965,15 @@ def hdl_wid_377(_: WIDParams):
 
     sources = []
     for ev in stack.ascs.event_queues[defs.BTP_ASCS_EV_ASE_STATE_CHANGED]:
-        _, _, ase_id, state = ev
+        addr_type, addr, ase_id, state = ev
 
         if state == ASCSState.STREAMING:
-            sources.append(ase_id)
+            sources.append((addr_type, addr, ase_id))
 
     data = bytearray([j for j in range(0, 41)])
 
-    for _ in range(1, 10):
-        for ase_id in sources:
-            _safe_bap_send(ase_id, data)
+    for addr_type, addr, ase_id in sources:
+        _start_bap_stream(ase_id, data, addr_type=addr_type, addr=addr)
 
     return True
 
@@ -2082,16 +2076,15 @@ def hdl_wid_387(_: WIDParams):
 
     sources = []
     for ev in stack.ascs.event_queues[defs.BTP_ASCS_EV_ASE_STATE_CHANGED]:
-        _, _, ase_id, state = ev
+        addr_type, addr, ase_id, state = ev
 
         if state == ASCSState.STREAMING:
-            sources.append(ase_id)
+            sources.append((addr_type, addr, ase_id))
 
     data = bytearray([j for j in range(0, 41)])
 
-    for _ in range(1, 10):
-        for ase_id in sources:
-            _safe_bap_send(ase_id, data)
+    for addr_type, addr, ase_id in sources:
+        _start_bap_stream(ase_id, data, addr_type=addr_type, addr=addr)
 
     return True
 
@@ -35,7 +35,7 @@ from autopts.wid.bap import (
     create_lc3_ltvs_bytes,
     get_audio_locations_from_pac,
 )
-from autopts.wid.common import _safe_bap_send
+from autopts.wid.common import _start_bap_stream
 
 log = logging.debug
 
@@ -184,8 +184,7 @@ def hdl_wid_114(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for _ in range(1, 10):
-        _safe_bap_send(0, data)
+    _start_bap_stream(0, data, sdu_interval=qos_config[0])
 
     return True
 
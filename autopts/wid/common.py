@@ -1,19 +1,37 @@
+import itertools
 import logging
 import socket
+from functools import partial
 
+from autopts.ptsprojects.stack import get_stack
 from autopts.pybtp import btp
 from autopts.pybtp.types import (
     BTPError,
 )
 
+# SDU interval of the streams with no QoS config known, in microseconds
+ISO_SDU_INTERVAL_US = 10000
 
-def _safe_bap_send(ase_id: int, data: bytearray):
-    """Safely send BAP/ISO data, ignoring buffer full errors."""
-    try:
-        btp.bap_send(ase_id, data)
-    except BTPError:
-        # Buffer full — ignore silently or optionally log
-        pass
+
+def _start_bap_stream(ase_id: int, data: bytearray, sdu_interval=None,
+                      addr_type=None, addr=None):
+    """Stream the data to the ASE of the peer, the PTS by default, or the
+    broadcast source for ase_id 0, one SDU per SDU interval in the
+    background. The stream runs until the ASE leaves the streaming state,
+    the source is stopped or the test case ends."""
+    stack = get_stack()
+    addr_type = btp.pts_addr_type_get(addr_type)
+    addr = btp.pts_addr_get(addr)
+
+    if sdu_interval is None:
+        sdu_interval = next((config.sdu_interval for config in stack.bap.ase_configs
+                             if (config.addr_type, config.addr, config.ase_id) == (addr_type, addr, ase_id) and
+                             getattr(config, 'sdu_interval', None)),
+                            ISO_SDU_INTERVAL_US)
+
+    return stack.bap.start_stream((addr_type, addr, ase_id),
+                                  partial(btp.bap_send, ase_id, bd_addr_type=addr_type, bd_addr=addr),
+                                  data, sdu_interval)
 
 
 def _safe_l2cap_disconnect(channel_id):
@@ -24,8 +42,8 @@ def _safe_l2cap_disconnect(channel_id):
 
 
 def _l2cap_send_forever(channel_id):
+    """Send 1 byte SDUs until the IUT rejects one, e.g. with no credits left"""
     try:
-        while True:
-            btp.l2cap_send_data(channel_id, '00')
-    except (BTPError, socket.timeout):
+        btp.l2cap_send_sdus(channel_id, itertools.repeat(b'\x00'))
+    except socket.timeout:
         pass
@@ -18,9 +18,8 @@ import copy
 import logging
 import re
 import struct
-from time import sleep
 
-from autopts.ptsprojects.stack import ConnParams, get_stack
+from autopts.ptsprojects.stack import ConnParams, clock_sleep, get_stack, wait_until
 from autopts.pybtp import btp, defs, types
 from autopts.pybtp.types import UUID, AdType, IOCap, OwnAddrType, Perm, Prop, WIDParams, bdaddr_reverse
 from autopts.wid import generic_wid_hdl
@@ -33,9 +32,18 @@ def gap_wid_hdl(wid, description, test_case_name):
     return generic_wid_hdl(wid, description, test_case_name, [__name__])
 
 
+def _pts_discovered_over_br_and_le():
+    return btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE) and \
+        btp.check_discov_results()
+
+
+def _encrypted():
+    return any(conn.sec_level > 1 for conn in list(get_stack().gap.connections.values()))
+
+
 # wid handlers section begin
 def hdl_wid_4(_: WIDParams):
-    sleep(10)  # Give some time to discover devices
+    wait_until(10, btp.check_discov_results, 'Discovering PTS')
     btp.gap_stop_discov()
     return btp.check_discov_results()
 
@@ -392,9 +400,7 @@ def hdl_wid_76(_: WIDParams):
 def hdl_wid_77(params: WIDParams):
     if params.test_case_name.startswith("GAP/BOND/BON/BV-04-C"):
         # PTS sends WID before IUT finishes encryption
-        # This is a temporary workaround. Ultimately
-        # we should wait for an event here or submit a PTS Issue.
-        sleep(10)
+        wait_until(10, _encrypted, 'Encrypting the connection')
     try:
         if params.test_case_name in ['GAP/DM/LEP/BV-09-C']:
             get_stack().gap.wait_for_connection(timeout=5, conn_count=2)
@@ -696,7 +702,7 @@ def hdl_wid_137(params: WIDParams):
 
 def hdl_wid_138(_: WIDParams):
     btp.gap_start_discov(transport='le', discov_type='active', mode='observe')
-    sleep(10)  # Give some time to discover devices
+    wait_until(10, btp.check_discov_results, 'Discovering PTS')
     btp.gap_stop_discov()
     return btp.check_discov_results()
 
@@ -941,9 +947,9 @@ def hdl_wid_156(_: WIDParams):
 
 def hdl_wid_157(params: WIDParams):
     btp.gap_start_discov(transport='le', discov_type='active', mode='observe')
-    sleep(10)  # Give some time to discover devices
-    btp.gap_stop_discov()
     report, response = re.findall(r'[a-fA-F0-9]{62}', params.description)
+    wait_until(10, btp.check_scan_rep_and_rsp, 'Receiving PTS scan response', report, response)
+    btp.gap_stop_discov()
     return btp.check_scan_rep_and_rsp(report, response)
 
 
@@ -1075,7 +1081,7 @@ def hdl_wid_179(_: WIDParams):
 
 def hdl_wid_204(_: WIDParams):
     btp.gap_start_discov(discov_type='passive', mode='observe')
-    sleep(10)
+    wait_until(10, btp.check_discov_results, 'Discovering PTS')
     btp.gap_stop_discov()
     return btp.check_discov_results()
 
@@ -1236,12 +1242,7 @@ def hdl_wid_236(_: WIDParams):
     if stack.is_svc_supported('GATT_CL'):
         return not stack.gatt_cl.wait_for_notifications(expected_count=1)
 
-    gatt.wait_notification_ev(timeout=5)
-
-    if gatt.notification_events:
-        return False
-
-    return True
+    return gatt.wait_notification_ev(5) is None
 
 
 def hdl_wid_237(_: WIDParams):
@@ -1253,12 +1254,7 @@ def hdl_wid_237(_: WIDParams):
 
     gatt = stack.gatt
 
-    gatt.wait_notification_ev(timeout=5)
-
-    if gatt.notification_events:
-        return True
-
-    return False
+    return gatt.wait_notification_ev(5) is not None
 
 
 def hdl_wid_238(_: WIDParams):
@@ -1269,12 +1265,7 @@ def hdl_wid_238(_: WIDParams):
     if stack.is_svc_supported('GATT_CL'):
         return not stack.gatt_cl.wait_for_notifications(expected_count=0)
 
-    gatt.wait_notification_ev(timeout=5)
-
-    if gatt.notification_events:
-        return False
-
-    return True
+    return gatt.wait_notification_ev(5) is None
 
 
 def hdl_wid_239(_: WIDParams):
@@ -1285,12 +1276,7 @@ def hdl_wid_239(_: WIDParams):
     if stack.is_svc_supported('GATT_CL'):
         return stack.gatt_cl.wait_for_notifications(expected_count=1)
 
-    gatt.wait_notification_ev(timeout=5)
-
-    if gatt.notification_events:
-        return True
-
-    return False
+    return gatt.wait_notification_ev(5) is not None
 
 
 def hdl_wid_240(_: WIDParams):
@@ -1829,7 +1815,8 @@ def hdl_wid_146(_: WIDParams):
     initiate a create connection otherwise click 'No'.
     """
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    wait_until(10, btp.check_discov_results, 'Discovering PTS over BR/EDR',
+               addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discov()
     return btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE)
 
@@ -1839,7 +1826,8 @@ def hdl_wid_147(_: WIDParams):
     Please start limited inquiry. Click 'Yes' If IUT does discovers PTS otherwise click 'No'.
     """
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='limited')
-    sleep(10)
+    wait_until(10, btp.check_discov_results, 'Discovering PTS over BR/EDR',
+               addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discov()
     return btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE)
 
@@ -1856,10 +1844,6 @@ def hdl_wid_165(params: WIDParams):
     """
     Please confirm that IUT has discovered PTS and retrieved its name 'PTS-GAP-E449'.
     """
-    btp.gap_start_discov(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
-    btp.gap_stop_discov()
-
     pattern = re.compile(r"'(.*)'")
     macthed = pattern.findall(params.description)
     if not macthed:
@@ -1869,6 +1853,10 @@ def hdl_wid_165(params: WIDParams):
     name = macthed[0]
     name = binascii.hexlify(name.encode()).decode()
 
+    btp.gap_start_discov(transport='bredr', discov_type='passive', mode='general')
+    wait_until(10, btp.check_scan_rep_and_rsp, 'Retrieving PTS name', name, name)
+    btp.gap_stop_discov()
+
     return btp.check_scan_rep_and_rsp(name, name)
 
 
@@ -1884,7 +1872,8 @@ def hdl_wid_102(params: WIDParams):
         return True
 
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    wait_until(10, btp.check_discov_results, 'Discovering PTS over BR/EDR',
+               addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discov()
 
     if not btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
@@ -2047,7 +2036,7 @@ def hdl_wid_36(_: WIDParams):
     """
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='general')
     btp.gap_start_discov(transport='le', discov_type='passive', mode='general')
-    sleep(10)
+    wait_until(10, _pts_discovered_over_br_and_le, 'Discovering PTS over BR/EDR and LE')
     btp.gap_stop_discov()
 
     if not btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
@@ -2067,7 +2056,7 @@ def hdl_wid_7(_: WIDParams):
     """
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='limited')
     btp.gap_start_discov(transport='le', discov_type='passive', mode='limited')
-    sleep(10)
+    wait_until(10, _pts_discovered_over_br_and_le, 'Discovering PTS over BR/EDR and LE')
     btp.gap_stop_discov()
 
     if not btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
@@ -2087,7 +2076,8 @@ def hdl_wid_123(_: WIDParams):
     """
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='limited')
     btp.gap_start_discov(transport='le', discov_type='passive', mode='limited')
-    sleep(10)
+    # Any discovery of PTS fails the test, so there is nothing to wait for
+    clock_sleep(10, 'Discovering PTS over BR/EDR and LE')
     btp.gap_stop_discov()
 
     if btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
@@ -2105,7 +2095,8 @@ def hdl_wid_86(_: WIDParams):
     Please start device name discovery over BR/EDR . If IUT discovers PTS, press OK to continue.
     """
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    wait_until(10, btp.check_discov_results, 'Discovering PTS over BR/EDR',
+               addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discov()
 
     if not btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
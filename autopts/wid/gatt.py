@@ -17,7 +17,6 @@ import re
 import socket
 import struct
 from binascii import hexlify
-from time import sleep
 
 from autopts.ptsprojects.stack import (
     GattCharacteristic,
@@ -27,6 +26,7 @@ from autopts.ptsprojects.stack import (
     GattSecondary,
     GattService,
     GattServiceIncluded,
+    clock_sleep,
     get_stack,
 )
 from autopts.ptsprojects.testcase import MMI
@@ -1047,7 +1047,7 @@ def hdl_wid_90(_: WIDParams):
     stack = get_stack()
     gatt = stack.gatt
 
-    gatt.wait_notification_ev(timeout=5)
+    gatt.wait_notification_ev(5, remove=False)
 
     if len(gatt.notification_events) == 0:
         return False
@@ -1092,7 +1092,7 @@ def hdl_wid_92(params: WIDParams):
         return False
 
     # delay, to let the PTS subscribe for notifications
-    sleep(2)
+    clock_sleep(2, 'PTS subscribing for notifications')
 
     if value_len == 0:
         value = b'\x01'
@@ -1127,7 +1127,7 @@ def hdl_wid_95(_: WIDParams):
     stack = get_stack()
     gatt = stack.gatt
 
-    gatt.wait_notification_ev(timeout=5)
+    gatt.wait_notification_ev(5, remove=False)
 
     if len(gatt.notification_events) == 0:
         return False
@@ -1142,7 +1142,7 @@ def hdl_wid_96(_: WIDParams):
 
 
 def hdl_wid_97(_: WIDParams):
-    sleep(30)
+    clock_sleep(30, 'Waiting as requested by PTS')
     return True
 
 
@@ -1164,7 +1164,7 @@ def hdl_wid_98(params: WIDParams):
         return False
 
     # delay, to let the PTS subscribe for notifications
-    sleep(2)
+    clock_sleep(2, 'PTS subscribing for notifications')
 
     btp.gatts_set_val(handle, hexlify(value))
 
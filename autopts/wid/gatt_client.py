@@ -16,9 +16,8 @@
 
 import logging
 import re
-from time import sleep
 
-from autopts.ptsprojects.stack import get_stack
+from autopts.ptsprojects.stack import clock_sleep, get_stack
 from autopts.ptsprojects.testcase import MMI
 from autopts.pybtp import btp
 from autopts.pybtp.types import GATTErrorCodes, IOCap, WIDParams
@@ -389,7 +388,7 @@ def hdl_wid_30(params: WIDParams):
     MMI.parse_description(params.description)
 
     stack = get_stack()
-    sleep(1)
+    clock_sleep(1, 'Discovering characteristics')
     stack.gatt_cl.wait_for_chrcs()
 
     if int(MMI.args[0], 16) == stack.gatt_cl.chrcs[0][0] and \
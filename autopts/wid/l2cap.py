@@ -15,9 +15,8 @@
 import binascii
 import logging
 import re
-import time
 
-from autopts.ptsprojects.stack import get_stack
+from autopts.ptsprojects.stack import clock_sleep, get_stack, wait_until
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import BTPError, WIDParams
 from autopts.wid.common import _l2cap_send_forever, _safe_l2cap_disconnect
@@ -135,7 +134,7 @@ def hdl_wid_37(params: WIDParams):
     if tx_data is None or len(tx_data) < 1:
         return False
 
-    return data[0] == tx_data[0]
+    return bytes.fromhex(data[0]) == tx_data[0]
 
 
 def hdl_wid_38(_: WIDParams):
@@ -322,7 +321,7 @@ def hdl_wid_57(_: WIDParams):
 
     for _i in range(4):
         btp.l2cap_send_data(0, '00')
-        time.sleep(2)
+        clock_sleep(2, 'Pacing data packets')
     return True
 
 
@@ -380,7 +379,7 @@ def hdl_wid_103(_: WIDParams):
     stack = get_stack()
     stack.l2cap.clear_data()
     chan = stack.l2cap.chan_lookup_id(0)
-    time.sleep(10)
+    clock_sleep(10, 'Waiting before reconfiguration')
     btp.l2cap_reconfigure(None, None, chan.our_mtu + 1,
                           [chan.id for chan in stack.l2cap.channels])
     return True
@@ -580,9 +579,14 @@ def hdl_wid_260(_: WIDParams):
     return result
 
 
+def _rx_packets(chan_id):
+    chan = get_stack().l2cap.chan_lookup_id(chan_id)
+    return chan.rx_packets if chan else 0
+
+
 def hdl_wid_261(_: WIDParams):
-    time.sleep(2)
     stack = get_stack()
+    wait_until(2, lambda: _rx_packets(0) >= 2, 'Receiving data')
     chan = stack.l2cap.chan_lookup_id(0)
     rx_data = stack.l2cap.rx_data_get(0, 10)
 
@@ -602,7 +606,7 @@ def hdl_wid_262(_: WIDParams):
 
     for _ in range(5):
         btp.l2cap_send_data(0, '00' * channel.peer_mtu)
-        time.sleep(2)
+        clock_sleep(2, 'Pacing data packets')
     return True
 
 
@@ -714,10 +718,11 @@ def hdl_wid_49(params: WIDParams):
                           mode=defs.L2CAP_CONNECT_V2_MODE_RET)
 
     if params.test_case_name in ['L2CAP/COS/CED/BV-10-C', 'L2CAP/COS/CFD/BV-13-C']:
-        time.sleep(2)
+        clock_sleep(2, 'Settling the ACL connection')
+        channels = len(l2cap.channels)
         btp.l2cap_conn_v2(None, defs.BTP_BR_ADDRESS_TYPE, l2cap.psm, l2cap.initial_mtu,
                           mode=defs.L2CAP_CONNECT_V2_MODE_FC)
-        time.sleep(2)
+        wait_until(2, lambda: len(l2cap.channels) > channels, 'Connecting L2CAP channel')
         l2cap = get_stack().l2cap
         for _ in range(0, 5):
             for channel in l2cap.channels:
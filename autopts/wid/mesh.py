@@ -15,9 +15,8 @@
 
 import logging
 import re
-import time
 
-from autopts.ptsprojects.stack import get_stack
+from autopts.ptsprojects.stack import clock_sleep, get_stack, wait_until
 from autopts.pybtp import btp
 from autopts.pybtp.types import MeshVals, Perm, WIDParams
 
@@ -892,7 +891,7 @@ def hdl_wid_104(_: WIDParams):
 
     ret = stack.gap.wait_for_connection(30)
     if ret:
-        time.sleep(5)
+        clock_sleep(5, 'Settling the connection')
 
     return ret
 
@@ -1021,7 +1020,7 @@ def hdl_wid_218(_: WIDParams):
     """
     stack = get_stack()
 
-    time.sleep(stack.mesh.iv_update_timeout.data)
+    clock_sleep(stack.mesh.iv_update_timeout.data, 'IV Update timeout')
     return True
 
 
@@ -1855,9 +1854,11 @@ def hdl_wid_347(_: WIDParams):
 
     # Subscribe if not
     if group_address not in stack.mesh.lpn_subscriptions:
+        polls = stack.mesh.lpn_polls.data
         btp.mesh_lpn_subscribe(group_address)
         stack.mesh.lpn_subscriptions.append(group_address)
-        time.sleep(10)  # Give some time to subscribe
+        # The LPN polls the Friend after the subscription list is confirmed
+        wait_until(10, lambda: stack.mesh.lpn_polls.data > polls, 'Subscribing LPN')
 
     btp.mesh_lpn_unsubscribe(group_address)
     stack.mesh.lpn_subscriptions.remove(group_address)
@@ -2703,7 +2704,7 @@ def hdl_wid_521(_: WIDParams):
     description: Please configure the IUT to stop advertising on all networks.
     """
 
-    time.sleep(60)
+    clock_sleep(60, 'Node Identity advertising timeout')
     return True
 
 
@@ -3327,7 +3328,7 @@ def hdl_wid_702(_: WIDParams):
     """
     stack = get_stack()
 
-    time.sleep(1)
+    clock_sleep(1, 'Settling before Remote Provisioning Scan Start')
     btp.mesh_rpr_scan_start(stack.mesh.address_lt1, 5, stack.mesh.dev_uuid)
     return True
 
@@ -3361,7 +3362,7 @@ def hdl_wid_705(_: WIDParams):
     """
     stack = get_stack()
 
-    time.sleep(5)
+    clock_sleep(5, 'Remote Provisioning link opening')
 
     btp.mesh_rpr_link_get(stack.mesh.address_lt1)
     return True
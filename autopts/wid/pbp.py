@@ -22,7 +22,7 @@ from autopts.pybtp import btp
 from autopts.pybtp.defs import AUDIO_METADATA_PROGRAM_INFO, AUDIO_METADATA_STREAMING_AUDIO_CONTEXTS
 from autopts.pybtp.types import CODEC_CONFIG_SETTINGS, WIDParams, create_lc3_ltvs_bytes
 from autopts.wid.bap import BAS_CONFIG_SETTINGS
-from autopts.wid.common import _safe_bap_send
+from autopts.wid.common import _start_bap_stream
 
 log = logging.debug
 
@@ -257,7 +257,6 @@ def hdl_wid_552(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for _ in range(1, 10):
-        _safe_bap_send(0, data)
+    _start_bap_stream(0, data, sdu_interval=qos_config[0])
 
     return True
@@ -14,8 +14,8 @@
 #
 
 import logging
-from time import sleep
 
+from autopts.ptsprojects.stack import wait_until
 from autopts.pybtp import btp, defs
 from autopts.pybtp.types import WIDParams
 
@@ -75,7 +75,8 @@ def hdl_wid_102(params: WIDParams):
     global SDP_RECORD_HANDLE
 
     btp.gap_start_discov(transport='bredr', discov_type='passive', mode='general')
-    sleep(10)
+    wait_until(10, btp.check_discov_results, 'Discovering PTS over BR/EDR',
+               addr_type=defs.BTP_BR_ADDRESS_TYPE)
     btp.gap_stop_discov()
 
     if not btp.check_discov_results(addr_type=defs.BTP_BR_ADDRESS_TYPE):
@@ -33,7 +33,7 @@ from autopts.pybtp.types import (
 )
 from autopts.wid.bap import BAS_CONFIG_SETTINGS, create_default_config, get_audio_locations_from_pac
 from autopts.wid.ccp import BT_TBS_GTBS_INDEX
-from autopts.wid.common import _safe_bap_send
+from autopts.wid.common import _start_bap_stream
 
 log = logging.debug
 
@@ -636,8 +636,7 @@ def hdl_wid_506(params: WIDParams):
 
     # PTS does not send an explicit message, but for each
     # configured SINK it expects to receive any ISO data.
-    for _ in range(1, 10):
-        _safe_bap_send(0, data)
+    _start_bap_stream(0, data, sdu_interval=qos_config[0])
 
     return True
 
@@ -0,0 +1,157 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2025, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Local index of the projects, test cases and descriptions of a workspace
+
+A .pqw6 file holds the PICS and PIXITs of its projects, but not the
+test cases. PTS derives those from the PICS with the test case mapping
+tables of its installation. The project list is parsed from the
+workspace file, while the test cases and descriptions are recorded
+from PTS, or imported from a test case YAML, the first time they are
+needed. The index is stored under the hash of the workspace file, so
+until the workspace changes it serves the same data without XML-RPC
+calls, also on hosts without PTS.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import xml.etree.ElementTree as ElementTree
+
+from autopts.config import FILE_PATHS
+from autopts.utils import get_own_workspaces, write_json_file
+
+log = logging.debug
+
+
+def parse_workspace_projects(data):
+    """Return the names of the projects in the .pqw6 workspace data"""
+    root = ElementTree.fromstring(data)
+
+    return [project.get('NAME') for project in root.iter('PROJECT_INFORMATION')]
+
+
+class WorkspaceIndex:
+    """Index of a workspace, with the interface of the PTS proxy
+
+    With pts given, test case lists and descriptions missing in the index
+    are read from PTS and added to it. Call save() to store them.
+    """
+
+    def __init__(self, workspace, index_dir=None, pts=None):
+        path = get_own_workspaces().get(workspace, workspace)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.digest = hashlib.sha1(data).hexdigest()
+        self.index_file = os.path.join(index_dir or FILE_PATHS['WORKSPACE_INDEX_DIR'],
+                                       f'{self.name}-{self.digest[:16]}.json')
+        self.pts = pts
+        self.pts_version = None
+        # None in place of a test case list means not indexed yet
+        self.projects = dict.fromkeys(parse_workspace_projects(data))
+        self.descriptions = {}
+        self._dirty = False
+
+        self.load()
+
+    @property
+    def complete(self):
+        return all(test_cases is not None for test_cases in self.projects.values())
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return
+
+        try:
+            with open(self.index_file) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            log(f'Failed to load workspace index {self.index_file}, {e}')
+            return
+
+        self.pts_version = index['pts_version']
+        self.projects = index['projects']
+        self.descriptions = index['descriptions']
+
+    def save(self):
+        if not self._dirty:
+            return
+
+        write_json_file(self.index_file,
+                        {'workspace': self.name,
+                         'digest': self.digest,
+                         'pts_version': self.pts_version,
+                         'projects': self.projects,
+                         'descriptions': self.descriptions}, indent=1)
+        self._dirty = False
+
+    def update_from_pts(self, pts):
+        """Index the project and test case lists of the workspace opened in PTS"""
+        log(f'Indexing workspace {self.name} with PTS')
+
+        pts_version = pts.get_version()
+        if pts_version != self.pts_version:
+            # Test cases and descriptions may differ between PTS versions
+            self.descriptions = {}
+
+        self.pts_version = pts_version
+        self.projects = {project: list(pts.get_test_case_list(project))
+                         for project in pts.get_project_list()}
+        self._dirty = True
+
+    def update_from_test_cases(self, test_cases):
+        """Index the test case lists from {project: [test case, ...]},
+        e.g. loaded from a test case YAML
+        """
+        self.projects.update({project: list(tcs) for project, tcs in test_cases.items()})
+        self._dirty = True
+
+    def get_project_list(self):
+        return tuple(self.projects.keys())
+
+    def get_test_case_list(self, project_name):
+        if self.projects.get(project_name) is None and self.pts:
+            self.projects[project_name] = list(self.pts.get_test_case_list(project_name))
+            self._dirty = True
+
+        return tuple(self.projects[project_name])
+
+    def get_test_case_description(self, project_name, test_case_name):
+        if test_case_name not in self.descriptions and self.pts:
+            self.descriptions[test_case_name] = \
+                self.pts.get_test_case_description(project_name, test_case_name)
+            self._dirty = True
+
+        return self.descriptions[test_case_name]
+
+
+def get_workspace_index(workspace, pts, index_dir=None):
+    """Return the index of the workspace opened in PTS, or pts itself if
+    the workspace file is not available locally
+    """
+    try:
+        index = WorkspaceIndex(workspace, index_dir, pts)
+    except (OSError, ElementTree.ParseError) as e:
+        log(f'Workspace {workspace} cannot be indexed, {e}')
+        return pts
+
+    if not index.complete or index.pts_version != pts.get_version():
+        index.update_from_pts(pts)
+        index.save()
+
+    return index
@@ -531,6 +531,7 @@ class Server(threading.Thread):
         # These methods will be run in the XMLRPC context
         self.server.register_function(self.list_workspace_tree, 'list_workspace_tree')
         self.server.register_function(self.copy_file, 'copy_file')
+        self.server.register_function(self.read_file_chunk, 'read_file_chunk')
         self.server.register_function(self.delete_file, 'delete_file')
         self.server.register_function(self.get_system_model, 'get_system_model')
         self.server.register_function(self.get_system_version, 'get_system_version')
@@ -615,6 +616,27 @@ class Server(threading.Thread):
                 file_bin = xmlrpc.client.Binary(handle.read())
         return file_bin
 
+    def read_file_chunk(self, file_path, offset, size, delete_at_end=False):
+        """Return up to size bytes of the file, starting at offset.
+        Fewer bytes than size mean the end of the file, after which
+        the file is deleted if delete_at_end is set.
+        """
+        self._update_request_time()
+        if not os.path.isfile(file_path):
+            return None
+
+        with open(file_path, 'rb') as handle:
+            handle.seek(offset)
+            data = handle.read(size)
+
+        if delete_at_end and len(data) < size:
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                log(f'Failed to delete {file_path}, {e}')
+
+        return xmlrpc.client.Binary(data)
+
     def delete_file(self, file_path):
         self._update_request_time()
         if os.path.isfile(file_path):
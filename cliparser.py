@@ -90,6 +90,31 @@ class CliParser(argparse.ArgumentParser):
                           help="Specify amount of time in minutes, after which"
                                " super guard will blindly trigger recovery steps.")
 
+        self.add_argument("--adaptive_superguard", action='store_true', default=False,
+                          help="Derive the super guard timeout of each test case from "
+                               "its run history in the test case database. The "
+                               "--superguard value is used for test cases with a "
+                               "short history.")
+
+        self.add_argument("--warm_iut", action='store_true', default=False,
+                          help="Keep the IUT running between consecutive test cases "
+                               "with the same pre-conditions, if the previous one "
+                               "passed. The IUT is then reset over BTP instead of "
+                               "being restarted. Currently used only by zephyr.")
+
+        self.add_argument("--shard", dest='shards', metavar='ARGS', action='append', default=[],
+                          help="Run the test cases in parallel in a separate client "
+                               "process per shard. ARGS are the arguments of the "
+                               "shard's own PTS servers and IUT, added to the other "
+                               "arguments, e.g. --shard=\"-S 65002 -C 65003 -t /dev/ttyACM1\". "
+                               "Option has to be used once per shard.")
+
+        self.add_argument("--shard_index", type=int, default=None, help=argparse.SUPPRESS)
+
+        self.add_argument("--shard_count", type=int, default=0, help=argparse.SUPPRESS)
+
+        self.add_argument("--shard_durations", type=str, default=None, help=argparse.SUPPRESS)
+
         self.add_argument("--ykush", metavar='YKUSH_PORT',
                           help="Specify ykush downstream port number, so on BTP TIMEOUT "
                                "the iut device could be powered off and on.")
@@ -293,6 +318,10 @@ class CliParser(argparse.ArgumentParser):
         if not args.local_addr:
             args.local_addr = ['127.0.0.1'] * len(args.cli_port)
 
+        if args.shards and args.shard_index is None:
+            # The IUT arguments are checked by the client of each shard
+            return args, errmsg
+
         for cli in self.cli_support:
             check_method = getattr(self, f'check_args_{cli}')
             msg = check_method(args)
@@ -1,15 +1,49 @@
+import collections
+import glob
 import os
 import shutil
+import socket
+import struct
 import sys
+import threading
+import time
 import unittest
+import xmlrpc.client
 from os.path import abspath, dirname
 from pathlib import Path
-from unittest.mock import patch
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
+import pytest
+
+from autopts.bot.common import sort_and_reduce_prefixes
 from autopts.bot.common_features import report
-from autopts.client import FakeProxy, TestCaseRunStats
+from autopts.bot.zephyr import FirmwareBuilder
+from autopts.client import FakeProxy, PixitBatchMixin, PrefixTrie, TestCaseRunStats, run_or_not, shard_test_cases
 from autopts.config import FILE_PATHS
+from autopts.ptsprojects.stack.common import (
+    EventQueue,
+    IndexedEventQueue,
+    VirtualClock,
+    set_clock,
+    wait_for_indexed_event,
+    wait_for_queue_event,
+    wait_until,
+)
+from autopts.ptsprojects.stack.layers.bap import BAP, IsoStream
+from autopts.ptsprojects.stack.layers.gap import ScanResults
+from autopts.ptsprojects.stack.layers.gatt import Gatt
+from autopts.ptsprojects.testcase import TestFunc
 from autopts.ptsprojects.testcase_db import TestCaseTable
+from autopts.pybtp import defs
+from autopts.pybtp.btp.ascs import ascs_ev_ase_state_changed_
+from autopts.pybtp.btp.gatt import dec_gatts_get_attrs_rp, gatts_get_attr_val
+from autopts.pybtp.capabilities import CapabilityCache
+from autopts.pybtp.iutctl_common import BTPSerialTransport, BTPWorker
+from autopts.pybtp.log_sink import BTPTraceSink, read_btp_trace
+from autopts.pybtp.parser import dec_hdr, enc_frame
+from autopts.pybtp.types import ASCSState, BTPError, WIDParams
+from autopts.workspace_index import WorkspaceIndex, get_workspace_index
 from autoptsclient_bot import import_bot_module, import_bot_projects
 from test.mocks.mocked_test_cases import mock_workspace_test_cases, test_case_list_generation_samples
 
@@ -250,6 +284,671 @@ class MyTestCase(unittest.TestCase):
                                 results, regressions, progresses, new_cases)
         assert os.path.exists(FILE_PATHS['REPORT_DIFF_TXT_FILE'])
 
+    def test_btp_worker_read_rsp(self):
+        """Check that responses are matched to the command by service
+        ID and opcode, and other frames stay queued for later readers.
+        """
+
+        def frame(svc_id, op):
+            return dec_hdr(bytes([svc_id, op, 0, 0, 0])), ()
+
+        worker = BTPWorker(None)
+        event = frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_EV_DEVICE_FOUND)
+        rsp = frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_CMD_START_ADVERTISING)
+        worker._rx_queue.extend([event, rsp])
+
+        assert worker.read_rsp(defs.BTP_SERVICE_ID_GAP,
+                               defs.BTP_GAP_CMD_START_ADVERTISING, 1) == rsp
+        assert worker.read(1) == event
+
+        start = time.monotonic()
+        with pytest.raises(socket.timeout):
+            worker.read(0.2)
+        assert time.monotonic() - start < 1
+
+    def test_btp_worker_pipelined(self):
+        """Check that commands are pipelined up to the window and that
+        sending stops at the first error response.
+        """
+
+        worker = BTPWorker(None)
+        responses = []
+        queued = []
+
+        def send(svc_id, op, ctrl_index, data):
+            queued.append(len(worker._rx_queue))
+            op = defs.BTP_STATUS if data == b'x' else op
+            worker._rx_queue.append((dec_hdr(bytes([svc_id, op, 0, 0, 0])), ()))
+
+        worker._socket = SimpleNamespace(send=send)
+        sent = worker.send_wait_rsp_pipelined(defs.BTP_SERVICE_ID_L2CAP,
+                                              defs.BTP_L2CAP_CMD_SEND_DATA, 0,
+                                              iter([b'a', b'b', b'c', b'x', b'd', b'e']),
+                                              window=3, on_rsp=responses.append)
+
+        # d and e were in flight behind the rejected x
+        assert sent == 3
+        assert responses == [True, True, True, False, True, True]
+        assert max(queued) == 2
+        assert worker.tx_count == 6
+        assert not worker._rx_queue
+
+    def test_wait_for_queue_event_wakeup(self):
+        """Check that a waiter is woken up by the matching event as soon
+        as it arrives, regardless of how many events are already queued,
+        and that the queued events are tested again while none arrives.
+        """
+
+        event_queue = EventQueue((0, '000000000000', i) for i in range(1000))
+        timer = threading.Timer(0.2, event_queue.append, [(0, 'c0ffee000000', 1)])
+        timer.start()
+
+        start = time.monotonic()
+        ev = wait_for_queue_event(event_queue, lambda _, addr, *__: addr == 'c0ffee000000', 5, True)
+        assert ev == (0, 'c0ffee000000', 1)
+        assert time.monotonic() - start < 1
+        assert len(event_queue) == 1000
+
+        # An already queued event matches once the outside state changes
+        wanted = []
+        timer = threading.Timer(0.2, wanted.append, [999])
+        timer.start()
+
+        ev = wait_for_queue_event(event_queue, lambda *ev: ev[2] in wanted, 5, False)
+        assert ev == (0, '000000000000', 999)
+
+    def test_indexed_event_queue_retention(self):
+        """Check that only the latest events are retained per match key
+        and that the oldest retained one is taken first.
+        """
+
+        event_queue = IndexedEventQueue(lambda ev: ev[:2], maxlen=10)
+        for i in range(1000):
+            event_queue.append((i % 2, 'c0ffee000000', i))
+
+        assert len(event_queue) == 20
+        assert event_queue.dropped == 980
+        assert wait_for_indexed_event(event_queue, (1, 'c0ffee000000'), 1, True)[2] == 981
+        assert wait_for_indexed_event(event_queue, (1, 'c0ffee000000'), 1, False)[2] == 983
+        assert wait_for_indexed_event(event_queue, (2, 'c0ffee000000'), 0.1, True) is None
+        assert len(event_queue) == 19
+
+    def test_btp_trace_sink(self):
+        """Check that frames written by BTPTraceSink are decoded back
+        and that the trace is rotated when it gets too big.
+        """
+
+        path = os.path.join(FILE_PATHS['TMP_DIR'], 'test.btptrace')
+        Path(FILE_PATHS['TMP_DIR']).mkdir(parents=True, exist_ok=True)
+
+        sink = BTPTraceSink(path, max_size=1000, backup_count=1)
+        frames = [enc_frame(defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_CMD_START_ADVERTISING, 0, bytes([i]))
+                  for i in range(100)]
+        for i, frame in enumerate(frames):
+            sink.put((1693378197.0 + i, i % 2 == 0, frame))
+        sink.close()
+
+        decoded = list(read_btp_trace(path + '.1')) + list(read_btp_trace(path))
+        assert [frame for _, _, frame in decoded] == frames[-len(decoded):]
+        assert decoded[-1] == (1693378197.0 + 99, False, frames[-1])
+
+    def test_test_case_duration_stats(self):
+        """Check the duration mean, the percentiles of the run history
+        and the superguard timeouts derived from them.
+        """
+
+        database_file = os.path.join(FILE_PATHS['TMP_DIR'], 'test_duration_stats.db')
+        Path(FILE_PATHS['TMP_DIR']).mkdir(parents=True, exist_ok=True)
+        if os.path.exists(database_file):
+            os.remove(database_file)
+
+        test_case_db = TestCaseTable('zephyr', database_file)
+        for duration in range(1, 21):
+            test_case_db.update_statistics('GAP/SEC/AUT/BV-11-C', duration, 'PASS')
+        test_case_db.update_statistics('GAP/SEC/AUT/BV-12-C', 7, 'FAIL')
+
+        assert test_case_db.get_mean_duration('GAP/SEC/AUT/BV-11-C') == 10.5
+        stats = test_case_db.get_duration_stats(['GAP/SEC/AUT/BV-11-C', 'GAP/SEC/AUT/BV-13-C'])
+        assert list(stats) == ['GAP/SEC/AUT/BV-11-C']
+        assert stats['GAP/SEC/AUT/BV-11-C'] == (20, 10, 19, 20)
+
+        timeouts = test_case_db.get_superguard_timeouts(['GAP/SEC/AUT/BV-11-C', 'GAP/SEC/AUT/BV-12-C'], 900)
+        assert timeouts == {'GAP/SEC/AUT/BV-11-C': 19 * 1.5 + 60, 'GAP/SEC/AUT/BV-12-C': 900}
+        test_case_db.close()
+
+    def test_shard_test_cases(self):
+        """Check that test cases are balanced across shards by duration
+        and that pinned test cases stay in the first shard.
+        """
+
+        test_cases = [f'GAP/SEC/AUT/BV-{i:02}-C' for i in range(10)]
+        durations = {tc: 10 * i for i, tc in enumerate(test_cases[:8])}
+
+        shards = shard_test_cases(test_cases, 3, durations, pinned={test_cases[1]})
+
+        assert sorted(sum(shards, [])) == test_cases
+        assert test_cases[1] in shards[0]
+        assert all(shard == sorted(shard) for shard in shards)
+
+        loads = [sum(durations.get(tc, 35) for tc in shard) for shard in shards]
+        assert max(loads) - min(loads) <= 20
+
+    def test_pixit_batch(self):
+        """Check that PIXIT changes are sent in order with one request
+        per batch, skipping updates to the default value.
+        """
+
+        class PixitBatchProxy(PixitBatchMixin):
+            def __init__(self):
+                self._init_pixit_batch()
+                self.calls = []
+
+            def _call(self, method_name, *args):
+                if 'INVALID' in str(args):
+                    raise xmlrpc.client.Fault(1, 'Invalid PIXIT')
+                self.calls.append((method_name, *args))
+
+        pts = PixitBatchProxy()
+        pts.set_pixit('GAP', 'TSPX_bd_addr_iut', 'DEADBEEFDEAD')
+        pts.set_pixit('GAP', 'TSPX_delete_ltk', 'FALSE')
+        pts.flush_pixits()
+
+        for _ in range(2):
+            pts.update_pixit_param('GAP', 'TSPX_bd_addr_iut', 'C0FFEE000000')
+            pts.update_pixit_param('GAP', 'TSPX_delete_ltk', 'TRUE')
+            pts.update_pixit_param('GAP', 'TSPX_delete_ltk', 'FALSE')
+            pts.run_test_case('GAP', 'GAP/SEC/AUT/BV-11-C')
+
+        assert pts.calls == [
+            ('set_pixits_bulk', [('GAP', 'TSPX_bd_addr_iut', 'DEADBEEFDEAD'), ('GAP', 'TSPX_delete_ltk', 'FALSE')]),
+            ('update_pixit_params', [('GAP', 'TSPX_bd_addr_iut', 'C0FFEE000000')]),
+            ('run_test_case', 'GAP', 'GAP/SEC/AUT/BV-11-C'),
+            ('update_pixit_params', [('GAP', 'TSPX_bd_addr_iut', 'C0FFEE000000')]),
+            ('run_test_case', 'GAP', 'GAP/SEC/AUT/BV-11-C'),
+        ]
+
+        # A failed request is sent again one PIXIT at a time
+        pts.calls.clear()
+        pts.update_pixit_param('GAP', 'TSPX_delete_ltk', 'TRUE')
+        pts.update_pixit_param('GAP', 'TSPX_iut_privacy_enabled', 'INVALID')
+        with self.assertLogs(level='ERROR') as logs:
+            with pytest.raises(xmlrpc.client.Fault):
+                pts.run_test_case('GAP', 'GAP/SEC/AUT/BV-11-C')
+
+        assert "update_pixit_param ('GAP', 'TSPX_iut_privacy_enabled', 'INVALID')" in logs.output[-1]
+        assert pts.calls == [('update_pixit_param', 'GAP', 'TSPX_delete_ltk', 'TRUE')]
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason='requires a pseudo-terminal')
+    def test_btp_serial_transport(self):
+        """Check that BTP frames are read from a serial port, which stays
+        open for the next test case and drops stale input on reopen.
+        """
+
+        master, slave = os.openpty()
+        log_dir = Path('tmp_serial_transport')
+        log_dir.mkdir(exist_ok=True)
+        rsp = enc_frame(defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS, 0, b'\x01')
+
+        transport = BTPSerialTransport(log_dir, keep_open=True)
+        worker = BTPWorker(transport)
+
+        try:
+            transport.open(os.ttyname(slave))
+            worker.accept()
+
+            worker.send(defs.BTP_SERVICE_ID_CORE, defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS, 0, b'')
+            assert os.read(master, 64) == enc_frame(defs.BTP_SERVICE_ID_CORE,
+                                                     defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS, 0, b'')
+
+            # Frame split across two writes
+            os.write(master, rsp[:3])
+            time.sleep(0.05)
+            os.write(master, rsp[3:])
+            hdr, data = worker.read_rsp(defs.BTP_SERVICE_ID_CORE,
+                                        defs.BTP_CORE_CMD_READ_SUPPORTED_COMMANDS, 2)
+            assert hdr.data_len == 1
+            assert data == (b'\x01',)
+
+            worker.close()
+            port = transport.conn
+            assert port.is_open
+
+            # Partial frame left by the previous test case
+            os.write(master, rsp[:3])
+            time.sleep(0.05)
+
+            transport = BTPSerialTransport(log_dir, port, keep_open=True)
+            transport.open(os.ttyname(slave))
+            assert transport.conn is port
+
+            os.write(master, rsp)
+            hdr, data = transport.read(2)
+            assert data == (b'\x01',)
+
+            transport.close()
+        finally:
+            worker.close()
+            if transport.conn:
+                transport.conn.close()
+            os.close(master)
+            os.close(slave)
+            delete_file(log_dir)
+
+    def test_warm_iut_reuse(self):
+        """Check that the IUT is kept running only after a passed test case
+        and reused only by a test case with the same pre-conditions.
+        """
+
+        from autopts.ptsprojects.zephyr import ztestcase
+
+        stack = MagicMock(gap=None)
+        zephyrctl = MagicMock(warm_iut=True)
+        zephyrctl.warm_blocker.return_value = None
+
+        with patch.object(ztestcase, 'get_stack', return_value=stack), \
+                patch.object(ztestcase, 'get_iut', return_value=zephyrctl):
+            pre_conditions = [TestFunc(print), TestFunc(print, start_wid=1)]
+            tc1 = ztestcase.ZTestCase('GAP', 'GAP/TEST/BV-01-C', cmds=pre_conditions)
+            tc2 = ztestcase.ZTestCase('GAP', 'GAP/TEST/BV-02-C', cmds=pre_conditions)
+            tc3 = ztestcase.ZTestCase('GAP', 'GAP/TEST/BV-03-C', cmds=[TestFunc(print)])
+
+        assert tc1.warm_key() == tc2.warm_key() == (pre_conditions[0],)
+        assert tc1.warm_key() != tc3.warm_key()
+
+        tc1.status = 'PASS'
+        tc1.iut_teardown()
+        zephyrctl.keep_warm.assert_called_once_with(tc1.warm_key())
+        zephyrctl.stop.assert_not_called()
+        assert tc1.settled
+
+        zephyrctl.is_warm.return_value = True
+        tc2.iut_setup()
+        assert tc2.warm
+        zephyrctl.soft_reset.assert_called_once_with(tc2)
+        zephyrctl.start.assert_not_called()
+
+        tc2.status = 'FAIL'
+        tc2.iut_teardown()
+        zephyrctl.stop.assert_called_once()
+        assert not tc2.settled
+
+        # Not reused with state left on the IUT
+        zephyrctl.warm_blocker.return_value = 'gatt_reg registered'
+        tc1.iut_teardown()
+        assert zephyrctl.stop.call_count == 2
+        assert not tc1.settled
+
+    def test_scan_results(self):
+        """Check that repeated advertising reports are merged per address,
+        the history is capped.
+        """
+
+        adv = bytes.fromhex('02010603034e18')
+        scan_rsp = bytes.fromhex('05094e616d65')
+        svc_data = bytes.fromhex('07164e180001020304')
+
+        results = ScanResults(max_history=2)
+        for _ in range(1000):
+            results.add(0, b'c0ffee000000', -50, 0x02, adv)
+        results.add(0, b'c0ffee000000', -40, 0x04, scan_rsp)
+        results.add(1, b'deadbeef0000', -60, 0x02, svc_data)
+
+        assert len(results) == 1002
+        entries = results.entries(0, b'c0ffee000000')
+        assert [entry.eir for entry in entries] == [adv, scan_rsp]
+        assert entries[0].count == 1000
+        assert entries[-1].rssi == -40
+        assert entries[1].ad == {9: b'Name'}
+
+        results.add(0, b'c0ffee000000', -40, 0x02, svc_data)
+        assert [entry.eir for entry in results.entries(0, b'c0ffee000000')] == [scan_rsp, svc_data]
+
+        results.clear()
+        assert not results.all_entries()
+
+    def test_iso_stream(self):
+        """Check that SDUs are paced at the SDU interval, and that slots
+        are skipped while the IUT buffer is full, on errors and after a
+        slow send.
+        """
+
+        clock = VirtualClock()
+        send_times = []
+        stopped = threading.Event()
+
+        def send(sdu):
+            send_times.append(clock.now)
+            if len(send_times) == 3:
+                raise BTPError('Buffer full')
+            if len(send_times) == 8:
+                # The send takes 2.5 SDU intervals
+                clock.now += 0.025
+            if len(send_times) == 12:
+                stream.stop(wait=False)
+                stopped.set()
+            # The IUT buffer fills up after the 5th SDU
+            return len(sdu) * (3 if len(send_times) == 5 else 1)
+
+        stream = IsoStream('test', send, bytes(40), 10000, max_buffered=2, clock=clock)
+        stream.start()
+        assert stopped.wait(5)
+        stats = stream.stop()
+
+        assert not stream.running
+        assert send_times == pytest.approx([0.0, 0.01, 0.02, 0.03, 0.04, 0.06, 0.07, 0.08,
+                                            0.105, 0.11, 0.12, 0.13])
+        assert (stats.sent, stats.dropped, stats.throttled, stats.missed) == (11, 1, 1, 1)
+        assert stats.sent_bytes == 11 * 40
+        assert stats.jitter_max == pytest.approx(0.005)
+        assert stats.elapsed == pytest.approx(0.13)
+        assert stats.throughput == pytest.approx(11 * 40 * 8 / 0.13)
+
+    def test_iso_streams_per_peer(self):
+        """Check that an ASE state change stops only the stream of its
+        peer, when two peers use the same ASE ID.
+        """
+
+        bap = BAP()
+        peers = [(0, 'c0ffee000001'), (0, 'c0ffee000002')]
+        streams = [bap.start_stream((*peer, 1), lambda sdu: 0, bytes(40), 10000) for peer in peers]
+
+        data = struct.pack('<B6sBB', 0, bytes.fromhex('c0ffee000001')[::-1], 1, ASCSState.RELEASING)
+        with patch('autopts.pybtp.btp.ascs.get_stack', return_value=SimpleNamespace(bap=bap)):
+            ascs_ev_ase_state_changed_(MagicMock(), data, len(data))
+
+        try:
+            assert wait_until(5, lambda: not streams[0].running, 'Stream stopped')
+            assert streams[1].running
+            assert list(bap.streams) == [(0, 'c0ffee000002', 1)]
+        finally:
+            bap.stop_streams()
+
+        assert not streams[1].running
+
+    def test_virtual_clock(self):
+        """Check that WID handler waits run instantly on a virtual clock."""
+
+        from autopts.wid import mesh
+
+        clock = VirtualClock()
+        old_clock = set_clock(clock)
+        start = time.monotonic()
+
+        try:
+            assert mesh.hdl_wid_521(WIDParams(521, '', 'MESH/NODE/IDNT/BV-01-C'))
+            assert clock.now == 60
+
+            assert not wait_until(10, lambda: False, 'Never')
+            assert 70 <= clock.now < 71
+
+            assert wait_until(10, lambda: clock.now > 75, 'After 5 s')
+            assert clock.now < 76
+        finally:
+            set_clock(old_clock)
+
+        assert time.monotonic() - start < 1
+
+    def test_gatt_notification_queue(self):
+        """Check that a waiter gets the matching notification as soon as
+        it arrives, while the queue and the history stay bounded.
+        """
+
+        gatt = Gatt()
+        gatt.notification_events = type(gatt.notification_events)(maxlen=10)
+        gatt.notification_queue.maxlen = 10
+
+        for i in range(100):
+            gatt.notification_ev_recv(0, 'c0ffee000000', 1, 0x10 + i % 2, bytes([i]))
+
+        timer = threading.Timer(0.2, gatt.notification_ev_recv, [0, 'c0ffee000000', 2, 0x20, b''])
+        timer.start()
+
+        start = time.monotonic()
+        ev = gatt.wait_notification_ev(5, 0, 'c0ffee000000', notif_type=2)
+        assert ev == (0, 'c0ffee000000', 2, 0x20, b'')
+        assert time.monotonic() - start < 1
+        assert gatt.wait_notification_ev(0.1, notif_type=2) is None
+
+        assert len(gatt.notification_queue) == 20
+        assert gatt.wait_notification_ev(0, addr='c0ffee000000')[4] == bytes([80])
+        assert len(gatt.notification_events) == 10
+        assert gatt.notification_counters[(0, 'c0ffee000000', 0x10)].count == 50
+
+    def test_gatt_server_mirror(self):
+        """Check the decoding of the IUT attributes and the queries on
+        the mirror, and that it goes out of sync on commands and events that may change
+        the DB.
+        """
+
+        uuid128 = bytes(range(16))
+        data = struct.pack('<BHBB2sHBB2sHBB16s', 3,
+                           0x0001, 0x01, 2, struct.pack('<H', 0x2800),
+                           0x0002, 0x01, 2, struct.pack('<H', 0x2803),
+                           0x0003, 0x03, 16, uuid128)
+        attrs = dec_gatts_get_attrs_rp(data, len(data))
+        assert attrs == [(1, 0x01, '2800'), (2, 0x01, '2803'),
+                         (3, 0x03, uuid128[::-1].hex().upper())]
+
+        gatt = Gatt()
+        btp_socket = SimpleNamespace(tx_counts=collections.Counter(), ev_counts=collections.Counter())
+        gatt.iut_db.sync(btp_socket, reversed(attrs))
+        assert gatt.iut_db.is_synced(btp_socket)
+
+        assert gatt.iut_db.attrs() == attrs
+        assert gatt.iut_db.attrs(2, 3) == attrs[1:]
+        assert gatt.iut_db.attrs(type_uuid='2803') == [attrs[1]]
+        assert gatt.iut_db.attrs(perm=0x02) == [attrs[2]]
+        assert gatt.iut_db.is_declaration(2)
+        assert not gatt.iut_db.is_declaration(3)
+
+        gatt.iut_db.value_set(0, 'c0ffee000000', 2, (0, 5, b'\x02'))
+        assert gatt.iut_db.value_get(0, 'c0ffee000000', 2) == (0, 5, b'\x02')
+
+        # Neither GAP traffic nor GATT queries change the DB
+        btp_socket.tx_counts[defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_CMD_START_ADVERTISING] += 1
+        btp_socket.tx_counts[defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_GET_ATTRIBUTES] += 1
+        btp_socket.ev_counts[defs.BTP_SERVICE_ID_GAP] += 1
+        assert gatt.iut_db.is_synced(btp_socket)
+
+        btp_socket.tx_counts[defs.BTP_SERVICE_ID_GATT, defs.BTP_GATT_CMD_ADD_SERVICE] += 1
+        assert not gatt.iut_db.is_synced(btp_socket)
+        gatt.iut_db.sync(btp_socket, attrs)
+        btp_socket.ev_counts[defs.BTP_SERVICE_ID_MESH] += 1
+        assert not gatt.iut_db.is_synced(btp_socket)
+
+        # A value read does not sync a stale mirror
+        rsp = struct.pack('<BH', 0, 1) + b'\x02'
+        btp_socket.send = MagicMock()
+        btp_socket.read = MagicMock(return_value=(
+            SimpleNamespace(svc_id=defs.BTP_SERVICE_ID_GATT, op=defs.BTP_GATT_CMD_GET_ATTRIBUTE_VALUE,
+                            data_len=len(rsp)), [rsp]))
+        with patch('autopts.pybtp.btp.gatt.get_stack', return_value=SimpleNamespace(gatt=gatt)), \
+                patch('autopts.pybtp.btp.gatt.get_iut', return_value=SimpleNamespace(btp_socket=btp_socket)):
+            assert gatts_get_attr_val(0, 'c0ffee000000', 2) == (0, 1, b'\x02')
+
+        btp_socket.send.assert_called_once()
+        assert not gatt.iut_db.is_synced(btp_socket)
+
+    def test_firmware_builder_cache(self):
+        """Check that every overlay set keeps its own build directory,
+        which is built incrementally and skipped when unchanged.
+        """
+
+        cache_dir = 'tmp_build_cache'
+        builds = []
+        head = ['abc']
+
+        def build(zephyr_wd, board, conf_file, env_cmd, build_dir, stdout, pristine):
+            builds.append((conf_file, pristine))
+            os.makedirs(build_dir, exist_ok=True)
+
+        args = MagicMock(board_name='nrf52', project_path='.', project_repos=None,
+                         build_env_cmd=None)
+        builder = FirmwareBuilder(cache_dir, cache_size=2)
+
+        try:
+            with patch('autopts.bot.zephyr.get_build', return_value=build), \
+                    patch('autopts.bot.zephyr.get_repo_head', side_effect=lambda path: head[0]):
+                for overlays in ['a.conf', 'b.conf', 'a.conf', 'c.conf', 'b.conf']:
+                    firmware = builder.result(builder.submit(args, overlays))
+                    assert firmware.cacheable
+                    time.sleep(0.01)
+
+                head[0] = 'def'
+                builder.result(builder.submit(args, 'b.conf'))
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        assert builds == [('a.conf', True), ('b.conf', True), ('c.conf', True),
+                          ('b.conf', True), ('b.conf', False)]
+        assert [build.kind for build in builder.build_times] == \
+            ['pristine', 'pristine', 'cached', 'pristine', 'pristine', 'incremental']
+
+    def test_prefix_trie(self):
+        """Check that the prefix trie matches like str.startswith does."""
+
+        trie = PrefixTrie()
+        trie.add('GAP/SEC', 1)
+        trie.add('GAP/', 0)
+        trie.add('GAP/SEC', 2)
+
+        assert len(trie) == 2
+        assert list(trie.values('GAP/SEC/AUT/BV-11-C')) == [0, 1]
+        assert trie.match('GAP/BROB/BCST/BV-01-C') == 0
+        assert trie.match('GATT/CL/GAC/BV-01-C') is None
+
+        assert run_or_not('GAP/SEC/AUT/BV-11-C', ['GATT', 'GAP'], ['GAP/SEC/']) is False
+        assert run_or_not('GAP/CONN/DCON/BV-01-C', PrefixTrie(['GATT', 'GAP']), []) is True
+        assert run_or_not('GAP/CONN/DCON/BV-01-C', [], []) is True
+        assert run_or_not('GAP/CONN/DCON/BV-01-C_LT2', [], []) is False
+
+        assert sort_and_reduce_prefixes(['GAP/SEC', 'GATT/CL', 'GAP', 'GATT']) == ['GAP', 'GATT']
+
+    def test_workspace_index(self):
+        """Check that the workspace index is built from PTS once and then
+        serves the test cases and descriptions without PTS.
+        """
+
+        index_dir = 'tmp_workspace_index'
+        pts = MagicMock()
+        pts.get_version.return_value = 0x65
+        pts.get_project_list.return_value = ('GAP', 'SM')
+        pts.get_test_case_list.side_effect = lambda project: (f'{project}/X/BV-01-C',)
+        pts.get_test_case_description.return_value = 'Description'
+
+        try:
+            assert WorkspaceIndex('bluez', index_dir).get_project_list() == ('GAP', 'SM')
+            assert not WorkspaceIndex('bluez', index_dir).complete
+
+            index = get_workspace_index('bluez', pts, index_dir)
+            assert index.get_test_case_description('GAP', 'GAP/X/BV-01-C') == 'Description'
+            index.save()
+
+            pts.reset_mock()
+            index = get_workspace_index('bluez', pts, index_dir)
+            assert index.get_test_case_list('SM') == ('SM/X/BV-01-C',)
+            assert index.get_test_case_description('GAP', 'GAP/X/BV-01-C') == 'Description'
+            assert not pts.get_test_case_list.called
+            assert not pts.get_test_case_description.called
+
+            assert WorkspaceIndex('bluez', index_dir).complete
+            assert get_workspace_index('missing', pts, index_dir) is pts
+        finally:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+    def test_pull_server_file(self):
+        """Check that a server file is pulled in chunks, with the PASS
+        verdict found also when it is split between chunks.
+        """
+
+        class FakeServer:
+            def __init__(self, files):
+                self.files = files
+                self.calls = 0
+
+            def read_file_chunk(self, file_path, offset, size, delete_at_end=False):
+                self.calls += 1
+                if file_path not in self.files:
+                    return None
+
+                data = self.files[file_path][offset:offset + size]
+                if delete_at_end and len(data) < size:
+                    del self.files[file_path]
+
+                return xmlrpc.client.Binary(data)
+
+            def delete_file(self, file_path):
+                self.files.pop(file_path, None)
+
+        content = b'x' * 10 + b'Final Verdict:PASS' + b'y' * 20
+        server = FakeServer({'a.xml': content, 'b.xml': b'Final Verdict:FAIL'})
+        local_path = 'tmp_pull/a.xml'
+
+        try:
+            with patch.object(report, 'LOG_CHUNK_SIZE', 16):
+                assert report.pull_server_file(server, 'a.xml', local_path, delete=True) is True
+                assert report.pull_server_file(server, 'b.xml', 'tmp_pull/b.xml') is False
+                assert report.pull_server_file(server, 'dir', 'tmp_pull/dir', delete=True) is None
+
+            with open(local_path, 'rb') as f:
+                assert f.read() == content
+        finally:
+            shutil.rmtree('tmp_pull', ignore_errors=True)
+
+        assert server.calls == 4 + 2 + 1
+        assert list(server.files) == ['b.xml']
+
+    def test_capability_cache(self):
+        """Check that capabilities are cached per firmware and persist,
+        that every N-th lookup is verified with the IUT and that
+        concurrent writers keep each other's entries.
+        """
+
+        cache_file = 'tmp_capability_cache.json'
+
+        try:
+            cache = CapabilityCache(cache_file, verify_every=3)
+            assert cache.get('GAP') is None
+
+            cache.set_firmware('fw1')
+            assert cache.get('GAP') is None
+            cache.set('GAP', 0xff)
+
+            cache = CapabilityCache(cache_file, verify_every=3)
+            cache.set_firmware('fw1')
+            assert [cache.get('GAP') for _ in range(3)] == [0xff, 0xff, None]
+
+            cache.set('GAP', 0x7f)
+            cache.set_firmware('fw2')
+            assert cache.get('GAP') is None
+
+            cache.set_firmware('fw1')
+            assert cache.get('GAP') == 0x7f
+
+            # Caches of other processes, e.g. shards, write the same file
+            caches = [CapabilityCache(cache_file) for _ in range(4)]
+            for i, cache in enumerate(caches):
+                cache.set_firmware(f'shard{i}')
+                cache.get('GAP')
+
+            for i, cache in enumerate(caches[:2]):
+                cache.set('GAP', i)
+
+            threads = [threading.Thread(target=cache.set, args=('GAP', i + 2))
+                       for i, cache in enumerate(caches[2:])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            cache = CapabilityCache(cache_file)
+            for i in range(2):
+                cache.set_firmware(f'shard{i}')
+                assert cache.get('GAP') == i
+            assert not glob.glob(f'{cache_file}.*.tmp')
+        finally:
+            delete_file(cache_file)
+
 
 if __name__ == '__main__':
     unittest.main()
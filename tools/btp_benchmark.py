@@ -0,0 +1,149 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2025, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Microbenchmark of the BTP command/response path
+
+A loopback IUT stand-in answers every BTP command with a response
+carrying the same service ID, opcode and payload, so the numbers show
+the overhead of BTPWorker/BTPSocket alone. With --socket the BTPWorker
+is bypassed, which shows the per-frame cost of BTPSocket framing and
+logging.
+
+Usage:
+$ python3 tools/btp_benchmark.py [-n COUNT] [-s PAYLOAD_SIZE] [--socket]
+"""
+import argparse
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from os.path import abspath, dirname
+
+AUTOPTS_REPO = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, AUTOPTS_REPO)
+
+from autopts.pybtp import defs  # noqa: E402 # the order of import is very important here
+from autopts.pybtp.iutctl_common import BTPSocket, BTPWorker  # noqa: E402
+from autopts.pybtp.parser import HDR_LEN, dec_hdr  # noqa: E402
+
+
+def _recv_exact(conn, length):
+    buf = bytearray()
+    while len(buf) < length:
+        chunk = conn.recv(length - len(buf))
+        if not chunk:
+            raise OSError
+        buf += chunk
+    return bytes(buf)
+
+
+class LoopbackIUT(threading.Thread):
+    """IUT stand-in echoing every command back as its response"""
+
+    def __init__(self, conn):
+        super().__init__(name='LoopbackIUT', daemon=True)
+        self.conn = conn
+
+    def run(self):
+        try:
+            while True:
+                hdr = _recv_exact(self.conn, HDR_LEN)
+                data = _recv_exact(self.conn, dec_hdr(hdr).data_len)
+                self.conn.sendall(hdr + data)
+        except OSError:
+            pass
+
+
+class BTPSocketLoopback(BTPSocket):
+    """BTPSocket connected to a LoopbackIUT over a socket pair"""
+
+    def __init__(self, log_dir=None):
+        super().__init__(log_dir)
+        self.iut = None
+
+    def open(self, address=None):
+        self.conn, iut_conn = socket.socketpair()
+        self.iut = LoopbackIUT(iut_conn)
+
+    def accept(self, timeout=10.0):
+        self.iut.start()
+
+    def close(self):
+        super().close()
+        self.conn.close()
+        self.iut.conn.close()
+
+
+def run_benchmark(count, payload_size, raw_socket):
+    payload = bytes(payload_size)
+    cmd = (defs.BTP_SERVICE_ID_GAP, defs.BTP_GAP_CMD_START_ADVERTISING,
+           defs.BTP_INDEX_NONE, payload)
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        sock = BTPSocketLoopback(log_dir)
+        sock.open()
+
+        if raw_socket:
+            sock.accept()
+            btp = sock
+        else:
+            btp = BTPWorker(sock)
+            btp.accept()
+
+        latencies = []
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+
+        for _ in range(count):
+            start = time.perf_counter()
+            if raw_socket:
+                sock.send(*cmd)
+                sock.read()
+            else:
+                btp.send_wait_rsp(*cmd)
+            latencies.append(time.perf_counter() - start)
+
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+        btp.close()
+
+    latencies.sort()
+    print(f'round trips:       {count} ({payload_size} B payload)')
+    print(f'throughput:        {count / wall:.0f} cmd/s')
+    print(f'latency mean:      {statistics.mean(latencies) * 1e6:.1f} us')
+    print(f'latency p50:       {latencies[len(latencies) // 2] * 1e6:.1f} us')
+    print(f'latency p99:       {latencies[int(len(latencies) * 0.99)] * 1e6:.1f} us')
+    print(f'CPU / wall time:   {cpu / wall * 100:.0f} %')
+    print(f'CPU per frame:     {cpu / (2 * count) * 1e6:.1f} us')
+
+
+class BenchmarkParser(argparse.ArgumentParser):
+    def __init__(self):
+        super().__init__(description='BTP round trip microbenchmark', add_help=True)
+
+        self.add_argument("-n", "--count", type=int, default=2000,
+                          help="Number of command/response round trips.")
+        self.add_argument("-s", "--size", type=int, default=16,
+                          help="Command payload size in bytes.")
+        self.add_argument("--socket", action='store_true',
+                          help="Bypass BTPWorker and use BTPSocket directly.")
+
+
+if __name__ == '__main__':
+    args = BenchmarkParser().parse_args()
+    run_benchmark(args.count, args.size, args.socket)
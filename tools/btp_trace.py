@@ -0,0 +1,39 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2025, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Script decoding a BTP trace into the autopts-iutctl.log text format
+
+BTP traces are captured to autopts-iutctl.btptrace next to the
+autopts-iutctl.log if the client runs with AUTOPTS_BTP_TRACE=1.
+
+Usage:
+$ python3 tools/btp_trace.py path/to/autopts-iutctl.btptrace
+"""
+import sys
+from os.path import abspath, dirname
+
+AUTOPTS_REPO = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, AUTOPTS_REPO)
+
+from autopts.pybtp.iutctl_common import format_btp_frame  # noqa: E402 # the order of import is very important here
+from autopts.pybtp.log_sink import read_btp_trace  # noqa: E402
+from autopts.pybtp.parser import HDR_LEN, dec_hdr  # noqa: E402
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(f'Usage:\n$ python3 {sys.argv[0]} path/to/autopts-iutctl.btptrace')
+
+    for timestamp, sent, frame in read_btp_trace(sys.argv[1]):
+        sys.stdout.write(format_btp_frame(timestamp, sent, tuple(dec_hdr(frame[:HDR_LEN])), frame))
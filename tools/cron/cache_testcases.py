@@ -15,6 +15,9 @@
 
 """Script for printing test cases enabled in workspace
 
+The test cases are taken from the workspace index if the workspace has
+been indexed already, so PTS is started only the first time.
+
 Usage:
 $ python3 cache_testcases.py path/to/workspace.pqw6 path/to/cached_testcases.yaml
 """
@@ -28,21 +31,23 @@ if __name__ == '__main__':
     sys.path.insert(0, AUTOPTS_REPO)
 
 
-from autopts.ptscontrol import PyPTS
+from autopts.workspace_index import WorkspaceIndex
 
 
 def cache_test_cases(workspace_path, cache_file_path):
-    pts = PyPTS(lite_start=True)
-    pts.start_pts()
-    pts.open_workspace(workspace_path)
-    projects = pts.get_project_list()
+    index = WorkspaceIndex(workspace_path)
+
+    if not index.complete:
+        from autopts.ptscontrol import PyPTS
 
-    test_cases = {}
-    for project in projects:
-        test_cases[project] = list(pts.get_test_case_list(project))
+        pts = PyPTS(lite_start=True)
+        pts.start_pts()
+        pts.open_workspace(workspace_path)
+        index.update_from_pts(pts)
+        index.save()
 
     with open(cache_file_path, 'w') as stream:
-        yaml.dump(test_cases, stream)
+        yaml.dump(index.projects, stream)
 
 
 def main():
@@ -17,16 +17,15 @@ import os
 import sys
 from datetime import timedelta
 
-from autopts.client import run_or_not
+from autopts.client import PrefixTrie, as_prefix_trie, run_or_not
 from autopts.ptsprojects.testcase_db import TestCaseTable
+from autopts.workspace_index import WorkspaceIndex
+from tools.cron.cache_testcases import cache_test_cases
 from tools.cron.common import catch_exceptions, load_config, parse_yaml
 from tools.cron.remote_terminal import RemoteTerminalClientProxy
 
 log = logging.info
 
-if sys.platform == 'win32':
-    from tools.cron.cache_testcases import cache_test_cases
-
 
 def remote_cache_test_cases(config):
     remote_config = config['cron']['remote_machine']
@@ -52,9 +51,24 @@ def remote_cache_test_cases(config):
             log(f'Failed to copy the {file_name} from the remote machine')
             return
 
-        with open(config['cron']['test_case_estimation']['cache_file_path'], 'wb') as handle:
+        cache_file_path = config['cron']['test_case_estimation']['cache_file_path']
+        with open(cache_file_path, 'wb') as handle:
             handle.write(file_bin.data)
 
+        # Index the test cases, so they are available locally without PTS
+        index = get_local_workspace_index(config)
+        if index:
+            index.update_from_test_cases(parse_yaml(cache_file_path))
+            index.save()
+
+
+def get_local_workspace_index(config):
+    try:
+        return WorkspaceIndex(config['auto_pts']['workspace'])
+    except Exception as e:
+        log(f'Workspace cannot be indexed locally, {e}')
+        return None
+
 
 def update_cached_test_cases(config):
     if sys.platform == 'win32':
@@ -79,7 +93,13 @@ def update_cached_test_cases_job(cfg, **kwargs):
 
 
 def estimate_test_cases(config, included, excluded):
-    profiles = parse_yaml(config['cron']['test_case_estimation']['cache_file_path'])
+    index = get_local_workspace_index(config)
+    if index and index.complete:
+        profiles = index.projects
+    else:
+        profiles = parse_yaml(config['cron']['test_case_estimation']['cache_file_path'])
+    included = as_prefix_trie(included)
+    excluded = as_prefix_trie(excluded)
     test_cases = [
         tc
         for profile in profiles
@@ -92,8 +112,10 @@ def estimate_test_cases(config, included, excluded):
 
 def estimate_test_cases_duration(database_file, table_name, test_cases, max_count):
     database = TestCaseTable(table_name, database_file)
-    est_duration = database.estimate_session_duration(test_cases, max_count)
-    return est_duration
+    try:
+        return database.estimate_session_duration(test_cases, max_count)
+    finally:
+        database.close()
 
 
 def get_estimations(config, included_tc, excluded_tc, limit=None):
@@ -103,17 +125,17 @@ def get_estimations(config, included_tc, excluded_tc, limit=None):
         if len(included_tc) == 1:
             test_cases = test_cases[:limit]
         else:
-            profile_count = {prefix: 0 for prefix in included_tc}
-            tc_list = []
-            for profile in included_tc:
-                for test_case in test_cases:
-                    if profile_count[profile] == limit:
-                        break
-                    if test_case.startswith(profile):
-                        tc_list.append(test_case)
-                        profile_count[profile] += 1
-
-            test_cases = tc_list
+            profiles = PrefixTrie()
+            for index, profile in enumerate(included_tc):
+                profiles.add(profile, index)
+
+            tc_lists = [[] for _ in included_tc]
+            for test_case in test_cases:
+                for index in profiles.values(test_case):
+                    if len(tc_lists[index]) < limit:
+                        tc_lists[index].append(test_case)
+
+            test_cases = [tc for tc_list in tc_lists for tc in tc_list]
 
     est_duration = None
     database_file = config['auto_pts'].get('database_file', None)
@@ -24,6 +24,7 @@ import sqlite3
 import sys
 
 DATABASE_FILE = 'Merge_database.db'
+HISTORY_SUFFIX = '_history'
 
 
 class TestCaseTable:
@@ -50,6 +51,10 @@ class TestCaseTable:
             print(tables)
 
             for table in tables:
+                if table[0].endswith(HISTORY_SUFFIX):
+                    self.merge_history(source_cursor, table[0])
+                    continue
+
                 self.cursor_merge.execute(
                     f"CREATE TABLE IF NOT EXISTS {table[0]} (name TEXT, duration REAL, "
                     "count INTEGER, result TEXT);")
@@ -90,6 +95,22 @@ class TestCaseTable:
         source_conn.close()
         self._close()
 
+    def merge_history(self, source_cursor, table):
+        """Add the test case runs missing in the merged history table"""
+        self.cursor_merge.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (name TEXT, timestamp REAL, "
+            "duration REAL, result TEXT, config TEXT);")
+
+        self.cursor_merge.execute(f"SELECT name, timestamp FROM {table};")
+        merged_runs = set(self.cursor_merge.fetchall())
+
+        source_cursor.execute(
+            f"SELECT name, timestamp, duration, result, config FROM {table};")
+        self.cursor_merge.executemany(
+            f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?);",
+            [row for row in source_cursor.fetchall() if row[:2] not in merged_runs])
+        self.conn_merge.commit()
+
 
 class MergeParser(argparse.ArgumentParser):
     def __init__(self):
@@ -0,0 +1,184 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2025, Codecoup.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Benchmark of the test case filtering and config distribution
+
+Runs get_filtered_test_cases, the way the bot does at startup, on a
+synthetic workspace, and compares it with the linear prefix scan it
+replaced. Both must give the same distribution.
+
+Usage:
+$ python3 tools/prefix_benchmark.py [-n TEST_CASES] [-c CONFIGS] [-p PREFIXES]
+"""
+import argparse
+import copy
+import random
+import sys
+import time
+from os.path import abspath, dirname
+from types import SimpleNamespace
+
+AUTOPTS_REPO = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, AUTOPTS_REPO)
+
+from autopts.bot.common import get_filtered_test_cases  # noqa: E402 # the order of import is very important here
+from autopts.client import test_case_blacklist  # noqa: E402
+
+PROFILES = ['GAP', 'GATT', 'SM', 'L2CAP', 'BAP', 'CAP', 'CSIP', 'HAP', 'MESH', 'PBP']
+ROLES = ['CL', 'SR', 'PER', 'CEN', 'UCL', 'USR', 'BSRC', 'BSNK']
+GROUPS = ['GAC', 'GAD', 'GAR', 'GAW', 'DISC', 'CONN', 'SEC', 'SCC', 'PROT', 'STR']
+
+
+class FakePTS:
+    def __init__(self, workspace):
+        self.workspace = workspace
+
+    def get_project_list(self):
+        return list(self.workspace)
+
+    def get_test_case_list(self, project):
+        return self.workspace[project]
+
+
+def make_workspace(count):
+    workspace = {}
+    for i in range(count):
+        profile = PROFILES[i % len(PROFILES)]
+        role = ROLES[i // len(PROFILES) % len(ROLES)]
+        group = GROUPS[i // (len(PROFILES) * len(ROLES)) % len(GROUPS)]
+        verdict = random.choice(['BV', 'BI'])
+        workspace.setdefault(profile, []).append(
+            f'{profile}/{role}/{group}/{verdict}-{i:05d}-C')
+
+    return workspace
+
+
+def make_iut_config(workspace, config_count, prefix_count):
+    test_cases = [tc for tcs in workspace.values() for tc in tcs]
+    iut_config = {'prj.conf': {}}
+
+    for i in range(config_count):
+        prefixes = []
+        for tc in random.sample(test_cases, prefix_count):
+            # Mix of profile, group and single test case prefixes
+            parts = tc.split('/')
+            prefixes.append('/'.join(parts[:random.randint(2, 4)]))
+
+        iut_config[f'overlay-{i}.conf'] = {'test_cases': prefixes}
+
+    return iut_config
+
+
+def legacy_run_or_not(test_case_name, test_cases, excluded):
+    for entry in test_case_blacklist:
+        if entry in test_case_name:
+            return False
+
+    if excluded:
+        for n in excluded:
+            if test_case_name.startswith(n):
+                return False
+
+    if test_cases:
+        for n in test_cases:
+            if test_case_name.startswith(n):
+                return True
+
+        return False
+
+    return True
+
+
+def legacy_get_filtered_test_cases(iut_config, bot_args, config_default, pts):
+    _args = {config_default: bot_args}
+    included = bot_args.test_cases
+    excluded = bot_args.excluded
+    _args[config_default].excluded = []
+    _args[config_default].test_cases = []
+
+    filtered_test_cases = []
+    for project in pts.get_project_list():
+        filtered_test_cases += [tc for tc in pts.get_test_case_list(project)
+                                if legacy_run_or_not(tc, included, excluded)]
+
+    run_order = list(iut_config.keys())
+    distribution_order = copy.deepcopy(run_order)
+    distribution_order.remove(config_default)
+    distribution_order.append(config_default)
+
+    remaining_test_cases = copy.deepcopy(filtered_test_cases)
+    for config in distribution_order:
+        value = iut_config[config]
+        if 'test_cases' not in value:
+            continue
+
+        _args[config] = copy.deepcopy(_args[config_default])
+
+        for prefix in value['test_cases']:
+            for tc in filtered_test_cases:
+                if tc.startswith(prefix):
+                    _args[config].test_cases.append(tc)
+                    remaining_test_cases.remove(tc)
+
+            filtered_test_cases = copy.deepcopy(remaining_test_cases)
+
+    if len(_args[config_default].test_cases) == 0:
+        _args[config_default].test_cases = filtered_test_cases
+
+    return run_order, _args
+
+
+def run(func, iut_config, pts, excluded):
+    args = SimpleNamespace(test_cases=[], excluded=list(excluded))
+
+    start = time.perf_counter()
+    _, _args = func(iut_config, args, 'prj.conf', pts)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, {config: value.test_cases for config, value in _args.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--test-cases', type=int, default=10000,
+                        help='Number of test cases in the workspace')
+    parser.add_argument('-c', '--configs', type=int, default=20,
+                        help='Number of configs in iut_config')
+    parser.add_argument('-p', '--prefixes', type=int, default=25,
+                        help='Number of test case prefixes per config')
+    args = parser.parse_args()
+
+    random.seed(0)
+    workspace = make_workspace(args.test_cases)
+    iut_config = make_iut_config(workspace, args.configs, args.prefixes)
+    excluded = ['GAP/SEC/', 'MESH/PER']
+    pts = FakePTS(workspace)
+
+    legacy_time, legacy_result = run(legacy_get_filtered_test_cases, iut_config, pts, excluded)
+    trie_time, trie_result = run(get_filtered_test_cases, iut_config, pts, excluded)
+
+    if legacy_result != trie_result:
+        print('Distributions differ!')
+        sys.exit(1)
+
+    print(f'{args.test_cases} test cases, {args.configs} configs, '
+          f'{args.prefixes} prefixes per config')
+    print(f'linear scan: {legacy_time * 1000:9.1f} ms')
+    print(f'prefix trie: {trie_time * 1000:9.1f} ms ({legacy_time / trie_time:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()